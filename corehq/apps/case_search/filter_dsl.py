@@ -1,10 +1,13 @@
 import re
+from collections import Counter
 
 from django.utils.translation import ugettext as _
 
 from eulxml.xpath import parse as parse_xpath
 from eulxml.xpath.ast import FunctionCall, Step, UnaryExpression, serialize
 
+from dimagi.utils.chunked import chunked
+
 from corehq.apps.case_search.xpath_functions import (
     XPATH_FUNCTIONS,
     XPathFunctionException,
@@ -49,6 +52,7 @@ def print_ast(node):
 
 
 MAX_RELATED_CASES = 500000  # Limit each related case lookup to return 500,000 cases to prevent timeouts
+RELATED_CASE_CHUNK_SIZE = 10000  # Number of case ids to look up related cases for in each query
 
 
 OPERATOR_MAPPING = {
@@ -69,10 +73,126 @@ NEQ = "!="
 ALL_OPERATORS = [EQ, NEQ] + list(OPERATOR_MAPPING.keys()) + list(COMPARISON_MAPPING.keys())
 
 
+def _is_related_case_lookup(node):
+    """Returns whether a particular AST node is a related case lookup
+
+    e.g. `parent/host/thing = 'foo'`
+    """
+    return hasattr(node, 'left') and hasattr(node.left, 'op') and node.left.op == '/'
+
+
+def _get_related_case_query(node):
+    """Splits a related case lookup into the parts used to walk it
+
+    e.g. for `parent/grandparent/host/property = 'value'` returns
+    ("property = 'value'", ('host', 'grandparent'), 'parent')
+
+    :return: tuple of the filter on the furthest related cases, the
+    identifiers to walk from them (furthest first) and the identifier of
+    the final level
+    """
+    path = []
+    n = node.left
+    while hasattr(n, 'op') and n.op == '/':
+        path.insert(0, serialize(n.right))
+        n = n.left
+    path.insert(0, serialize(n))
+
+    query = "{} {} '{}'".format(path[-1], node.op, node.right)
+    return query, tuple(reversed(path[1:-1])), path[0]
+
+
+def _get_reused_related_case_keys(node):
+    """Returns the keys of the related case levels that are needed by more
+    than one lookup in the expression, see ``RelatedCaseLookup``
+    """
+    counts = Counter()
+
+    def visit(node):
+        if not hasattr(node, 'op'):
+            return
+
+        if _is_related_case_lookup(node):
+            if not isinstance(node.right, Step):
+                query, identifiers, final_identifier = _get_related_case_query(node)
+                for level in range(len(identifiers) + 1):
+                    counts[(query, identifiers[:level])] += 1
+        elif node.op in OPERATOR_MAPPING:
+            visit(node.left)
+            visit(node.right)
+
+    visit(node)
+    return {key for key, count in counts.items() if count > 1}
+
+
+class RelatedCaseLookup(object):
+    """Finds the cases at the end of a path of related cases
+
+    ES can't join cases to the cases they index (indices are nested
+    documents in the case search index, not parent / child mappings) so
+    each level of the path is a separate query. The ids found at one level
+    are streamed into the queries for the next in chunks of
+    RELATED_CASE_CHUNK_SIZE, so that no query carries more ids than that
+    and the ids of intermediate levels aren't held in memory.
+
+    A level is identified by the filter on the furthest related cases and
+    the identifiers walked from them. Levels in ``reused_keys`` are needed
+    by more than one lookup and have their ids kept for the life of this
+    object, which is the building of a single filter.
+    """
+
+    def __init__(self, domain, reused_keys=()):
+        self.domain = domain
+        self.reused_keys = set(reused_keys)
+        self._cache = {}
+
+    def get_case_ids(self, query, identifiers):
+        """
+        :param query: xpath filter on the furthest related cases e.g. "name = 'Mace'"
+        :param identifiers: identifiers of the indices to walk from those cases, furthest first
+        :return: list of ids of the cases reached
+        """
+        return list(self._iter_case_ids(query, tuple(identifiers)))
+
+    def _iter_case_ids(self, query, identifiers):
+        key = (query, identifiers)
+        if key in self._cache:
+            return iter(self._cache[key])
+
+        if identifiers:
+            case_ids = self._iter_child_case_ids(
+                self._iter_case_ids(query, identifiers[:-1]), identifiers[-1]
+            )
+        else:
+            case_ids = self._iter_property_case_ids(query)
+
+        if key in self.reused_keys:
+            self._cache[key] = list(case_ids)
+            return iter(self._cache[key])
+        return case_ids
+
+    def _iter_property_case_ids(self, query):
+        """all case_ids where the property filter `query` matches"""
+        es_query = CaseSearchES().domain(self.domain).xpath_query(self.domain, query)
+        if es_query.count() > MAX_RELATED_CASES:
+            raise CaseFilterError(
+                _("The related case lookup you are trying to perform would return too many cases"),
+                query
+            )
+        return es_query.scroll_ids()
+
+    def _iter_child_case_ids(self, case_ids, identifier):
+        """all case_ids who have parents in `case_ids` with the relationship `identifier`"""
+        for chunk in chunked(case_ids, RELATED_CASE_CHUNK_SIZE, list):
+            yield from CaseSearchES().domain(self.domain).get_child_cases(chunk, identifier).scroll_ids()
+
+
 def build_filter_from_ast(domain, node):
     """Builds an ES filter from an AST provided by eulxml.xpath.parse
     """
 
+    related_cases = RelatedCaseLookup(domain, _get_reused_related_case_keys(node))
+
     def _walk_related_cases(node):
         """Return a query that will fulfill the filter on the related case.
 
@@ -84,58 +204,12 @@ def build_filter_from_ast(domain, node):
         found in (1).
         3. Return the lowest of these ids as an related case query filter
         """
-
-        # fetch the ids of the highest level cases that match the case_property
-        # i.e. all the cases which have `property = 'value'`
-        ids = _parent_property_lookup(node)
-
-        # get the related case path we need to walk, i.e. `parent/grandparent/property`
-        n = node.left
-        while _is_related_case_lookup(n):
-            # This walks down the tree and finds case ids that match each identifier
-            # This is basically performing multiple "joins" to find related cases since ES
-            # doesn't have a way to relate models together
-
-            # Get the path to the related case, e.g. `parent/grandparent`
-            # On subsequent run throughs, it walks down the tree (e.g. n = [parent, /, grandparent])
-            n = n.left
-            identifier = serialize(n.right)  # the identifier at this step, e.g. `grandparent`
-
-            # get the ids of the cases that point at the previous level's cases
-            # this has the potential of being a very large list
-            ids = _child_case_lookup(ids, identifier=identifier)
-            if not ids:
-                break
-
-        # after walking the full tree, get the final level we are interested in, i.e. `parent`
-        final_identifier = serialize(n.left)
-        return reverse_index_case_query(ids, final_identifier)
-
-    def _parent_property_lookup(node):
-        """given a node of the form `parent/foo = 'thing'`, return all case_ids where `foo = thing`
-        """
         if isinstance(node.right, Step):
             _raise_step_RHS(node)
-        new_query = "{} {} '{}'".format(serialize(node.left.right), node.op, node.right)
-        es_query = CaseSearchES().domain(domain).xpath_query(domain, new_query)
-        if es_query.count() > MAX_RELATED_CASES:
-            raise CaseFilterError(
-                _("The related case lookup you are trying to perform would return too many cases"),
-                new_query
-            )
-        return es_query.scroll_ids()
-
-    def _child_case_lookup(case_ids, identifier):
-        """returns a list of all case_ids who have parents `case_id` with the relationship `identifier`
-        """
-        return CaseSearchES().domain(domain).get_child_cases(case_ids, identifier).scroll_ids()
 
-    def _is_related_case_lookup(node):
-        """Returns whether a particular AST node is a related case lookup
-
-        e.g. `parent/host/thing = 'foo'`
-        """
-        return hasattr(node, 'left') and hasattr(node.left, 'op') and node.left.op == '/'
+        query, identifiers, final_identifier = _get_related_case_query(node)
+        ids = related_cases.get_case_ids(query, identifiers)
+        return reverse_index_case_query(ids, final_identifier)
 
     def _raise_step_RHS(node):
         raise CaseFilterError(
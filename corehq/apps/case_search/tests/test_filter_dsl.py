@@ -2,12 +2,14 @@ from django.test import SimpleTestCase, TestCase
 
 from corehq.util.es.elasticsearch import ConnectionError
 from eulxml.xpath import parse as parse_xpath
+from mock import MagicMock, patch
 
 from casexml.apps.case.mock import CaseFactory, CaseIndex, CaseStructure
 from pillowtop.es_utils import initialize_index_and_mapping
 
 from corehq.apps.case_search.filter_dsl import (
     CaseFilterError,
+    RelatedCaseLookup,
     build_filter_from_ast,
     get_properties_from_ast,
 )
@@ -315,6 +317,60 @@ class TestFilterDsl(SimpleTestCase):
             build_filter_from_ast(None, parse_xpath("parent/name > other_property"))
 
 
+@patch('corehq.apps.case_search.filter_dsl.RELATED_CASE_CHUNK_SIZE', 2)
+@patch('corehq.apps.case_search.filter_dsl.CaseSearchES')
+class TestRelatedCaseLookup(SimpleTestCase):
+
+    def _setup_es(self, CaseSearchES, property_case_ids):
+        es_query = CaseSearchES.return_value.domain.return_value
+        es_query.xpath_query.return_value.count.return_value = len(property_case_ids)
+        es_query.xpath_query.return_value.scroll_ids.side_effect = lambda: iter(property_case_ids)
+        es_query.get_child_cases.side_effect = lambda case_ids, identifier: MagicMock(
+            scroll_ids=lambda: iter(['{}-{}'.format(identifier, case_id) for case_id in case_ids])
+        )
+        return es_query
+
+    def test_chunked_levels(self, CaseSearchES):
+        es_query = self._setup_es(CaseSearchES, ['a', 'b', 'c'])
+        case_ids = RelatedCaseLookup('domain').get_case_ids("house = 'Tyrell'", ['mother', 'father'])
+        self.assertEqual(case_ids, ['father-mother-a', 'father-mother-b', 'father-mother-c'])
+        self.assertEqual(
+            [call[0] for call in es_query.get_child_cases.call_args_list],
+            [
+                (['a', 'b'], 'mother'),
+                (['mother-a', 'mother-b'], 'father'),
+                (['c'], 'mother'),
+                (['mother-c'], 'father'),
+            ]
+        )
+
+    def test_no_cases(self, CaseSearchES):
+        es_query = self._setup_es(CaseSearchES, [])
+        self.assertEqual(RelatedCaseLookup('domain').get_case_ids("house = 'Tyrell'", ['mother']), [])
+        es_query.get_child_cases.assert_not_called()
+
+    def test_reused_levels_looked_up_once(self, CaseSearchES):
+        es_query = self._setup_es(CaseSearchES, ['a', 'b', 'c'])
+        built_filter = build_filter_from_ast("domain", parse_xpath(
+            "father/mother/house = 'Tyrell' or mother/house = 'Tyrell' or father/mother/house = 'Tyrell'"
+        ))
+        self.assertEqual(es_query.xpath_query.call_count, 1)
+        # the `mother` level of the first and last lookups is fetched once,
+        # in two chunks. The last step of each lookup is a reverse index
+        # query, not a child case lookup.
+        self.assertEqual(
+            [call[0] for call in es_query.get_child_cases.call_args_list],
+            [(['a', 'b'], 'mother'), (['c'], 'mother')]
+        )
+        self.assertEqual(built_filter['or'][0]['or'][0], built_filter['or'][1])
+
+    def test_too_many_cases(self, CaseSearchES):
+        es_query = self._setup_es(CaseSearchES, ['a'])
+        es_query.xpath_query.return_value.count.return_value = 500001
+        with self.assertRaises(CaseFilterError):
+            build_filter_from_ast("domain", parse_xpath("father/house = 'Tyrell'"))
+
+
 class TestFilterDslLookups(TestCase):
     maxDiff = None
 
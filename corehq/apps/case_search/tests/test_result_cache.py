@@ -0,0 +1,74 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase
+
+from mock import MagicMock, patch
+
+from corehq.apps.case_search.utils import (
+    CASE_SEARCH_REFRESH_SECONDS,
+    bump_case_search_generation,
+    get_case_search_results,
+)
+
+
+def _search_es(query, hits):
+    search_es = MagicMock(raw_query=query)
+    search_es.run.return_value.raw_hits = hits
+    return search_es
+
+
+@patch('corehq.apps.case_search.utils.metrics_counter', MagicMock())
+class CaseSearchResultCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        cache_patch = patch('corehq.apps.case_search.utils.cache', LocMemCache('case-search-results', {}))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+    def test_cached(self):
+        search_es = _search_es({'query': {'name': 'Jamie'}}, [{'_id': 'a'}])
+        self.assertEqual(get_case_search_results('domain', 'case', search_es), [{'_id': 'a'}])
+        self.assertEqual(get_case_search_results('domain', 'case', search_es), [{'_id': 'a'}])
+        self.assertEqual(search_es.run.call_count, 1)
+
+    def test_key_includes_query_and_case_type(self):
+        search_es = _search_es({'query': {'name': 'Jamie'}}, [{'_id': 'a'}])
+        get_case_search_results('domain', 'case', search_es)
+        get_case_search_results('domain', 'other', search_es)
+        get_case_search_results('other', 'case', search_es)
+        get_case_search_results('domain', 'case', _search_es({'query': {'name': 'Tyrell'}}, []))
+        self.assertEqual(search_es.run.call_count, 3)
+
+    def test_invalidated_by_update(self):
+        search_es = _search_es({'query': {'name': 'Jamie'}}, [{'_id': 'a'}])
+        other_search_es = _search_es({'query': {'name': 'Jamie'}}, [{'_id': 'a'}])
+        get_case_search_results('domain', 'case', search_es)
+        get_case_search_results('domain', 'other', other_search_es)
+        bump_case_search_generation('domain', 'case')
+        get_case_search_results('domain', 'case', search_es)
+        get_case_search_results('domain', 'other', other_search_es)
+        self.assertEqual(search_es.run.call_count, 2)
+        self.assertEqual(other_search_es.run.call_count, 1)
+
+        bump_case_search_generation('domain')
+        get_case_search_results('domain', 'other', other_search_es)
+        self.assertEqual(other_search_es.run.call_count, 2)
+
+    def test_not_cached_until_index_refreshed(self):
+        search_es = _search_es({'query': {'name': 'Jamie'}}, [{'_id': 'a'}])
+        with patch('corehq.apps.case_search.utils.time.time', return_value=1000):
+            bump_case_search_generation('domain', 'case')
+            get_case_search_results('domain', 'case', search_es)
+            get_case_search_results('domain', 'case', search_es)
+        self.assertEqual(search_es.run.call_count, 2)
+
+        with patch('corehq.apps.case_search.utils.time.time', return_value=1001 + CASE_SEARCH_REFRESH_SECONDS):
+            get_case_search_results('domain', 'case', search_es)
+            get_case_search_results('domain', 'case', search_es)
+        self.assertEqual(search_es.run.call_count, 3)
+
+    @patch('corehq.apps.case_search.utils.CASE_SEARCH_CACHE_MAX_BYTES', 10)
+    def test_large_results_not_cached(self):
+        search_es = _search_es({'query': {'name': 'Jamie'}}, [{'_id': 'a' * 10}])
+        get_case_search_results('domain', 'case', search_es)
+        get_case_search_results('domain', 'case', search_es)
+        self.assertEqual(search_es.run.call_count, 2)
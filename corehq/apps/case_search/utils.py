@@ -1,4 +1,10 @@
+import hashlib
+import json
 import re
+import time
+import uuid
+
+from django.core.cache import cache
 
 from corehq.apps.case_search.models import (
     CASE_SEARCH_BLACKLISTED_OWNER_ID_KEY,
@@ -13,6 +19,13 @@ from corehq.apps.case_search.models import (
 )
 from corehq.apps.es.case_search import CaseSearchES
 from corehq.pillows.mappings.case_search_mapping import CASE_SEARCH_MAX_RESULTS
+from corehq.util.metrics import metrics_counter
+
+CASE_SEARCH_CACHE_TIMEOUT = 5 * 60
+CASE_SEARCH_CACHE_MAX_BYTES = 512 * 1024  # larger results aren't cached
+CASE_SEARCH_GENERATION_TIMEOUT = 24 * 60 * 60
+# a little over the refresh_interval of the case search index
+CASE_SEARCH_REFRESH_SECONDS = 10
 
 
 class CaseSearchCriteria(object):
@@ -115,3 +128,72 @@ class CaseSearchCriteria(object):
             new_query = merge_queries(self.search_es.get_query(), query_addition)
             self.query_addition_debug_details['new_query'] = new_query
             self.search_es = self.search_es.set_query(new_query)
+
+
+def get_case_search_results(domain, case_type, search_es):
+    """Returns the raw hits of ``search_es``, from the cache if the same
+    query has been run since a case of ``case_type`` was last indexed.
+
+    The cache key is the query sent to ES, so it includes all the criteria
+    and any CaseSearchQueryAddition merged into them, and the current
+    generation of the domain and case type (see ``bump_case_search_generation``).
+    """
+    generation, updated_on = _get_case_search_generation(domain, case_type)
+    query_hash = hashlib.md5(json.dumps(search_es.raw_query, sort_keys=True).encode('utf-8')).hexdigest()
+    key = 'case-search-results-{}-{}-{}-{}'.format(domain, case_type, generation, query_hash)
+
+    hits = cache.get(key)
+    metrics_counter('commcare.case_search.result_cache', tags={
+        'domain': domain,
+        'result': 'miss' if hits is None else 'hit',
+    })
+    if hits is not None:
+        return hits
+
+    started = time.time()
+    hits = search_es.run().raw_hits
+    # Cases indexed just before the last update may not be searchable yet
+    if started - updated_on > CASE_SEARCH_REFRESH_SECONDS \
+            and len(json.dumps(hits)) <= CASE_SEARCH_CACHE_MAX_BYTES:
+        cache.set(key, hits, CASE_SEARCH_CACHE_TIMEOUT)
+    return hits
+
+
+def bump_case_search_generation(domain, case_type=None):
+    """Invalidates the cached search results for the case type, or for all
+    case types in the domain if it isn't known
+    """
+    cache.set(_get_generation_key(domain, case_type), _new_generation(), CASE_SEARCH_GENERATION_TIMEOUT)
+
+
+def _get_case_search_generation(domain, case_type):
+    """
+    :return: (generation, updated_on) where generation identifies the
+    current cached results for the case type and updated_on is the time
+    of the last change to them
+    """
+    keys = [_get_generation_key(domain, None), _get_generation_key(domain, case_type)]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            # no cases have been updated since the last generation expired
+            generation = _new_generation(updated_on=0)
+            if not cache.add(key, generation, CASE_SEARCH_GENERATION_TIMEOUT):
+                generation = cache.get(key, generation)
+            generations[key] = generation
+
+    domain_generation, type_generation = [generations[key] for key in keys]
+    return (
+        '{}-{}'.format(domain_generation[1], type_generation[1]),
+        max(domain_generation[0], type_generation[0]),
+    )
+
+
+def _get_generation_key(domain, case_type):
+    if case_type is None:
+        return 'case-search-generation-{}'.format(domain)
+    return 'case-search-generation-{}-{}'.format(domain, case_type)
+
+
+def _new_generation(updated_on=None):
+    return updated_on if updated_on is not None else time.time(), uuid.uuid4().hex
@@ -1,6 +1,13 @@
 import json
 import logging
+import os
+import queue
+import threading
+import time
 import uuid
+from collections import defaultdict, namedtuple
+from concurrent import futures as concurrent_futures
+from contextlib import contextmanager
 from functools import partial
 
 from django.conf import settings
@@ -20,9 +27,16 @@ logger = logging.getLogger(KAFKA_AUDIT_LOGGER)
 
 class ChangeProducer(object):
 
-    def __init__(self, auto_flush=True):
+    def __init__(self, auto_flush=True, use_buffer=False):
+        """
+        :param use_buffer: Send changes through a ``PublishBuffer`` if
+        ``settings.USE_KAFKA_PUBLISH_BUFFER`` is enabled.
+        """
         self.auto_flush = auto_flush
+        self.use_buffer = use_buffer
         self._producer = None
+        self._buffer = None
+        self._deferred = threading.local()
 
     @property
     def producer(self):
@@ -39,6 +53,20 @@ class ChangeProducer(object):
         )
         return self._producer
 
+    @property
+    def buffer(self):
+        if not (self.use_buffer and settings.USE_KAFKA_PUBLISH_BUFFER):
+            return None
+        if self._buffer is None:
+            self._buffer = PublishBuffer(
+                self,
+                max_size=settings.KAFKA_PUBLISH_BUFFER_SIZE,
+                batch_size=settings.KAFKA_PUBLISH_BATCH_SIZE,
+                linger_seconds=settings.KAFKA_PUBLISH_LINGER_SECONDS,
+                timeout=settings.KAFKA_PUBLISH_TIMEOUT,
+            )
+        return self._buffer
+
     def send_change(self, topic, change_meta):
         if settings.USE_KAFKA_SHORTEST_BACKLOG_PARTITIONER:
             from corehq.apps.change_feed.partitioners import choose_best_partition_for_topic
@@ -49,9 +77,16 @@ class ChangeProducer(object):
         message = change_meta.to_json()
         message_json_dump = json.dumps(message).encode('utf-8')
         change_meta._transaction_id = uuid.uuid4().hex
+        if self.buffer is not None:
+            self._send_change_buffered(topic, change_meta, message_json_dump, partition)
+            return
+
         try:
             _audit_log(CHANGE_PRE_SEND, change_meta)
             future = self.producer.send(topic, message_json_dump, key=change_meta.document_id, partition=partition)
+            if self._deferred_futures is not None:
+                self._deferred_futures.append((future, change_meta))
+                return
             if self.auto_flush:
                 future.get()
                 _audit_log(CHANGE_SENT, change_meta)
@@ -64,16 +99,221 @@ class ChangeProducer(object):
             on_error = partial(_on_error, change_meta)
             future.add_callback(on_success).add_errback(on_error)
 
+    def _send_change_buffered(self, topic, change_meta, message, partition):
+        _audit_log(CHANGE_PRE_SEND, change_meta)
+        future = self.buffer.put(topic, change_meta, message, partition)
+        if self._deferred_futures is not None:
+            self._deferred_futures.append((future, change_meta))
+        elif self.auto_flush:
+            _wait_for_delivery([(future, change_meta)], self.buffer.timeout)
+        else:
+            future.add_done_callback(partial(_on_buffered_delivery, change_meta))
+
     def flush(self, timeout=None):
+        if self.buffer is not None:
+            self.buffer.flush(timeout=timeout)
         self.producer.flush(timeout=timeout)
 
+    @property
+    def _deferred_futures(self):
+        return getattr(self._deferred, 'futures', None)
+
+    @contextmanager
+    def deferred_flush(self):
+        """Send changes without waiting for each one to be delivered and
+        wait for all of them in a single flush on exit.
+
+        :raises KafkaPublishingError: on exit if any change was not delivered
+        """
+        if self._deferred_futures is not None:
+            # already deferred by an outer context
+            yield
+            return
+
+        self._deferred.futures = []
+        try:
+            yield
+        finally:
+            futures = self._deferred.futures
+            self._deferred.futures = None
+            if futures and self.buffer is None:
+                self.flush()
+        if self.buffer is not None:
+            # the buffer's flusher sends the changes and logs the outcome
+            _wait_for_delivery(futures, self.buffer.timeout)
+            return
+        error = None
+        for future, change_meta in futures:
+            try:
+                future.get()
+            except Exception as e:
+                _audit_log(CHANGE_ERROR, change_meta)
+                error = error or e
+            else:
+                _audit_log(CHANGE_SENT, change_meta)
+        if error is not None:
+            raise KafkaPublishingError(error)
+
+
+_BufferedChange = namedtuple('_BufferedChange', 'topic change_meta message partition future')
+
+
+class PublishBuffer(object):
+    """Bounded in-process queue of changes that a background thread sends to
+    Kafka in batches
+
+    The flusher takes up to ``batch_size`` changes at a time, waiting up to
+    ``linger_seconds`` for more to arrive, sends them grouped by topic and
+    flushes the producer once per batch. Publishers get a
+    ``concurrent.futures.Future`` for each change that is resolved when
+    Kafka acknowledges it, so they can wait for several changes together
+    instead of a broker round trip per change.
+
+    When the queue is full publishers block for up to ``timeout`` seconds
+    and then fail with ``KafkaPublishingError``.
+    """
+
+    def __init__(self, change_producer, max_size, batch_size, linger_seconds, timeout):
+        self.change_producer = change_producer
+        self.batch_size = batch_size
+        self.linger_seconds = linger_seconds
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def put(self, topic, change_meta, message, partition):
+        """
+        :returns: Future resolved once the change has been delivered
+        :raises KafkaPublishingError: if the buffer stays full for ``timeout``
+        """
+        try:
+            return self._put(_BufferedChange(topic, change_meta, message, partition, concurrent_futures.Future()))
+        except KafkaPublishingError:
+            _audit_log(CHANGE_ERROR, change_meta)
+            raise
+
+    def flush(self, timeout=None):
+        """Wait until all changes queued so far have been sent"""
+        self._put(_BufferedChange(None, None, None, None, concurrent_futures.Future())).result(timeout=timeout)
+
+    def _put(self, change):
+        self._ensure_flusher()
+        try:
+            self._queue.put(change, timeout=self.timeout)
+        except queue.Full:
+            raise KafkaPublishingError('Kafka publish buffer is full')
+        return change.future
+
+    def _ensure_flusher(self):
+        # threads don't survive forking so start a new one in each process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._thread = threading.Thread(
+                    target=self._run, name='kafka-publish-buffer', daemon=True
+                )
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                for change in batch:
+                    if not change.future.done():
+                        change.future.set_exception(e)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.linger_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send_batch(self, batch):
+        changes_by_topic = defaultdict(list)
+        markers = []
+        for change in batch:
+            if change.topic is None:
+                markers.append(change)
+            else:
+                changes_by_topic[change.topic].append(change)
+
+        kafka_producer = self.change_producer.producer
+        sent = []
+        for topic, changes in changes_by_topic.items():
+            for change in changes:
+                try:
+                    kafka_future = kafka_producer.send(
+                        topic, change.message,
+                        key=change.change_meta.document_id, partition=change.partition
+                    )
+                except Exception as e:
+                    _audit_log(CHANGE_ERROR, change.change_meta)
+                    change.future.set_exception(e)
+                else:
+                    sent.append((change, kafka_future))
+
+        if sent:
+            kafka_producer.flush(timeout=self.timeout)
+        for change, kafka_future in sent:
+            try:
+                kafka_future.get(timeout=0)
+            except Exception as e:
+                _audit_log(CHANGE_ERROR, change.change_meta)
+                change.future.set_exception(e)
+            else:
+                _audit_log(CHANGE_SENT, change.change_meta)
+                change.future.set_result(None)
+        for marker in markers:
+            marker.future.set_result(None)
+
+
+def _wait_for_delivery(futures, timeout):
+    """Wait for changes sent through a ``PublishBuffer``
+
+    :param futures: List of ``(future, change_meta)``
+    :raises KafkaPublishingError: if any change was not delivered
+    """
+    error = None
+    deadline = time.monotonic() + timeout
+    for future, change_meta in futures:
+        try:
+            future.result(timeout=max(0, deadline - time.monotonic()))
+        except Exception as e:
+            if isinstance(e, concurrent_futures.TimeoutError):
+                _audit_log(CHANGE_ERROR, change_meta)
+            error = error or e
+    if error is not None:
+        raise KafkaPublishingError(error)
+
+
+def _on_buffered_delivery(change_meta, future):
+    if future.exception() is not None:
+        exception = future.exception()
+        # the flusher has already logged the error
+        _on_error(change_meta, (type(exception), exception, exception.__traceback__), audit=False)
+
 
 def _on_success(change_meta, record_metadata):
     _audit_log(CHANGE_SENT, change_meta)
 
 
-def _on_error(change_meta, exc_info):
-    _audit_log(CHANGE_ERROR, change_meta)
+def _on_error(change_meta, exc_info, audit=True):
+    if audit:
+        _audit_log(CHANGE_ERROR, change_meta)
     notify_exception(
         None, 'Problem sending change to Kafka (async)',
         details=change_meta.to_json(), exec_info=exc_info
@@ -87,4 +327,4 @@ def _audit_log(stage, change_meta):
     )
 
 
-producer = ChangeProducer()
+producer = ChangeProducer(use_buffer=True)
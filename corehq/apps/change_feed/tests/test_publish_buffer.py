@@ -0,0 +1,91 @@
+import threading
+import uuid
+
+from django.test import SimpleTestCase, override_settings
+
+from mock import Mock
+
+from pillowtop.feed.interface import ChangeMeta
+
+from corehq.apps.change_feed import topics
+from corehq.apps.change_feed.producer import ChangeProducer, PublishBuffer
+from corehq.form_processor.exceptions import KafkaPublishingError
+
+
+def _meta():
+    meta = ChangeMeta(document_id=uuid.uuid4().hex, data_source_type='dummy-type', data_source_name='dummy-name')
+    meta._transaction_id = uuid.uuid4().hex
+    return meta
+
+
+def _kafka_future(error=None):
+    return Mock(get=Mock(side_effect=error))
+
+
+@override_settings(
+    USE_KAFKA_PUBLISH_BUFFER=True,
+    KAFKA_PUBLISH_BUFFER_SIZE=10,
+    KAFKA_PUBLISH_BATCH_SIZE=10,
+    KAFKA_PUBLISH_LINGER_SECONDS=0.05,
+    KAFKA_PUBLISH_TIMEOUT=5,
+)
+class PublishBufferTest(SimpleTestCase):
+
+    def setUp(self):
+        self.change_producer = ChangeProducer(use_buffer=True)
+        self.change_producer._producer = Mock()
+        self.kafka_producer = self.change_producer._producer
+        self.kafka_producer.send.side_effect = lambda *args, **kwargs: _kafka_future()
+
+    def test_deferred_changes_batched(self):
+        metas = [_meta() for i in range(4)]
+        with self.change_producer.deferred_flush():
+            self.change_producer.send_change(topics.CASE_SQL, metas[0])
+            self.change_producer.send_change(topics.FORM_SQL, metas[1])
+            self.change_producer.send_change(topics.CASE_SQL, metas[2])
+            self.change_producer.send_change(topics.FORM_SQL, metas[3])
+
+        sent = [(call[0][0], call[1]['key']) for call in self.kafka_producer.send.call_args_list]
+        # sent together and grouped by topic
+        self.assertEqual(sent, [
+            (topics.CASE_SQL, metas[0].document_id),
+            (topics.CASE_SQL, metas[2].document_id),
+            (topics.FORM_SQL, metas[1].document_id),
+            (topics.FORM_SQL, metas[3].document_id),
+        ])
+        self.kafka_producer.flush.assert_called_once()
+
+    def test_synchronous_send(self):
+        self.change_producer.send_change(topics.CASE_SQL, _meta())
+        self.kafka_producer.send.assert_called_once()
+
+    def test_delivery_error(self):
+        self.kafka_producer.send.side_effect = [_kafka_future(), _kafka_future(Exception('no leader'))]
+        with self.assertRaises(KafkaPublishingError):
+            with self.change_producer.deferred_flush():
+                self.change_producer.send_change(topics.CASE_SQL, _meta())
+                self.change_producer.send_change(topics.CASE_SQL, _meta())
+
+    def test_send_error(self):
+        self.kafka_producer.send.side_effect = Exception('buffer full')
+        with self.assertRaises(KafkaPublishingError):
+            self.change_producer.send_change(topics.CASE_SQL, _meta())
+
+    def test_backpressure(self):
+        sending = threading.Event()
+        release = threading.Event()
+
+        def send(*args, **kwargs):
+            sending.set()
+            release.wait(5)
+            return _kafka_future()
+
+        self.kafka_producer.send.side_effect = send
+        buffer = PublishBuffer(self.change_producer, max_size=1, batch_size=1, linger_seconds=0, timeout=0.1)
+        first = buffer.put(topics.CASE_SQL, _meta(), b'{}', None)
+        self.assertTrue(sending.wait(5))
+        buffer.put(topics.CASE_SQL, _meta(), b'{}', None)  # waits in the queue
+        with self.assertRaises(KafkaPublishingError):
+            buffer.put(topics.CASE_SQL, _meta(), b'{}', None)
+        release.set()
+        first.result(timeout=5)
@@ -1205,8 +1205,10 @@ class MigrationTestCase(BaseMigrationTestCase):
         statedb = open_state_db(self.domain_name, self.state_dir, readonly=False)
         statedb.replace_case_diffs([("CommCareCase", "test-case", [diff])])
         clear_local_domain_sql_backend_override(self.domain_name)
-        with mock.patch.object(CaseAccessorSQL, "save_case") as save_case:
+        with mock.patch.object(CaseAccessorSQL, "save_case") as save_case, \
+                mock.patch.object(CaseAccessorSQL, "save_cases") as save_cases:
             save_case.side_effect = BaseException("unexpected save")
+            save_cases.side_effect = BaseException("unexpected save")
             self._do_migration(forms="missing")
 
     def test_reset_migration(self):
@@ -220,14 +220,53 @@ class AutomaticUpdateRule(models.Model):
         return date
 
     @classmethod
-    def iter_cases(cls, domain, case_type, boundary_date=None, db=None):
+    def get_case_filter(cls, rules, now):
+        """
+        :return: a Q expression matching every case that any of the rules
+        could match, or None if all cases of the case type need to be checked.
+        """
+        case_filter = None
+        for rule in rules:
+            rule_filter = rule.get_sql_filter(now)
+            if rule_filter is None:
+                return None
+            case_filter = rule_filter if case_filter is None else case_filter | rule_filter
+        return case_filter
+
+    def get_sql_filter(self, now):
+        """
+        Compiles the criteria that can be checked in the database into a Q
+        expression over CommCareCaseSQL. Criteria that can't be (custom
+        criteria, closed parents, ...) are left out, so cases matching the
+        expression are only candidates and still need criteria_match.
+
+        :return: Q expression or None if no criteria could be compiled
+        """
+        q_expression = Q()
+        if self.filter_on_server_modified:
+            q_expression &= Q(server_modified_on__lte=now - timedelta(days=self.server_modified_boundary))
+
+        for criteria in self.memoized_criteria:
+            criteria_filter = criteria.definition.get_sql_filter(now)
+            if criteria_filter is not None:
+                q_expression &= criteria_filter
+
+        return q_expression if q_expression else None
+
+    @classmethod
+    def iter_cases(cls, domain, case_type, boundary_date=None, db=None, case_filter=None):
+        """
+        :param case_filter: Q expression to narrow down the cases when they
+        are read from postgres, see ``get_case_filter``
+        """
         if should_use_sql_backend(domain):
-            return cls._iter_cases_from_postgres(domain, case_type, boundary_date=boundary_date, db=db)
+            return cls._iter_cases_from_postgres(domain, case_type, boundary_date=boundary_date, db=db,
+                                                 case_filter=case_filter)
         else:
             return cls._iter_cases_from_es(domain, case_type, boundary_date=boundary_date)
 
     @classmethod
-    def _iter_cases_from_postgres(cls, domain, case_type, boundary_date=None, db=None):
+    def _iter_cases_from_postgres(cls, domain, case_type, boundary_date=None, db=None, case_filter=None):
         q_expression = Q(
             domain=domain,
             type=case_type,
@@ -238,6 +277,9 @@ class AutomaticUpdateRule(models.Model):
         if boundary_date:
             q_expression = q_expression & Q(server_modified_on__lte=boundary_date)
 
+        if case_filter is not None:
+            q_expression = q_expression & case_filter
+
         if db:
             return paginate_query(db, CommCareCaseSQL, q_expression, load_source='auto_update_rule')
         else:
@@ -483,6 +525,14 @@ class CaseRuleCriteriaDefinition(models.Model):
     def matches(self, case, now):
         raise NotImplementedError()
 
+    def get_sql_filter(self, now):
+        """
+        Optionally overridden to return a Q expression over CommCareCaseSQL
+        that includes at least every case this definition matches.
+        Returns None if the criteria can only be checked in python.
+        """
+        return None
+
 
 class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
     # True when today < (the date in property_name + property_value days)
@@ -597,6 +647,59 @@ class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
 
         return False
 
+    def _get_json_property_name(self):
+        """
+        :return: the name of the property in case_json or None if the
+        property references another case, may be a CommCareCaseSQL field or
+        can't be used in a lookup
+        """
+        if '/' in self.property_name or '__' in self.property_name:
+            return None
+
+        # '_id' is read from case_id. Digit-only names would be used as
+        # array indexes by the json lookups.
+        if self.property_name == '_id' or self.property_name.isdigit():
+            return None
+
+        if self.property_name in [field.name for field in CommCareCaseSQL._meta.fields]:
+            return None
+
+        return self.property_name
+
+    def get_sql_filter(self, now):
+        property_name = self._get_json_property_name()
+        if property_name is None:
+            return None
+
+        if self.match_type == self.MATCH_EQUAL and self.property_value is not None:
+            return Q(case_json__jsonb__contains={property_name: self.property_value})
+        elif self.match_type == self.MATCH_NOT_EQUAL and self.property_value is not None:
+            return ~Q(case_json__jsonb__contains={property_name: self.property_value})
+        elif self.match_type == self.MATCH_HAS_VALUE:
+            # values that are only whitespace are excluded by check_has_value
+            return (
+                Q(case_json__jsonb__has_key=property_name) &
+                ~Q(case_json__jsonb__contains={property_name: None}) &
+                ~Q(case_json__jsonb__contains={property_name: ''})
+            )
+        elif self.match_type in (self.MATCH_DAYS_BEFORE, self.MATCH_DAYS_AFTER):
+            try:
+                cutoff = now - timedelta(days=int(self.property_value))
+            except (ValueError, TypeError):
+                return None
+
+            # Dates are only parsed from strings starting with YYYY-MM-DD
+            # (ALLOWED_DATE_REGEX) so they can be compared as text. The date
+            # in the value may be up to a day off from the cleaned datetime
+            # because of its time and time zone, so allow for two days.
+            if self.match_type == self.MATCH_DAYS_BEFORE:
+                lookup, value = 'gte', cutoff - timedelta(days=2)
+            else:
+                lookup, value = 'lt', cutoff + timedelta(days=2)
+            return Q(**{'case_json__jsonb__{}__{}'.format(property_name, lookup): value.date().isoformat()})
+
+        return None
+
     def matches(self, case, now):
         return {
             self.MATCH_DAYS_BEFORE: self.check_days_before,
@@ -36,6 +36,7 @@ from corehq.sql_db.util import get_db_aliases_for_partitioned_query
 from corehq.toggles import DISABLE_CASE_UPDATE_RULE_SCHEDULED_TASK
 from corehq.util.decorators import serial_task
 from corehq.util.log import send_HTML_email
+from corehq.util.metrics import metrics_counter
 
 from .dispatcher import EditDataInterfaceDispatcher
 from .interfaces import BulkFormManagementInterface, FormManagementMode
@@ -144,13 +145,15 @@ def run_case_update_rules_for_domain_and_db(domain, now, run_id, case_type, db=N
 
     last_migration_check_time = None
     cases_checked = 0
+    cases_matched = 0
     case_update_result = CaseRuleActionResult()
 
     all_rules = AutomaticUpdateRule.by_domain(domain, AutomaticUpdateRule.WORKFLOW_CASE_UPDATE)
     rules = list(all_rules.filter(case_type=case_type))
 
     boundary_date = AutomaticUpdateRule.get_boundary_date(rules, now)
-    for case in AutomaticUpdateRule.iter_cases(domain, case_type, boundary_date, db=db):
+    case_filter = AutomaticUpdateRule.get_case_filter(rules, now)
+    for case in AutomaticUpdateRule.iter_cases(domain, case_type, boundary_date, db=db, case_filter=case_filter):
         migration_in_progress, last_migration_check_time = check_data_migration_in_progress(
             domain,
             last_migration_check_time
@@ -164,20 +167,36 @@ def run_case_update_rules_for_domain_and_db(domain, now, run_id, case_type, db=N
         ):
             DomainCaseRuleRun.done(run_id, DomainCaseRuleRun.STATUS_HALTED, cases_checked, case_update_result,
                                    db=db)
+            _record_case_rule_metrics(domain, case_filter, cases_checked, cases_matched)
             notify_error("Halting rule run for domain %s and case type %s." % (domain, case_type))
             return
 
-        case_update_result.add_result(run_rules_for_case(case, rules, now))
+        result = run_rules_for_case(case, rules, now)
+        case_update_result.add_result(result)
         cases_checked += 1
+        if result.total_updates:
+            cases_matched += 1
 
     run = DomainCaseRuleRun.done(run_id, DomainCaseRuleRun.STATUS_FINISHED, cases_checked, case_update_result,
                                  db=db)
+    _record_case_rule_metrics(domain, case_filter, cases_checked, cases_matched)
 
     if run.status == DomainCaseRuleRun.STATUS_FINISHED:
         for rule in rules:
             AutomaticUpdateRule.objects.filter(pk=rule.pk).update(last_run=now)
 
 
+def _record_case_rule_metrics(domain, case_filter, cases_checked, cases_matched):
+    """
+    Candidates are the cases read to check against the rules, matched
+    cases are those a rule matched and acted on. A big difference means
+    the rule criteria aren't being narrowed down in the database.
+    """
+    tags = {'domain': domain, 'sql_filter': 'yes' if case_filter is not None else 'no'}
+    metrics_counter('commcare.case_update_rules.candidate_cases', cases_checked, tags=tags)
+    metrics_counter('commcare.case_update_rules.matched_cases', cases_matched, tags=tags)
+
+
 @task(serializer='pickle', queue='background_queue', acks_late=True, ignore_result=True)
 def run_case_update_rules_on_save(case):
     key = 'case-update-on-save-case-{case}'.format(case=case.case_id)
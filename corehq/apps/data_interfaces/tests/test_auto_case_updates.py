@@ -37,6 +37,7 @@ from corehq.form_processor.signals import sql_case_post_save
 from corehq.form_processor.tests.utils import (
     run_with_all_backends,
     set_case_property_directly,
+    use_sql_backend,
 )
 from corehq.form_processor.utils.general import should_use_sql_backend
 from corehq.toggles import NAMESPACE_DOMAIN, RUN_AUTO_CASE_UPDATES_ON_SAVE
@@ -543,6 +544,159 @@ class CaseRuleCriteriaTest(BaseCaseRuleTest):
             self.assertTrue(rule.criteria_match(case, datetime(2017, 4, 15)))
 
 
+@use_sql_backend
+class CaseRuleSQLFilterTest(BaseCaseRuleTest):
+
+    def get_candidate_ids(self, rules, now):
+        case_filter = AutomaticUpdateRule.get_case_filter(rules, now)
+        self.assertIsNotNone(case_filter)
+        cases = AutomaticUpdateRule.iter_cases(self.domain, 'person', case_filter=case_filter)
+        return {case.case_id for case in cases}
+
+    def test_case_property_filters(self):
+        now = datetime(2020, 6, 1)
+        equal_rule = _create_empty_rule(self.domain)
+        equal_rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name='status',
+            property_value='green',
+            match_type=MatchPropertyDefinition.MATCH_EQUAL,
+        )
+        days_rule = _create_empty_rule(self.domain)
+        days_rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name='last_visit',
+            property_value='30',
+            match_type=MatchPropertyDefinition.MATCH_DAYS_AFTER,
+        )
+        days_rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name='status',
+            match_type=MatchPropertyDefinition.MATCH_HAS_VALUE,
+        )
+
+        with _with_case(self.domain, 'person', now, update={'status': 'green'}) as green, \
+                _with_case(self.domain, 'person', now, update={'status': 'red'}) as red, \
+                _with_case(self.domain, 'person', now,
+                           update={'status': 'red', 'last_visit': '2020-04-01'}) as old_visit, \
+                _with_case(self.domain, 'person', now,
+                           update={'status': 'red', 'last_visit': '2020-05-20'}) as recent_visit:
+            self.assertEqual(self.get_candidate_ids([equal_rule], now), {green.case_id})
+            self.assertEqual(self.get_candidate_ids([days_rule], now), {old_visit.case_id})
+            self.assertEqual(
+                self.get_candidate_ids([equal_rule, days_rule], now),
+                {green.case_id, old_visit.case_id}
+            )
+            for case in [red, recent_visit]:
+                self.assertFalse(equal_rule.criteria_match(case, now))
+                self.assertFalse(days_rule.criteria_match(case, now))
+
+    def test_filters_match_python_criteria(self):
+        now = datetime(2020, 6, 1)
+        rules = []
+        for match_type, property_name, property_value in [
+            (MatchPropertyDefinition.MATCH_EQUAL, 'status', 'green'),
+            (MatchPropertyDefinition.MATCH_NOT_EQUAL, 'status', 'green'),
+            (MatchPropertyDefinition.MATCH_HAS_VALUE, 'village', None),
+            (MatchPropertyDefinition.MATCH_DAYS_BEFORE, 'last_visit', '30'),
+            (MatchPropertyDefinition.MATCH_DAYS_AFTER, 'last_visit', '30'),
+        ]:
+            rule = _create_empty_rule(self.domain)
+            rule.add_criteria(
+                MatchPropertyDefinition,
+                property_name=property_name,
+                property_value=property_value,
+                match_type=match_type,
+            )
+            rules.append(rule)
+
+        with _with_case(self.domain, 'person', now,
+                        update={'status': 'green', 'village': 'Ghana', 'last_visit': '2020-04-01'}) as case1, \
+                _with_case(self.domain, 'person', now,
+                           update={'status': 'red', 'village': '', 'last_visit': '2020-05-20'}) as case2, \
+                _with_case(self.domain, 'person', now,
+                           update={'age': '30', 'status': 'green', 'last_visit': '2020-05-20'}) as case3, \
+                _with_case(self.domain, 'person', now,
+                           update={'age': '40', 'village': 'Ghana', '1': 'one'}) as case4:
+            cases = [case1, case2, case3, case4]
+            for rule in rules:
+                self.assertEqual(
+                    self.get_candidate_ids([rule], now),
+                    {case.case_id for case in cases if rule.criteria_match(case, now)}
+                )
+
+            # '_id' is read from case_id and digit-only names can't be used in
+            # json lookups so all cases must be checked in python
+            for match_type, property_name, property_value, expected in [
+                (MatchPropertyDefinition.MATCH_EQUAL, '_id', case1.case_id, case1),
+                (MatchPropertyDefinition.MATCH_HAS_VALUE, '1', None, case4),
+            ]:
+                rule = _create_empty_rule(self.domain)
+                rule.add_criteria(
+                    MatchPropertyDefinition,
+                    property_name=property_name,
+                    property_value=property_value,
+                    match_type=match_type,
+                )
+                self.assertIsNone(AutomaticUpdateRule.get_case_filter([rule], now))
+                self.assertEqual(
+                    {case.case_id for case in cases if rule.criteria_match(case, now)},
+                    {expected.case_id}
+                )
+
+    def test_days_before_filter_includes_time_zones(self):
+        now = datetime(2020, 6, 1)
+        rule = _create_empty_rule(self.domain)
+        rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name='due_date',
+            property_value='10',
+            match_type=MatchPropertyDefinition.MATCH_DAYS_BEFORE,
+        )
+
+        # 2020-05-23T05:00:00 in UTC, within 10 days of now
+        with _with_case(self.domain, 'person', now, update={'due_date': '2020-05-22T23:00:00-06:00'}) as due, \
+                _with_case(self.domain, 'person', now, update={'due_date': '2020-04-01'}):
+            self.assertTrue(rule.criteria_match(due, now))
+            self.assertEqual(self.get_candidate_ids([rule], now), {due.case_id})
+
+    def test_server_modified_filter(self):
+        now = datetime(2020, 6, 1)
+        rule = _create_empty_rule(self.domain)
+        rule.filter_on_server_modified = True
+        rule.server_modified_boundary = 30
+        rule.save()
+
+        with _with_case(self.domain, 'person', datetime(2020, 4, 1)) as old_case, \
+                _with_case(self.domain, 'person', datetime(2020, 5, 20)):
+            self.assertEqual(self.get_candidate_ids([rule], now), {old_case.case_id})
+
+    def test_uncompiled_criteria(self):
+        now = datetime(2020, 6, 1)
+        parent_rule = _create_empty_rule(self.domain)
+        parent_rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name='parent/status',
+            property_value='green',
+            match_type=MatchPropertyDefinition.MATCH_EQUAL,
+        )
+        closed_parent_rule = _create_empty_rule(self.domain)
+        closed_parent_rule.add_criteria(ClosedParentDefinition)
+        self.assertIsNone(AutomaticUpdateRule.get_case_filter([parent_rule], now))
+        self.assertIsNone(AutomaticUpdateRule.get_case_filter([closed_parent_rule], now))
+
+        # one rule that can't be compiled means all cases are candidates
+        equal_rule = _create_empty_rule(self.domain)
+        equal_rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name='status',
+            property_value='green',
+            match_type=MatchPropertyDefinition.MATCH_EQUAL,
+        )
+        self.assertIsNotNone(AutomaticUpdateRule.get_case_filter([equal_rule], now))
+        self.assertIsNone(AutomaticUpdateRule.get_case_filter([equal_rule, closed_parent_rule], now))
+
+
 class CaseRuleActionsTest(BaseCaseRuleTest):
 
     def assertActionResult(self, rule, submission_count, result=None, expected_result=None):
@@ -3,7 +3,7 @@ from datetime import date, datetime, time
 from django.db.models import Q
 from django.test import TestCase
 
-from mock import call, patch
+from mock import patch
 
 from corehq.apps.app_manager.models import (
     AdvancedForm,
@@ -58,8 +58,10 @@ from corehq.messaging.scheduling.tests.util import (
 )
 from corehq.messaging.tasks import (
     run_messaging_rule,
+    sync_case_chunk_for_messaging_rule,
     sync_case_for_messaging_rule,
 )
+from corehq.messaging.util import MessagingRuleProgressHelper
 from corehq.sql_db.util import paginate_query_across_partitioned_databases
 
 
@@ -1012,7 +1014,7 @@ class CaseRuleSchedulingIntegrationTest(TestCase):
             self.assertTrue(instances[0].active)
 
     @run_with_all_backends
-    @patch('corehq.messaging.tasks.sync_case_for_messaging_rule.delay')
+    @patch('corehq.messaging.tasks.sync_case_chunk_for_messaging_rule.delay')
     def test_run_messaging_rule(self, task_patch):
         schedule = AlertSchedule.create_simple_alert(
             self.domain,
@@ -1031,14 +1033,38 @@ class CaseRuleSchedulingIntegrationTest(TestCase):
 
         with create_case(self.domain, 'person') as case1, create_case(self.domain, 'person') as case2:
             run_messaging_rule(self.domain, rule.pk)
-            self.assertEqual(task_patch.call_count, 2)
-            task_patch.assert_has_calls(
-                [
-                    call(self.domain, case1.case_id, rule.pk),
-                    call(self.domain, case2.case_id, rule.pk),
-                ],
-                any_order=True
-            )
+            case_ids = []
+            for (domain, chunk, rule_id), kwargs in task_patch.call_args_list:
+                self.assertEqual((domain, rule_id), (self.domain, rule.pk))
+                case_ids.extend(chunk)
+            self.assertEqual(sorted(case_ids), sorted([case1.case_id, case2.case_id]))
+
+    @run_with_all_backends
+    def test_sync_case_chunk_for_messaging_rule(self):
+        schedule = AlertSchedule.create_simple_alert(
+            self.domain,
+            SMSContent(message={'en': 'Hello'})
+        )
+
+        rule = create_empty_rule(self.domain, AutomaticUpdateRule.WORKFLOW_SCHEDULING)
+        rule.add_action(
+            CreateScheduleInstanceActionDefinition,
+            alert_schedule_id=schedule.schedule_id,
+            recipients=(('Self', None),),
+        )
+
+        AutomaticUpdateRule.clear_caches(self.domain, AutomaticUpdateRule.WORKFLOW_SCHEDULING)
+
+        with create_case(self.domain, 'person') as case1, create_case(self.domain, 'person') as case2:
+            progress_helper = MessagingRuleProgressHelper(rule.pk)
+            progress_helper.set_initial_progress()
+
+            sync_case_chunk_for_messaging_rule(self.domain, [case1.case_id, case2.case_id, 'missing'], rule.pk)
+            for case in [case1, case2]:
+                instances = get_case_alert_schedule_instances_for_schedule(case.case_id, schedule)
+                self.assertEqual(instances.count(), 1)
+            # the missing case counts as synced
+            self.assertEqual(int(progress_helper.client.get(progress_helper.current_key)), 3)
 
     @run_with_all_backends
     @patch('corehq.messaging.scheduling.models.content.SMSContent.send')
@@ -585,7 +585,7 @@ class Domain(QuickCachedDocumentMixin, BlobMixin, Document, SnapshotMixin):
         return domain_has_submission_in_last_30_days(self.name)
 
     @classmethod
-    @quickcache(['name'], skip_arg='strict', timeout=30*60,
+    @quickcache(['name'], skip_arg='strict', timeout=30*60, local_timeout=5*60,
         session_function=icds_conditional_session_key())
     def get_by_name(cls, name, strict=False):
         if not name:
@@ -91,6 +91,8 @@ CASE_EXPORT = 'case'
 SMS_EXPORT = 'sms'
 MAX_EXPORTABLE_ROWS = 100000
 CASE_SCROLL_SIZE = 10000
+# number of rows buffered per table before they are written by the export writer
+EXPORT_WRITE_CHUNK_SIZE = 1000
 
 # When a question is missing completely from a form/case this should be the value
 MISSING_VALUE = '---'
@@ -2,7 +2,7 @@ import contextlib
 import datetime
 import sys
 import time
-from collections import Counter
+from collections import Counter, defaultdict
 
 from couchdbkit import ResourceConflict
 
@@ -11,7 +11,7 @@ from couchexport.models import Format
 from dimagi.utils.logging import notify_exception
 from soil import DownloadBase
 
-from corehq.apps.export.const import MAX_EXPORTABLE_ROWS
+from corehq.apps.export.const import EXPORT_WRITE_CHUNK_SIZE, MAX_EXPORTABLE_ROWS
 from corehq.apps.export.dbaccessors import get_properly_wrapped_export_instance
 from corehq.apps.export.esaccessors import (
     get_case_export_base_query,
@@ -45,7 +45,47 @@ class ExportFile(object):
         self.file.close()
 
 
-class _ExportWriter(object):
+class _BufferedRowsMixin(object):
+    """
+    Buffers rows per table and writes them to the couchexport.ExportWriter
+    in chunks of `chunk_size` rows. Buffers are flushed when the writer
+    is closed.
+    """
+    chunk_size = EXPORT_WRITE_CHUNK_SIZE
+
+    def write(self, table, row):
+        """
+        Write the given row to the given table of the export.
+        _Writer must be opened first.
+        :param table: A TableConfiguration
+        :param row: An ExportRow
+        """
+        self.write_rows(table, [row])
+
+    def write_rows(self, table, rows):
+        """
+        Write the given rows to the given table of the export.
+        _Writer must be opened first.
+        :param table: A TableConfiguration
+        :param rows: A list of ExportRows
+        """
+        buffer = self._buffers[table]
+        buffer.extend(rows)
+        if len(buffer) >= self.chunk_size:
+            self._write_buffered_rows(table, self._buffers.pop(table))
+
+    def flush(self):
+        """Write all buffered rows"""
+        buffers = self._buffers
+        while buffers:
+            table = next(iter(buffers))
+            self._write_buffered_rows(table, buffers.pop(table))
+
+    def _write_buffered_rows(self, table, rows):
+        raise NotImplementedError
+
+
+class _ExportWriter(_BufferedRowsMixin):
     """
     An object that provides a friendlier interface to couchexport.ExportWriters.
     """
@@ -55,6 +95,7 @@ class _ExportWriter(object):
         self.writer = writer
         self.format = writer.format
         self.path = temp_path
+        self._buffers = defaultdict(list)
 
     @contextlib.contextmanager
     def open(self, export_instances):
@@ -96,30 +137,27 @@ class _ExportWriter(object):
             self.writer.open(headers, file, table_titles=table_titles, archive_basepath=name)
             try:
                 yield
+                self.flush()
             finally:
                 self.writer.close()
 
-    def write(self, table, row):
-        """
-        Write the given row to the given table of the export.
-        _Writer must be opened first.
-        :param table: A TableConfiguration
-        :param row: An ExportRow
-        """
-        return self.writer.write([
-            (table, [FormattedRow(
+    def _write_buffered_rows(self, table, rows):
+        self.writer.write_rows(table, [
+            FormattedRow(
                 data=row.data,
                 hyperlink_column_indices=row.hyperlink_column_indices,
                 skip_excel_formatting=row.skip_excel_formatting
                 if hasattr(row, 'skip_excel_formatting') else ()
-            )])
+            )
+            for row in rows
         ])
 
     def get_preview(self):
+        self.flush()
         return self.writer.get_preview()
 
 
-class _PaginatedExportWriter(object):
+class _PaginatedExportWriter(_BufferedRowsMixin):
 
     def __init__(self, writer, temp_path):
         self.format = writer.format
@@ -129,6 +167,7 @@ class _PaginatedExportWriter(object):
         # An instance of a couchexport.ExportWriter
         self.writer = writer
         self.file_handle = None
+        self._buffers = defaultdict(list)
 
     @contextlib.contextmanager
     def open(self, export_instances):
@@ -150,6 +189,7 @@ class _PaginatedExportWriter(object):
             )
             try:
                 yield
+                self.flush()
             finally:
                 self.writer.close()
 
@@ -247,24 +287,31 @@ class _PaginatedExportWriter(object):
             )
         return paginated_table_titles
 
-    def write(self, table, row):
+    def _write_buffered_rows(self, table, rows):
         """
-        Write the given row to the given table of the export.
+        Write the given rows to the given table of the export.
         Will automatically open a new table and write to that if it
         has exceeded the number of rows written in the first table.
         :param table: A TableConfiguration
-        :param row: An ExportRow
+        :param rows: A list of ExportRows
         """
-        if self.rows_written[table] >= MAX_EXPORTABLE_ROWS * (self.pages[table] + 1):
-            self.pages[table] += 1
-            self.writer.add_table(
+        while rows:
+            page_capacity = MAX_EXPORTABLE_ROWS * (self.pages[table] + 1) - self.rows_written[table]
+            if page_capacity <= 0:
+                self.pages[table] += 1
+                self.writer.add_table(
+                    self._paged_table_index(table),
+                    self._get_paginated_headers()[self._paged_table_index(table)][0],
+                    table_title=self._get_paginated_table_titles()[self._paged_table_index(table)],
+                )
+                continue
+
+            page_rows, rows = rows[:page_capacity], rows[page_capacity:]
+            self.writer.write_rows(
                 self._paged_table_index(table),
-                self._get_paginated_headers()[self._paged_table_index(table)][0],
-                table_title=self._get_paginated_table_titles()[self._paged_table_index(table)],
+                [FormattedRow(data=row.data) for row in page_rows],
             )
-
-        self.writer.write([(self._paged_table_index(table), [FormattedRow(data=row.data)])])
-        self.rows_written[table] += 1
+            self.rows_written[table] += len(page_rows)
 
 
 def get_export_writer(export_instances, temp_path, allow_pagination=True):
@@ -343,7 +390,7 @@ def write_export_instance(writer, export_instance, documents, progress_tracker=N
     :param export_instance: An ExportInstance
     :param documents: An iterable yielding documents
     :param progress_tracker: A task for soil to track progress against
-    :return: None
+    :return: Number of rows written
     """
     if progress_tracker:
         DownloadBase.set_progress(progress_tracker, 0, documents.count)
@@ -378,10 +425,7 @@ def write_export_instance(writer, export_instance, documents, progress_tracker=N
             compute_total += _time_in_milliseconds() - compute_start
 
             write_start = _time_in_milliseconds()
-            for row in rows:
-                # It might be bad to write one row at a time when you can do more (from a performance perspective)
-                # Regardless, we should handle the batching of rows in the _Writer class, not here.
-                writer.write(table, row)
+            writer.write_rows(table, rows)
             write_total += _time_in_milliseconds() - write_start
 
             total_rows += len(rows)
@@ -396,6 +440,7 @@ def write_export_instance(writer, export_instance, documents, progress_tracker=N
     _record_datadog_export_compute_rows(compute_total, total_bytes, total_rows, tags)
     _record_datadog_export_duration(end - start, total_bytes, total_rows, tags)
     _record_export_duration(end - start, export_instance)
+    return total_rows
 
 
 def _time_in_milliseconds():
@@ -0,0 +1,102 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from couchexport.export import FormattedRow
+from couchexport.models import Format
+
+from corehq.apps.export.export import get_export_writer
+from corehq.apps.export.models import (
+    ExportColumn,
+    ExportRow,
+    FormExportInstance,
+    PathNode,
+    ScalarItem,
+    TableConfiguration,
+)
+
+FORMATS = [Format.CSV, Format.XLS_2007, Format.HTML]
+
+
+class Command(BaseCommand):
+    """Compare writing export rows one at a time with `write_rows`
+
+    Rows are written the way `write_export_instance` writes them: one
+    document at a time, with `--rows-per-doc` rows per document.
+
+    Usage: ./manage.py benchmark_export_writers --rows 1000000 --format csv
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--columns', type=int, default=10)
+        parser.add_argument('--rows-per-doc', type=int, default=1, dest='rows_per_doc')
+        parser.add_argument('--format', action='append', dest='formats', choices=FORMATS,
+                            help='Format to benchmark. May be repeated. Default: all')
+
+    def handle(self, rows, columns, rows_per_doc, formats, **options):
+        docs = rows // rows_per_doc
+        self.stdout.write("{} rows, {} columns".format(docs * rows_per_doc, columns))
+        for export_format in formats or FORMATS:
+            instance = get_export_instance(export_format, columns)
+            table = instance.selected_tables[0]
+            doc_rows = [
+                ExportRow(data=['row {} col {}'.format(i, col) for col in range(columns)])
+                for i in range(rows_per_doc)
+            ]
+            for name, write in [('write', write_one_at_a_time), ('write_rows', write_rows)]:
+                seconds, size = run(instance, write, table, doc_rows, docs)
+                self.stdout.write("{:>6} {:>10}: {:.1f}s ({:.0f} rows/sec, {:.1f} MB)".format(
+                    export_format, name, seconds, docs * rows_per_doc / seconds, size / 1024 / 1024,
+                ))
+
+
+def get_export_instance(export_format, columns):
+    return FormExportInstance(
+        name='benchmark',
+        export_format=export_format,
+        tables=[TableConfiguration(
+            label='Benchmark',
+            selected=True,
+            columns=[
+                ExportColumn(
+                    label='col{}'.format(i),
+                    item=ScalarItem(path=[PathNode(name='form'), PathNode(name='q{}'.format(i))]),
+                    selected=True,
+                )
+                for i in range(columns)
+            ],
+        )],
+    )
+
+
+def run(instance, write, table, doc_rows, docs):
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        writer = get_export_writer([instance], path, allow_pagination=False)
+        start = time.perf_counter()
+        with writer.open([instance]):
+            for i in range(docs):
+                write(writer, table, doc_rows)
+        return time.perf_counter() - start, os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+def write_one_at_a_time(writer, table, rows):
+    # the way _ExportWriter.write wrote rows before write_rows
+    for row in rows:
+        writer.writer.write([
+            (table, [FormattedRow(
+                data=row.data,
+                hyperlink_column_indices=row.hyperlink_column_indices,
+                skip_excel_formatting=row.skip_excel_formatting,
+            )])
+        ])
+
+
+def write_rows(writer, table, rows):
+    writer.write_rows(table, rows)
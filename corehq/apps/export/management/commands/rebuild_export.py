@@ -26,6 +26,13 @@ class Command(BaseCommand):
             default=multiprocessing.cpu_count() - 1,
             help='Number of parallel processes to run.'
         )
+        parser.add_argument(
+            '--project-columns',
+            action='store_true',
+            dest='project_columns',
+            default=False,
+            help='Only dump the parts of each document that are used by the export columns.'
+        )
 
     def handle(self, **options):
         if __debug__:
@@ -34,7 +41,8 @@ class Command(BaseCommand):
         export_id = options.pop('export_id')
         page_size = options.pop('page_size')
         processes = options.pop('processes')
+        project_columns = options.pop('project_columns')
 
-        rebuild_export_mutiprocess(export_id, processes, page_size)
+        rebuild_export_mutiprocess(export_id, processes, page_size, project_columns)
 
         self.stdout.write(self.style.SUCCESS('Rebuild Complete'))
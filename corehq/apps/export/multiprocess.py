@@ -11,6 +11,7 @@ See the 'process_skipped_pages' management command for an example.
 
 The export works as follows:
   * Dump raw docs from ES into files of size N docs
+    * Optionally project the docs to only the paths needed by the export
   * Once each file is complete add it to a multiprocessing Queue
   * Pool of X processes listen to queue and process the dump file
   * Results returned back to the main process
@@ -42,6 +43,16 @@ from corehq.apps.export.export import (
     save_export_payload,
     write_export_instance,
 )
+from corehq.apps.export.models import (
+    CaseIndexExportColumn,
+    ExportColumn,
+    MultiMediaExportColumn,
+    RowNumberColumn,
+    SplitExportColumn,
+    SplitGPSExportColumn,
+    SplitUserDefinedExportColumn,
+    UserDefinedExportColumn,
+)
 from corehq.elastic import ScanResult
 from corehq.util.files import safe_filename
 
@@ -54,6 +65,36 @@ logger = logging.getLogger(__name__)
 
 ProgressValue = namedtuple('ProgressValue', 'page progress total')
 
+# keys looked up on the (sub) document by column transforms
+PROJECTED_DOC_KEYS = [
+    '_id',
+    'domain',
+    'doc_type',
+    'external_blobs',
+    'couch_recipient_doc_type',
+    'xforms_session_couch_id',
+]
+# paths looked up by couchexport.deid.deid_date
+DEID_PATHS = [['form', 'case', '@case_id'], ['form', 'case', 'case_id'], ['_id']]
+# column types that only read the paths returned by _get_column_path
+PROJECTABLE_COLUMN_TYPES = {
+    CaseIndexExportColumn,
+    ExportColumn,
+    MultiMediaExportColumn,
+    RowNumberColumn,
+    SplitExportColumn,
+    SplitGPSExportColumn,
+    SplitUserDefinedExportColumn,
+    UserDefinedExportColumn,
+}
+
+
+class PageStats(namedtuple('PageStats', 'worker bytes_read rows seconds')):
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0
+
 
 class BaseResult(object):
     success = False
@@ -67,6 +108,10 @@ class BaseResult(object):
 class SuccessResult(BaseResult):
     success = True
 
+    def __init__(self, page_number, page_path, page_size, stats=None):
+        super(SuccessResult, self).__init__(page_number, page_path, page_size)
+        self.stats = stats
+
 
 class RetryResult(BaseResult):
     def __init__(self, page_number, page_path, page_size, retry_count):
@@ -81,12 +126,17 @@ class QueuedResult(RetryResult):
 
 
 class OutputPaginator(object):
-    """Helper class to paginate raw export output"""
-    def __init__(self, export_id, start_page_count=0):
+    """Helper class to paginate raw export output
+
+    :param projection: Optional projection from ``get_export_projection``.
+    Docs are projected before they are written to the page file.
+    """
+    def __init__(self, export_id, start_page_count=0, projection=None):
         self.export_id = export_id
         self.page = start_page_count
         self.page_size = 0
         self.file = None
+        self.projection = projection
 
     def __enter__(self):
         self._new_file()
@@ -113,20 +163,27 @@ class OutputPaginator(object):
 
     def write(self, doc):
         self.page_size += 1
+        if self.projection is not None:
+            doc = project_document(doc, self.projection)
         self.file.write('{}\n'.format(json.dumps(doc)))
 
     def get_result(self):
         return RetryResult(self.page, self.path, self.page_size, 0)
 
 
-def rebuild_export_mutiprocess(export_id, num_processes, page_size=100000):
+def rebuild_export_mutiprocess(export_id, num_processes, page_size=100000, project_columns=False):
     assert num_processes > 0
 
     export_instance = get_properly_wrapped_export_instance(export_id)
     filters = export_instance.get_filters()
     total_docs = get_export_size(export_instance, filters)
     exporter = MultiprocessExporter(export_instance, total_docs, num_processes)
-    paginator = OutputPaginator(export_id)
+    projection = None
+    if project_columns:
+        projection = get_export_projection(export_instance)
+        if projection is None:
+            logger.warning('Export has columns that cannot be projected. Dumping full docs.')
+    paginator = OutputPaginator(export_id, projection=projection)
 
     logger.info('Starting data dump of {} docs'.format(total_docs))
     run_multiprocess_exporter(exporter, filters, paginator, page_size)
@@ -163,7 +220,10 @@ def run_export_with_logging(export_instance, page_number, dump_path, doc_count,
         if progress_queue:
             # just to make sure we set progress to 100%
             progress_queue.put(ProgressValue(page_number, doc_count, doc_count))
-        logger.info('    Processing page {} complete'.format(page_number))
+        stats = result.stats
+        logger.info('    Processing page {} complete: {} rows in {:.1f}s ({:.0f} rows/sec, {} bytes read)'.format(
+            page_number, stats.rows, stats.seconds, stats.rows_per_second, stats.bytes_read
+        ))
         return result
     except Exception:
         logger.exception("Error processing page {} (attempt {})".format(page_number, attempts))
@@ -171,9 +231,12 @@ def run_export_with_logging(export_instance, page_number, dump_path, doc_count,
 
 
 def run_export(export_instance, page_number, dump_path, doc_count, progress_tracker=None):
+    start = time.time()
+    bytes_read = os.path.getsize(dump_path)
     docs = _get_export_documents_from_file(dump_path, doc_count)
-    export_file_path = _get_export_file_path(export_instance, docs, progress_tracker)
-    return SuccessResult(page_number, export_file_path, doc_count)
+    export_file_path, rows = _get_export_file_path(export_instance, docs, progress_tracker)
+    stats = PageStats(multiprocessing.current_process().name, bytes_read, rows, time.time() - start)
+    return SuccessResult(page_number, export_file_path, doc_count, stats)
 
 
 def _get_export_documents_from_file(dump_path, doc_count):
@@ -195,8 +258,69 @@ def _get_export_file_path(export_instance, docs, progress_tracker=None):
     os.close(fd)
     writer = get_export_writer(export_instances, temp_path, allow_pagination=False)
     with writer.open(export_instances):
-        write_export_instance(writer, export_instance, docs, progress_tracker)
-        return writer.path
+        rows = write_export_instance(writer, export_instance, docs, progress_tracker)
+        return writer.path, rows
+
+
+def get_export_projection(export_instance):
+    """Get the document paths read by the selected columns of an export
+
+    :returns: Nested dict of path names in which ``True`` marks a path
+    whose whole value is needed. ``None`` if the export has columns that
+    may read other parts of the document.
+    """
+    # the root document's id and domain are read for every table's rows
+    paths = [[key] for key in PROJECTED_DOC_KEYS] + list(DEID_PATHS)
+    for table in export_instance.selected_tables:
+        table_path = [node.name for node in table.path]
+        paths.extend(table_path + [key] for key in PROJECTED_DOC_KEYS)
+        for column in table.selected_columns:
+            if type(column) not in PROJECTABLE_COLUMN_TYPES:
+                return None
+            path = _get_column_path(column)
+            if not path:
+                return None
+            paths.append(path)
+            if column.deid_transform:
+                paths.extend(table_path + deid_path for deid_path in DEID_PATHS)
+
+    projection = {}
+    for path in paths:
+        node = projection
+        for name in path[:-1]:
+            node = node.setdefault(name, {})
+            if node is True:
+                break
+        else:
+            node[path[-1]] = True
+    return projection
+
+
+def _get_column_path(column):
+    if isinstance(column, UserDefinedExportColumn):
+        return [node.name for node in column.custom_path]
+    if isinstance(column, CaseIndexExportColumn):
+        return [column.item.path[0].name]
+    return [node.name for node in column.item.path]
+
+
+def project_document(doc, projection):
+    """Remove the parts of a document that are not in the projection
+
+    Lists are projected item by item so repeat groups keep their length.
+    A non-empty dict that would be projected to an empty dict is kept
+    as is because an empty group produces no rows in a repeat table.
+    """
+    if isinstance(doc, list):
+        return [project_document(item, projection) for item in doc]
+    if not isinstance(doc, dict):
+        return doc
+    projected = {}
+    for key, sub_projection in projection.items():
+        if key in doc:
+            value = doc[key]
+            projected[key] = value if sub_projection is True else project_document(value, sub_projection)
+    return projected if projected or not doc else doc
 
 
 class LoggingProgressTracker(object):
@@ -277,6 +401,7 @@ class MultiprocessExporter(object):
 
     def wait_till_completion(self):
         results = self.get_results()
+        _log_worker_stats(results)
         final_path = self.build_final_export(results)
         if self.premature_exit:
             logger.warning("\n------- PREMATURE EXIT --------\nResult written to %s\n", final_path)
@@ -382,6 +507,23 @@ def _add_compressed_page_to_zip(zip_file, page_number, zip_path_to_add):
             )
 
 
+def _log_worker_stats(export_results):
+    totals = {}
+    for result in export_results:
+        stats = getattr(result, 'stats', None)
+        if stats is None:
+            continue
+        worker = totals.setdefault(stats.worker, [0, 0, 0.])
+        worker[0] += stats.bytes_read
+        worker[1] += stats.rows
+        worker[2] += stats.seconds
+    for worker, (bytes_read, rows, seconds) in sorted(totals.items()):
+        stats = PageStats(worker, bytes_read, rows, seconds)
+        logger.info('  {}: {} rows in {:.1f}s ({:.0f} rows/sec, {} bytes read)'.format(
+            worker, rows, seconds, stats.rows_per_second, bytes_read
+        ))
+
+
 def _output_progress(queue, total_docs):
     """Poll the queue for ProgressValue objects and log progress to logger"""
     logger.debug('Starting progress reporting process')
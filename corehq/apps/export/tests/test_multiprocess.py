@@ -0,0 +1,109 @@
+from django.test import SimpleTestCase
+
+from corehq.apps.export.models import (
+    ExportColumn,
+    FormExportInstance,
+    PathNode,
+    RowNumberColumn,
+    ScalarItem,
+    StockFormExportColumn,
+    TableConfiguration,
+)
+from corehq.apps.export.multiprocess import (
+    get_export_projection,
+    project_document,
+)
+
+
+def _column(*path):
+    return ExportColumn(
+        item=ScalarItem(path=[PathNode(name=name, is_repeat=name.startswith('repeat')) for name in path]),
+        selected=True,
+    )
+
+
+class ExportProjectionTest(SimpleTestCase):
+
+    def get_export_instance(self, *extra_columns):
+        return FormExportInstance(tables=[
+            TableConfiguration(
+                selected=True,
+                path=[],
+                columns=[
+                    RowNumberColumn(item=ScalarItem(path=[PathNode(name='number')]), selected=True),
+                    _column('form', 'q1'),
+                    _column('form', 'q2', 'q3'),
+                    _column('form', 'not_selected'),
+                ] + list(extra_columns),
+            ),
+            TableConfiguration(
+                selected=True,
+                path=[PathNode(name='form'), PathNode(name='repeat', is_repeat=True)],
+                columns=[_column('form', 'repeat', 'q4')],
+            ),
+        ])
+
+    def test_projection(self):
+        projection = get_export_projection(self.get_export_instance())
+        self.assertEqual(projection['form']['q1'], True)
+        self.assertEqual(projection['form']['q2'], {'q3': True})
+        self.assertEqual(projection['form']['repeat']['q4'], True)
+        self.assertEqual(projection['form']['repeat']['_id'], True)
+        self.assertEqual(projection['domain'], True)
+
+    def test_unprojectable_column(self):
+        column = StockFormExportColumn(item=ScalarItem(path=[PathNode(name='form')]), selected=True)
+        self.assertIsNone(get_export_projection(self.get_export_instance(column)))
+
+    def test_project_document(self):
+        projection = get_export_projection(self.get_export_instance())
+        doc = {
+            '_id': 'abc',
+            'domain': 'test',
+            'history': [{'big': 'value'}],
+            'form': {
+                'q1': {'#text': 'one', 'id': '1'},
+                'q2': {'q3': 'three', 'other': 'x'},
+                'not_selected': 'x',
+                'repeat': [{'q4': 'a', 'other': 'x'}, {'other': 'x'}, {}],
+            },
+        }
+        self.assertEqual(project_document(doc, projection), {
+            '_id': 'abc',
+            'domain': 'test',
+            'form': {
+                'q1': {'#text': 'one', 'id': '1'},
+                'q2': {'q3': 'three'},
+                # repeat groups keep their length
+                'repeat': [{'q4': 'a'}, {'other': 'x'}, {}],
+            },
+        })
+
+    def test_single_repeat_group(self):
+        projection = get_export_projection(self.get_export_instance())
+        doc = {'form': {'repeat': {'q4': 'a', 'other': 'x'}}}
+        self.assertEqual(project_document(doc, projection), {'form': {'repeat': {'q4': 'a'}}})
+
+    def test_repeat_table_only(self):
+        repeat_table = TableConfiguration(
+            selected=True,
+            path=[PathNode(name='form'), PathNode(name='repeat', is_repeat=True)],
+            columns=[_column('form', 'repeat', 'q4')],
+        )
+        export_instance = FormExportInstance(tables=[
+            TableConfiguration(selected=False, path=[], columns=[_column('form', 'q1')]),
+            repeat_table,
+        ])
+        doc = {
+            '_id': 'abc',
+            'domain': 'test',
+            'form': {'q1': 'one', 'repeat': [{'q4': 'a'}, {'q4': 'b'}]},
+        }
+        projected = project_document(doc, get_export_projection(export_instance))
+        self.assertEqual(projected['_id'], 'abc')
+        self.assertEqual(projected['domain'], 'test')
+        self.assertNotIn('q1', projected['form'])
+        self.assertEqual(
+            [row.data for row in repeat_table.get_rows(projected, 0)],
+            [['a'], ['b']],
+        )
@@ -15,7 +15,7 @@ def count_fixture_data_types(domain):
     return num_fixtures['value'] if num_fixtures is not None else 0
 
 
-@quickcache(['domain'], timeout=30 * 60)
+@quickcache(['domain'], timeout=30 * 60, local_timeout=5 * 60)
 def get_fixture_data_types(domain):
     from corehq.apps.fixtures.models import FixtureDataType
     return list(FixtureDataType.view(
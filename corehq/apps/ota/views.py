@@ -37,7 +37,10 @@ from corehq.apps.app_manager.dbaccessors import (
 from corehq.apps.app_manager.util import LatestAppInfo
 from corehq.apps.builds.utils import get_default_build_spec
 from corehq.apps.case_search.models import QueryMergeException
-from corehq.apps.case_search.utils import CaseSearchCriteria
+from corehq.apps.case_search.utils import (
+    CaseSearchCriteria,
+    get_case_search_results,
+)
 from corehq.apps.domain.decorators import (
     check_domain_migration,
     mobile_auth,
@@ -103,7 +106,10 @@ def search(request, domain):
     except QueryMergeException as e:
         return _handle_query_merge_exception(request, e)
     try:
-        hits = search_es.run().raw_hits
+        if toggles.CASE_SEARCH_RESULT_CACHE.enabled(domain):
+            hits = get_case_search_results(domain, case_type, search_es)
+        else:
+            hits = search_es.run().raw_hits
     except Exception as e:
         return _handle_es_exception(request, e, case_search_criteria.query_addition_debug_details)
 
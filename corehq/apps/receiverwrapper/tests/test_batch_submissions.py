@@ -0,0 +1,138 @@
+import uuid
+from io import BytesIO
+
+from django.test import TestCase
+from django.test.client import Client
+from django.urls import reverse
+
+from mock import patch
+
+from casexml.apps.case.mock import CaseBlock
+
+from corehq.apps.domain.shortcuts import create_domain
+from corehq.apps.users.models import CommCareUser
+from corehq.blobs import get_blob_db
+from corehq.form_processor.interfaces.dbaccessors import CaseAccessors, FormAccessors
+from corehq.form_processor.submission_post import SubmissionPost, _SubmissionGroup
+from corehq.form_processor.tests.utils import FormProcessorTestUtils, use_sql_backend
+from corehq.form_processor.utils.xform import FormSubmissionBuilder, TestFormMetadata
+
+
+@use_sql_backend
+class BatchSubmissionTest(TestCase):
+    domain = 'submit-batch'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.domain_obj = create_domain(cls.domain)
+        cls.user = CommCareUser.create(cls.domain, 'test', 'foobar')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+        cls.domain_obj.delete()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.client.login(username='test', password='foobar')
+        self.url = reverse('receiver_secure_post_batch', args=[self.domain])
+
+    def tearDown(self):
+        FormProcessorTestUtils.delete_all_sql_forms(self.domain)
+        FormProcessorTestUtils.delete_all_sql_cases(self.domain)
+        super().tearDown()
+
+    def _form(self, form_id, case_block):
+        return FormSubmissionBuilder(
+            form_id=form_id,
+            metadata=TestFormMetadata(domain=self.domain, user_id=self.user.user_id),
+            case_blocks=[case_block],
+        ).as_xml_string()
+
+    def _post(self, forms):
+        data = {}
+        for position, xml in enumerate(forms):
+            submission = BytesIO(xml.encode('utf-8'))
+            submission.name = 'form.xml'
+            data['{}/xml_submission_file'.format(position)] = submission
+        return self.client.post(self.url + '?authtype=basic', data)
+
+    def test_batch(self):
+        case_id = uuid.uuid4().hex
+        form_ids = [uuid.uuid4().hex for i in range(3)]
+        response = self._post([
+            self._form(form_ids[0], CaseBlock(case_id, create=True, case_name='first')),
+            self._form(form_ids[1], CaseBlock(case_id, update={'visits': '1'})),
+            self._form(form_ids[2], CaseBlock(case_id, update={'visits': '2'})),
+        ])
+        self.assertEqual(response.status_code, 201)
+        forms = response.json()['forms']
+        self.assertEqual([form['status'] for form in forms], [201, 201, 201])
+        self.assertEqual([form['form_id'] for form in forms], form_ids)
+        self.assertIn('OpenRosaResponse', forms[0]['response'])
+
+        self.assertEqual(len(FormAccessors(self.domain).get_forms(form_ids)), 3)
+        case = CaseAccessors(self.domain).get_case(case_id)
+        self.assertEqual(case.name, 'first')
+        self.assertEqual(case.get_case_property('visits'), '2')
+        self.assertEqual(case.xform_ids, form_ids)
+
+    def test_duplicate_in_batch(self):
+        form_id = uuid.uuid4().hex
+        xml = self._form(form_id, CaseBlock(uuid.uuid4().hex, create=True))
+        response = self._post([xml, xml])
+        self.assertEqual(response.status_code, 201)
+        forms = response.json()['forms']
+        self.assertEqual([form['status'] for form in forms], [201, 201])
+        self.assertIn('duplicate', forms[1]['response'].lower())
+
+    def test_group_size_limit(self):
+        form_ids = [uuid.uuid4().hex for i in range(3)]
+        with patch('corehq.form_processor.submission_post.BATCH_GROUP_MAX_FORMS', 2), \
+                patch.object(_SubmissionGroup, 'commit', autospec=True,
+                             side_effect=_SubmissionGroup.commit) as commit:
+            response = self._post([
+                self._form(form_id, CaseBlock(uuid.uuid4().hex, create=True))
+                for form_id in form_ids
+            ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            [[form.xforms[0].form_id for form in call[0][0].forms] for call in commit.call_args_list],
+            [form_ids[:2], form_ids[2:]]
+        )
+        self.assertEqual(len(FormAccessors(self.domain).get_forms(form_ids)), 3)
+
+    def test_rollback_deletes_attachments(self):
+        form_ids = [uuid.uuid4().hex for i in range(2)]
+        process_xforms_for_cases = SubmissionPost.process_xforms_for_cases
+        calls = []
+
+        def fail_second_form_in_group(xforms, case_db):
+            calls.append(xforms[0].form_id)
+            if len(calls) == 2:
+                raise Exception("fail")
+            return process_xforms_for_cases(xforms, case_db)
+
+        blob_db = get_blob_db()
+        with patch.object(SubmissionPost, 'process_xforms_for_cases', side_effect=fail_second_form_in_group), \
+                patch.object(blob_db, 'bulk_delete', wraps=blob_db.bulk_delete) as bulk_delete:
+            response = self._post([
+                self._form(form_id, CaseBlock(uuid.uuid4().hex, create=True))
+                for form_id in form_ids
+            ])
+        self.assertEqual(response.status_code, 201)
+        # the group is rolled back and its forms are processed again one at a time
+        self.assertEqual(calls, [form_ids[0], form_ids[1], form_ids[0], form_ids[1]])
+        [deleted] = [meta for call in bulk_delete.call_args_list for meta in call[1]['metas']]
+        self.assertEqual((deleted.parent_id, deleted.name), (form_ids[0], 'form.xml'))
+        self.assertFalse(blob_db.exists(key=deleted.key))
+        self.assertEqual(len(FormAccessors(self.domain).get_forms(form_ids)), 2)
+
+    def test_bad_bundle(self):
+        response = self.client.post(self.url + '?authtype=basic', {
+            '1/xml_submission_file': BytesIO(b'<data/>'),
+        })
+        self.assertEqual(response.status_code, 400)
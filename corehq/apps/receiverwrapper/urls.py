@@ -1,9 +1,11 @@
 from django.conf.urls import url
 
-from corehq.apps.receiverwrapper.views import post, secure_post
+from corehq.apps.receiverwrapper.views import post, secure_post, secure_post_batch
 
 urlpatterns = [
     url(r'^$', post, name='receiver_post'),
+    url(r'^secure/batch/(?P<app_id>[\w-]+)/$', secure_post_batch, name='receiver_secure_post_batch_with_app_id'),
+    url(r'^secure/batch/$', secure_post_batch, name='receiver_secure_post_batch'),
     url(r'^secure/(?P<app_id>[\w-]+)/$', secure_post, name='receiver_secure_post_with_app_id'),
     url(r'^secure/$', secure_post, name='receiver_secure_post'),
 
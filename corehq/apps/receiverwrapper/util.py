@@ -3,6 +3,7 @@ import re
 from collections import namedtuple
 
 from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 from django.http import Http404
 
 from couchdbkit import ResourceNotFound
@@ -243,6 +244,28 @@ def _notify_ignored_form_submission(request, form_meta):
     })
 
 
+def spool_large_submission_uploads(request):
+    """Write the files of large multipart submissions to temporary files as
+    they are read
+
+    Django keeps uploaded files smaller than FILE_UPLOAD_MAX_MEMORY_SIZE in
+    memory, so a submission with many photos can hold most of its size in
+    memory until it has been processed. Files on disk are streamed to the
+    blob db when the form is saved.
+
+    This must be called before ``request.POST`` or ``request.FILES`` is read.
+    """
+    threshold = settings.FORM_INGEST_STREAMING_THRESHOLD
+    if threshold is None or hasattr(request, '_files'):
+        return
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return
+    if content_length >= threshold:
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+
+
 def should_ignore_submission(request):
     """
     If IGNORE_ALL_DEMO_USER_SUBMISSIONS is True then ignore submission if from demo user.
@@ -1,6 +1,7 @@
 import os
 
-from django.http import HttpResponseBadRequest, HttpResponseForbidden
+from django.conf import settings
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
@@ -38,10 +39,11 @@ from corehq.apps.receiverwrapper.util import (
     from_demo_user,
     get_app_and_build_ids,
     should_ignore_submission,
+    spool_large_submission_uploads,
 )
 from corehq.form_processor.exceptions import XFormLockError
 from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
-from corehq.form_processor.submission_post import SubmissionPost
+from corehq.form_processor.submission_post import SubmissionBatchPost, SubmissionPost
 from corehq.form_processor.utils import (
     convert_xform_to_json,
     should_use_sql_backend,
@@ -63,11 +65,9 @@ def _process_form(request, domain, app_id, user_id, authenticated,
     if rate_limit_submission(domain):
         return HttpTooManyRequests()
 
-    metric_tags = {
-        'backend': 'sql' if should_use_sql_backend(domain) else 'couch',
-        'domain': domain
-    }
+    metric_tags = _get_metric_tags(domain)
 
+    spool_large_submission_uploads(request)
     try:
         instance, attachments = couchforms.get_instance_and_attachment(request)
     except MultimediaBug:
@@ -143,6 +143,81 @@ def _process_form(request, domain, app_id, user_id, authenticated,
     return response
 
 
+def _process_form_batch(request, domain, app_id, user_id, authenticated):
+    if rate_limit_submission(domain):
+        return HttpTooManyRequests()
+
+    metric_tags = _get_metric_tags(domain)
+
+    spool_large_submission_uploads(request)
+    instances = couchforms.get_instances_and_attachments(request)
+    if isinstance(instances, BadRequest) or not instances:
+        response = HttpResponseBadRequest(instances.message if instances else 'No forms in batch')
+        _record_metrics(metric_tags, 'known_failures', response)
+        return response
+
+    if should_ignore_submission(request):
+        response = openrosa_response.SUBMISSION_IGNORED_RESPONSE
+        _record_metrics(metric_tags, 'ignored', response)
+        return response
+
+    if toggles.FORM_SUBMISSION_BLACKLIST.enabled(domain):
+        response = openrosa_response.BLACKLISTED_RESPONSE
+        _record_metrics(metric_tags, 'blacklisted', response)
+        return response
+
+    with TimingContext() as timer:
+        app_id, build_id = get_app_and_build_ids(domain, app_id)
+        results = SubmissionBatchPost(
+            instances,
+            domain=domain,
+            app_id=app_id,
+            build_id=build_id,
+            auth_context=AuthContext(
+                domain=domain,
+                user_id=user_id,
+                authenticated=authenticated,
+            ),
+            location=couchforms.get_location(request),
+            received_on=couchforms.get_received_on(request),
+            date_header=couchforms.get_date_header(request),
+            path=couchforms.get_path(request),
+            submit_ip=couchforms.get_submit_ip(request),
+            last_sync_token=couchforms.get_last_sync_token(request),
+            openrosa_headers=couchforms.get_openrosa_headers(request),
+        ).run()
+
+    for result in results:
+        _record_metrics(dict(metric_tags), result.submission_type, result.response, xform=result.xform)
+    metrics_histogram(
+        'commcare.xform_submissions.batch.duration.seconds', timer.duration,
+        bucket_tag='duration', buckets=(1, 5, 20, 60, 120, 300, 600), bucket_unit='s',
+        tags=metric_tags
+    )
+    metrics_histogram(
+        'commcare.xform_submissions.batch.forms', len(results),
+        bucket_tag='forms', buckets=(1, 10, 50, 100, 500), bucket_unit='',
+        tags=metric_tags
+    )
+    return _get_batch_response(results)
+
+
+def _get_batch_response(results):
+    """Response to a submission batch with the OpenRosa response to each form
+
+    The status is 201 if every form was received and 207 otherwise, in
+    which case forms with an error status should be submitted again
+    according to their OpenRosa response.
+    """
+    forms = [{
+        'status': result.response.status_code,
+        'form_id': result.response.get('X-CommCareHQ-FormID'),
+        'response': result.response.content.decode('utf-8'),
+    } for result in results]
+    all_received = all(200 <= form['status'] < 300 for form in forms)
+    return JsonResponse({'forms': forms}, status=201 if all_received else 207)
+
+
 def _submission_error(request, message, metric_tags,
         domain, app_id, user_id, authenticated, meta=None, status=400,
         notify=True):
@@ -168,6 +243,15 @@ def _submission_error(request, message, metric_tags,
     return response
 
 
+def _get_metric_tags(domain):
+    return {
+        'backend': 'sql' if should_use_sql_backend(domain) else 'couch',
+        'domain': domain,
+        # compare submission times with changes sent through the publish buffer
+        'kafka_publish_buffer': 'yes' if settings.USE_KAFKA_PUBLISH_BUFFER else 'no',
+    }
+
+
 def _record_metrics(tags, submission_type, response, timer=None, xform=None):
     tags.update({
         'submission_type': submission_type,
@@ -308,6 +392,33 @@ def _secure_post_basic(request, domain, app_id=None):
     )
 
 
+@login_or_digest_ex(allow_cc_users=True)
+@two_factor_exempt
+def _secure_post_batch_digest(request, domain, app_id=None):
+    """only ever called from secure post batch"""
+    return _process_form_batch(
+        request=request,
+        domain=domain,
+        app_id=app_id,
+        user_id=request.couch_user.get_id,
+        authenticated=True,
+    )
+
+
+@handle_401_response
+@login_or_basic_ex(allow_cc_users=True)
+@two_factor_exempt
+def _secure_post_batch_basic(request, domain, app_id=None):
+    """only ever called from secure post batch"""
+    return _process_form_batch(
+        request=request,
+        domain=domain,
+        app_id=app_id,
+        user_id=request.couch_user.get_id,
+        authenticated=True,
+    )
+
+
 @location_safe
 @csrf_exempt
 @require_POST
@@ -332,3 +443,33 @@ def secure_post(request, domain, app_id=None):
         )
 
     return decorated_view(request, domain, app_id=app_id)
+
+
+@location_safe
+@csrf_exempt
+@require_POST
+@check_domain_migration
+def secure_post_batch(request, domain, app_id=None):
+    """Submit the forms a user or device has collected in one request
+
+    See ``couchforms.get_instances_and_attachments`` for the format and
+    ``SubmissionBatchPost`` for how the forms are processed.
+    """
+    authtype_map = {
+        DIGEST: _secure_post_batch_digest,
+        BASIC: _secure_post_batch_basic,
+    }
+
+    if request.GET.get('authtype'):
+        authtype = request.GET['authtype']
+    else:
+        authtype = determine_authtype_from_request(request, default=BASIC)
+
+    try:
+        decorated_view = authtype_map[authtype]
+    except KeyError:
+        return HttpResponseBadRequest(
+            'authtype must be one of: {0}'.format(','.join(authtype_map))
+        )
+
+    return decorated_view(request, domain, app_id=app_id)
@@ -48,6 +48,9 @@ VALID_REFERENCED_DOC_TYPES = [
 ASYNC_INDICATOR_QUEUE_TIME = timedelta(minutes=5)
 ASYNC_INDICATOR_CHUNK_SIZE = 100
 
+# batches of at least this many rows are saved with COPY instead of INSERT
+UCR_COPY_LOAD_THRESHOLD = 2000
+
 XFORM_CACHE_KEY_PREFIX = 'xform_to_json_cache'
 
 NAMED_EXPRESSION_PREFIX = 'NamedExpression'
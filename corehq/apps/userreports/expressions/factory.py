@@ -361,6 +361,12 @@ class ExpressionFactory(object):
     def from_spec(cls, spec, context=None):
         if _is_literal(spec):
             return cls.from_spec(_convert_constant_to_expression_spec(spec), context)
+        if context is not None and context.shared_expressions is not None:
+            return context.shared_expressions.get_or_build(spec, lambda: cls._from_spec(spec, context))
+        return cls._from_spec(spec, context)
+
+    @classmethod
+    def _from_spec(cls, spec, context):
         try:
             return cls.spec_map[spec['type']](spec, context)
         except KeyError:
@@ -377,6 +383,10 @@ class ExpressionFactory(object):
             ))
 
 
+# types that ship with UCR, as opposed to those added with `register`
+CORE_EXPRESSION_TYPES = frozenset(ExpressionFactory.spec_map)
+
+
 def _is_literal(value):
     return not isinstance(value, dict)
 
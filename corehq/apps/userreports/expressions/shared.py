@@ -0,0 +1,137 @@
+import json
+
+from dimagi.utils.web import json_handler
+
+from corehq.apps.userreports.expressions.factory import CORE_EXPRESSION_TYPES
+
+# expression types whose value depends on more than the item and root doc
+# and so can't be shared between data sources
+UNSHAREABLE_EXPRESSION_TYPES = {
+    'base_iteration_number',
+    'named',
+}
+
+# expression types that are too cheap to be worth caching
+TRIVIAL_EXPRESSION_TYPES = {
+    'constant',
+    'identity',
+}
+
+SHAREABLE_FILTER_TYPES = {
+    'and',
+    'boolean_expression',
+    'not',
+    'or',
+    'property_match',
+}
+
+_MISSING = object()
+
+
+class SharedExpression(object):
+    """
+    Wraps a compiled expression so that its value is computed once per item
+    for the lifetime of an EvaluationContext. Every data source compiled against
+    the same SharedExpressionPool holds the same instance, so the value is
+    reused across data sources when they are evaluated with a common context.
+    """
+
+    def __init__(self, key, expression, pool):
+        self._key = key
+        self._expression = expression
+        self._pool = pool
+        self._cache_key_prefix = 'shared_expression-{}'.format(id(self))
+
+    def __call__(self, item, context=None):
+        if context is None:
+            return self._expression(item, context)
+
+        cache_key = (self._cache_key_prefix, id(item))
+        cached = context.get_cache_value(cache_key, _MISSING)
+        # the item is stored alongside the value to keep it alive, which stops
+        # its id from being reused by another object during this evaluation
+        if cached is not _MISSING and cached[0] is item:
+            self._pool.evaluation_hits += 1
+            return cached[1]
+
+        self._pool.evaluation_misses += 1
+        value = self._expression(item, context)
+        context.set_cache_value(cache_key, (item, value))
+        return value
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+        return getattr(self._expression, item)
+
+    def __str__(self):
+        return str(self._expression)
+
+
+class SharedExpressionPool(object):
+    """
+    Compile-time registry of expressions shared between data sources.
+
+    Expressions are keyed on their canonical JSON spec. Specs that reference
+    anything scoped to a single data source (named expressions or filters)
+    or to the iteration (``base_iteration_number``) are never shared, nor are
+    custom expression types since nothing is known about what they depend on.
+    """
+
+    def __init__(self):
+        self._expressions = {}
+        # every distinct compiled expression, inner expressions before the
+        # expressions that contain them
+        self.built_expressions = []
+        self.compiled_count = 0
+        self.shared_count = 0
+        self.evaluation_hits = 0
+        self.evaluation_misses = 0
+
+    def __len__(self):
+        return len(self._expressions)
+
+    def get_or_build(self, spec, build_fn):
+        """
+        Return the shared expression for ``spec``, calling ``build_fn()`` to
+        compile it if this is the first time it has been seen.
+        """
+        if spec['type'] in TRIVIAL_EXPRESSION_TYPES or not is_shareable_spec(spec):
+            return self._build(build_fn)
+
+        key = _get_spec_key(spec)
+        self.compiled_count += 1
+        if key in self._expressions:
+            self.shared_count += 1
+            return self._expressions[key]
+
+        expression = SharedExpression(key, self._build(build_fn), self)
+        self._expressions[key] = expression
+        return expression
+
+    def _build(self, build_fn):
+        expression = build_fn()
+        self.built_expressions.append(expression)
+        return expression
+
+    def reset_stats(self):
+        self.evaluation_hits = 0
+        self.evaluation_misses = 0
+
+
+def is_shareable_spec(spec):
+    if isinstance(spec, dict):
+        spec_type = spec.get('type')
+        if isinstance(spec_type, str) and (
+            spec_type in UNSHAREABLE_EXPRESSION_TYPES
+            or (spec_type not in CORE_EXPRESSION_TYPES and spec_type not in SHAREABLE_FILTER_TYPES)
+        ):
+            return False
+        return all(is_shareable_spec(value) for value in spec.values())
+    elif isinstance(spec, (list, tuple)):
+        return all(is_shareable_spec(value) for value in spec)
+    return True
+
+
+def _get_spec_key(spec):
+    return json.dumps(spec, sort_keys=True, default=json_handler)
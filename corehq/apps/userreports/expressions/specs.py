@@ -505,13 +505,21 @@ class RelatedDocExpressionSpec(JsonObject):
         self._value_expression = value_expression
 
     def __call__(self, item, context=None):
-        doc_id = self._doc_id_expression(item, context)
+        doc_id = self.get_doc_id(item, context)
         if doc_id:
             return self.get_value(doc_id, context)
 
+    def get_doc_id(self, item, context=None):
+        return self._doc_id_expression(item, context)
+
     @staticmethod
     @ucr_context_cache(vary_on=('related_doc_type', 'doc_id',))
     def _get_document(related_doc_type, doc_id, context):
+        if context.prefetch_cache is not None:
+            found, doc = context.prefetch_cache.get_related_doc(related_doc_type, doc_id)
+            if found:
+                return doc
+
         document_store = get_document_store_for_doc_type(
             context.root_doc['domain'], related_doc_type,
             load_source="related_doc_expression")
@@ -527,7 +535,7 @@ class RelatedDocExpressionSpec(JsonObject):
         assert context.root_doc['domain']
         doc = self._get_document(self.related_doc_type, doc_id, context)
         # explicitly use a new evaluation context since this is a new document
-        return self._value_expression(doc, EvaluationContext(doc, 0))
+        return self._value_expression(doc, EvaluationContext(doc, 0, prefetch_cache=context.prefetch_cache))
 
     def __str__(self):
         return "{}[{}]/{}".format(self.related_doc_type,
@@ -724,7 +732,7 @@ class FormsExpressionSpec(JsonObject):
         self._case_id_expression = case_id_expression
 
     def __call__(self, item, context=None):
-        case_id = self._case_id_expression(item, context)
+        case_id = self.get_case_id(item, context)
 
         if not case_id:
             return []
@@ -732,6 +740,9 @@ class FormsExpressionSpec(JsonObject):
         assert context.root_doc['domain']
         return self._get_forms(case_id, context)
 
+    def get_case_id(self, item, context=None):
+        return self._case_id_expression(item, context)
+
     def _get_forms(self, case_id, context):
         domain = context.root_doc['domain']
 
@@ -750,6 +761,11 @@ class FormsExpressionSpec(JsonObject):
 
     @ucr_context_cache(vary_on=('case_id',))
     def _get_case_forms(self, case_id, context):
+        if context.prefetch_cache is not None:
+            found, forms = context.prefetch_cache.get_case_forms(case_id)
+            if found:
+                return forms
+
         domain = context.root_doc['domain']
         return FormProcessorInterface(domain).get_case_forms(case_id)
 
@@ -779,15 +795,23 @@ class SubcasesExpressionSpec(JsonObject):
         self._case_id_expression = case_id_expression
 
     def __call__(self, item, context=None):
-        case_id = self._case_id_expression(item, context)
+        case_id = self.get_case_id(item, context)
         if not case_id:
             return []
 
         assert context.root_doc['domain']
         return self._get_subcases(case_id, context)
 
+    def get_case_id(self, item, context=None):
+        return self._case_id_expression(item, context)
+
     @ucr_context_cache(vary_on=('case_id',))
     def _get_subcases(self, case_id, context):
+        if context.prefetch_cache is not None:
+            found, subcases = context.prefetch_cache.get_subcases(case_id)
+            if found:
+                return subcases
+
         domain = context.root_doc['domain']
         return [c.to_json() for c in CaseAccessors(domain).get_reverse_indexed_cases([case_id])]
 
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.dbaccessors import get_datasources_for_domain
+from corehq.apps.userreports.expressions.shared import SharedExpressionPool
+from corehq.apps.userreports.models import DataSourceConfiguration
+from corehq.apps.userreports.specs import EvaluationContext
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-doc transform time of a domain's data sources with and without "
+        "shared expressions, as the number of data sources grows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain')
+        parser.add_argument('referenced_doc_type')
+        parser.add_argument('doc_ids', nargs='+')
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--step', type=int, default=5)
+
+    def handle(self, domain, referenced_doc_type, doc_ids, **options):
+        configs = get_datasources_for_domain(domain, referenced_doc_type, include_static=True)
+        if not configs:
+            print("No data sources for {} {}".format(domain, referenced_doc_type))
+            return
+
+        doc_store = get_document_store_for_doc_type(
+            domain, referenced_doc_type, load_source="benchmark_shared_expressions")
+        docs = list(doc_store.iter_documents(doc_ids))
+        iterations = options['iterations']
+
+        print("configs\tseparate (ms/doc)\tshared (ms/doc)\tunique expressions")
+        counts = list(range(options['step'], len(configs), options['step'])) + [len(configs)]
+        for count in counts:
+            separate = [_copy_config(config) for config in configs[:count]]
+            shared = [_copy_config(config) for config in configs[:count]]
+            pool = SharedExpressionPool()
+            for config in shared:
+                config.share_expressions(pool)
+
+            separate_time = _time_transform(separate, docs, iterations)
+            shared_time = _time_transform(shared, docs, iterations)
+            print("{}\t{:.2f}\t{:.2f}\t{}".format(count, separate_time, shared_time, len(pool)))
+
+
+def _copy_config(config):
+    return DataSourceConfiguration.wrap(config.to_json())
+
+
+def _time_transform(configs, docs, iterations):
+    # warm up the memoized filters and indicators so only evaluation is timed
+    _transform(configs, docs)
+    start = datetime.utcnow()
+    for i in range(iterations):
+        _transform(configs, docs)
+    seconds = (datetime.utcnow() - start).total_seconds()
+    return seconds * 1000 / (iterations * len(docs))
+
+
+def _transform(configs, docs):
+    for doc in docs:
+        eval_context = EvaluationContext(doc)
+        for config in configs:
+            if config.filter(doc, eval_context):
+                config.get_all_values(doc, eval_context)
+                eval_context.reset_iteration()
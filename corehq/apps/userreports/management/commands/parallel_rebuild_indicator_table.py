@@ -0,0 +1,122 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from corehq.apps.userreports.models import id_is_static
+from corehq.apps.userreports.parallel_rebuild import (
+    REBUILD_CHUNK_SIZE,
+    ParallelRebuilder,
+    RebuildCheckpoints,
+    get_rebuild_ranges,
+    get_throughput_by_worker,
+)
+from corehq.apps.userreports.tasks import _get_config_by_id
+from corehq.apps.userreports.util import get_indicator_adapter
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild a user configurable reporting table using multiple processes. "
+        "Progress is checkpointed so an interrupted rebuild can be resumed with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('indicator_config_id')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of worker processes')
+        parser.add_argument('--chunk-size', type=int, default=REBUILD_CHUNK_SIZE, dest='chunk_size')
+        parser.add_argument('--resume', action='store_true', default=False,
+                            help='Resume a previous rebuild instead of dropping the table and starting over')
+        parser.add_argument('--status', action='store_true', default=False,
+                            help='Print the progress of the current rebuild and exit')
+        parser.add_argument('--initiated-by', action='store', dest='initiated',
+                            help='Who initiated the rebuild')
+
+    def handle(self, indicator_config_id, **options):
+        config = _get_config_by_id(indicator_config_id)
+        checkpoints = RebuildCheckpoints(config)
+
+        if options['status']:
+            self.print_status(config, checkpoints)
+            return
+
+        if options['resume']:
+            if not checkpoints.has_checkpoints():
+                raise CommandError("No rebuild to resume for {}".format(indicator_config_id))
+        else:
+            if not options['initiated']:
+                raise CommandError("--initiated-by is required when starting a new rebuild")
+            self.start_rebuild(config, checkpoints, options['initiated'])
+
+        self.throughput_by_worker = {}
+        rebuilder = ParallelRebuilder(config, options['workers'], chunk_size=options['chunk_size'])
+        start = datetime.utcnow()
+        success = rebuilder.run(progress_callback=self.print_range_complete)
+        elapsed = (datetime.utcnow() - start).total_seconds()
+
+        # checkpoints are cleared on success so report the totals collected as ranges completed
+        self.print_throughput(self.throughput_by_worker)
+        if not success:
+            raise CommandError(
+                "Some ranges failed. Check the logs and run again with --resume to continue."
+            )
+
+        self.stdout.write("Rebuild complete in {:.1f}s".format(elapsed))
+        if not id_is_static(indicator_config_id):
+            config = _get_config_by_id(indicator_config_id)
+            config.meta.build.finished = True
+            config.save()
+
+    def start_rebuild(self, config, checkpoints, initiated_by):
+        checkpoints.clear()
+        if not id_is_static(config._id):
+            config.meta.build.initiated = datetime.utcnow()
+            config.meta.build.finished = False
+            config.meta.build.rebuilt_asynchronously = False
+            config.save()
+        adapter = get_indicator_adapter(config)
+        adapter.rebuild_table(initiated_by=initiated_by, source='parallel_rebuild_indicator_table')
+
+    def print_range_complete(self, rebuild_range, progress):
+        totals = self.throughput_by_worker.setdefault(progress.worker, [0, 0.])
+        totals[0] += progress.processed
+        totals[1] += progress.seconds
+        self.stdout.write("Completed {}: {} docs in {:.1f}s ({:.1f} docs/s) by worker {}".format(
+            rebuild_range, progress.processed, progress.seconds, progress.docs_per_second, progress.worker
+        ))
+
+    def print_throughput(self, throughput_by_worker):
+        self.stdout.write("\nThroughput by worker:")
+        total_processed = 0
+        for worker, (processed, seconds) in sorted(throughput_by_worker.items(), key=lambda x: str(x[0])):
+            total_processed += processed
+            self.stdout.write("  {}: {} docs in {:.1f}s ({:.1f} docs/s)".format(
+                worker, processed, seconds, processed / seconds if seconds else 0.
+            ))
+        self.stdout.write("Total docs processed: {}".format(total_processed))
+
+    def print_status(self, config, checkpoints):
+        progress_by_key = checkpoints.get_all()
+        if not progress_by_key:
+            self.stdout.write("No rebuild in progress")
+            return
+
+        ranges = get_rebuild_ranges(config)
+        complete = 0
+        for rebuild_range in ranges:
+            progress = progress_by_key.get(rebuild_range.key)
+            if progress is None:
+                state = 'pending'
+            elif progress.complete:
+                complete += 1
+                state = 'complete'
+            else:
+                state = 'in progress'
+            self.stdout.write("{}: {}, {} docs".format(
+                rebuild_range, state, progress.processed if progress else 0
+            ))
+        self.stdout.write("{} of {} ranges complete".format(complete, len(ranges)))
+        self.print_throughput({
+            worker: (processed, seconds)
+            for worker, (processed, seconds, rate) in get_throughput_by_worker(checkpoints).items()
+        })
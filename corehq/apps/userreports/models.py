@@ -359,7 +359,11 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
                 try:
                     named_expressions[name] = ExpressionFactory.from_spec(
                         expression,
-                        FactoryContext(named_expressions=named_expressions, named_filters={})
+                        FactoryContext(
+                            named_expressions=named_expressions,
+                            named_filters={},
+                            shared_expressions=self.shared_expressions,
+                        )
                     )
                     number_generated += 1
                     del named_expression_specs[name]
@@ -376,11 +380,36 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
     @property
     @memoized
     def named_filter_objects(self):
-        return {name: FilterFactory.from_spec(filter, FactoryContext(self.named_expression_objects, {}))
+        factory_context = FactoryContext(self.named_expression_objects, {}, self.shared_expressions)
+        return {name: FilterFactory.from_spec(filter, factory_context)
                 for name, filter in self.named_filters.items()}
 
     def get_factory_context(self):
-        return FactoryContext(self.named_expression_objects, self.named_filter_objects)
+        return FactoryContext(self.named_expression_objects, self.named_filter_objects, self.shared_expressions)
+
+    @property
+    def shared_expressions(self):
+        return getattr(self, '_shared_expressions', None)
+
+    def share_expressions(self, pool):
+        """
+        Compile this data source's filters and indicators against a
+        SharedExpressionPool so that sub-expressions which are identical to those
+        of other data sources compiled against the same pool are only evaluated
+        once per document (provided the same EvaluationContext is used).
+        """
+        self._shared_expressions = pool
+        for method in (
+            DataSourceConfiguration.named_expression_objects.fget,
+            DataSourceConfiguration.named_filter_objects.fget,
+            DataSourceConfiguration.default_indicators.fget,
+            DataSourceConfiguration.indicators.fget,
+            DataSourceConfiguration.parsed_expression.fget,
+            DataSourceConfiguration._validations,
+            DataSourceConfiguration._get_main_filter,
+            DataSourceConfiguration._get_deleted_filter,
+        ):
+            method.reset_cache(self)
 
     @property
     @memoized
@@ -0,0 +1,320 @@
+"""
+Rebuild a UCR data source using multiple processes.
+
+The documents for a data source are split into ranges: one per case type / xmlns
+for each form processor shard DB (or one per case type / xmlns for couch
+domains). Ranges are processed by a pool of worker processes. Each range
+checkpoints its position in redis after every chunk so that a rebuild that is
+killed part way through can be resumed where it stopped.
+
+To rebuild a data source run the following:
+
+    ParallelRebuilder(config, num_workers).run()
+
+See the ``parallel_rebuild_indicator_table`` management command.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+
+import attr
+from django.db import connections
+from django.db.models import Q
+
+from dimagi.utils.chunked import chunked
+from dimagi.utils.couch import get_redis_client
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.models import (
+    AsyncIndicator,
+    DataSourceConfiguration,
+    StaticDataSourceConfiguration,
+    id_is_static,
+)
+from corehq.apps.userreports.rebuild import get_redis_key_for_config
+from corehq.apps.userreports.util import get_indicator_adapter
+from corehq.form_processor.models import CommCareCaseSQL, XFormInstanceSQL
+from corehq.form_processor.utils import should_use_sql_backend
+from corehq.sql_db.connections import connection_manager
+from corehq.sql_db.util import get_db_aliases_for_partitioned_query
+
+logger = logging.getLogger(__name__)
+
+REBUILD_CHUNK_SIZE = 1000
+
+
+@attr.s(frozen=True)
+class RebuildRange(object):
+    case_type_or_xmlns = attr.ib()
+    db_alias = attr.ib(default=None)
+
+    @property
+    def key(self):
+        return '{}:{}'.format(self.case_type_or_xmlns, self.db_alias or '')
+
+    def __str__(self):
+        if self.db_alias:
+            return '{} ({})'.format(self.case_type_or_xmlns, self.db_alias)
+        return str(self.case_type_or_xmlns)
+
+
+@attr.s
+class RangeProgress(object):
+    # primary key of the last processed row for SQL ranges, number of IDs
+    # processed for couch ranges
+    position = attr.ib(default=None)
+    processed = attr.ib(default=0)
+    seconds = attr.ib(default=0.)
+    worker = attr.ib(default=None)
+    complete = attr.ib(default=False)
+
+    @property
+    def docs_per_second(self):
+        return self.processed / self.seconds if self.seconds else 0.
+
+
+class RebuildCheckpoints(object):
+    """Stores the progress of each range of a data source rebuild in redis"""
+
+    def __init__(self, config):
+        self._client = get_redis_client().client.get_client()
+        self._key = 'ucr_parallel_rebuild-{}'.format(get_redis_key_for_config(config))
+
+    def get(self, rebuild_range):
+        value = self._client.hget(self._key, rebuild_range.key)
+        return _load_progress(value) if value else RangeProgress()
+
+    def get_all(self):
+        return {
+            _decode(range_key): _load_progress(value)
+            for range_key, value in self._client.hgetall(self._key).items()
+        }
+
+    def set(self, rebuild_range, progress):
+        self._client.hset(self._key, rebuild_range.key, json.dumps(attr.asdict(progress)))
+
+    def clear(self):
+        self._client.delete(self._key)
+
+    def has_checkpoints(self):
+        return self._client.exists(self._key)
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def _load_progress(value):
+    return RangeProgress(**json.loads(_decode(value)))
+
+
+def get_rebuild_ranges(config):
+    ranges = []
+    for case_type_or_xmlns in config.get_case_type_or_xmlns_filter():
+        if _get_sql_model(config):
+            ranges.extend(
+                RebuildRange(case_type_or_xmlns, db_alias)
+                for db_alias in get_db_aliases_for_partitioned_query()
+            )
+        else:
+            ranges.append(RebuildRange(case_type_or_xmlns))
+    return ranges
+
+
+def _get_sql_model(config):
+    if not should_use_sql_backend(config.domain):
+        return None
+    return {
+        'CommCareCase': CommCareCaseSQL,
+        'XFormInstance': XFormInstanceSQL,
+    }.get(config.referenced_doc_type)
+
+
+def iter_range_doc_ids(config, rebuild_range, progress, chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    :return: generator of (doc_ids, position) tuples where ``position`` is the
+             checkpoint to record once ``doc_ids`` have been processed
+    """
+    model = _get_sql_model(config)
+    if model is not None:
+        return _iter_sql_doc_ids(config, model, rebuild_range, progress.position, chunk_size)
+    return _iter_document_store_ids(config, rebuild_range, progress.position or 0, chunk_size)
+
+
+def _iter_sql_doc_ids(config, model, rebuild_range, last_pk, chunk_size):
+    q_expr = Q(domain=config.domain)
+    if model is CommCareCaseSQL:
+        id_field = 'case_id'
+        q_expr &= Q(deleted=False)
+        if rebuild_range.case_type_or_xmlns is not None:
+            q_expr &= Q(type=rebuild_range.case_type_or_xmlns)
+    else:
+        id_field = 'form_id'
+        q_expr &= Q(state=XFormInstanceSQL.NORMAL)
+        if rebuild_range.case_type_or_xmlns is not None:
+            q_expr &= Q(xmlns=rebuild_range.case_type_or_xmlns)
+
+    query = model.objects.using(rebuild_range.db_alias).filter(q_expr).order_by('pk')
+    while True:
+        page = query
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        rows = list(page.values_list('pk', id_field)[:chunk_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        yield [doc_id for pk, doc_id in rows], last_pk
+
+
+def _iter_document_store_ids(config, rebuild_range, skip, chunk_size):
+    document_store = get_document_store_for_doc_type(
+        config.domain, config.referenced_doc_type,
+        case_type_or_xmlns=rebuild_range.case_type_or_xmlns,
+        load_source="parallel_rebuild",
+    )
+    position = 0
+    for doc_ids in chunked(document_store.iter_document_ids(), chunk_size, list):
+        position += len(doc_ids)
+        if position <= skip:
+            continue
+        yield doc_ids, position
+
+
+def build_indicators_for_ids(config, adapter, doc_ids):
+    document_store = get_document_store_for_doc_type(
+        config.domain, config.referenced_doc_type, load_source="parallel_rebuild")
+    docs = list(document_store.iter_documents(doc_ids))
+    if config.asynchronous:
+        AsyncIndicator.bulk_update_records(
+            {doc['_id']: [config._id] for doc in docs},
+            config.domain,
+            {doc['_id']: config.referenced_doc_type for doc in docs},
+        )
+        return len(docs)
+
+    rows_by_doc_id = defaultdict(list)
+    for doc in docs:
+        try:
+            rows_by_doc_id[doc['_id']] = adapter.get_all_values(doc)
+        except Exception as e:
+            adapter.handle_exception(doc, e)
+
+    try:
+        adapter.save_rows([row for rows in rows_by_doc_id.values() for row in rows])
+    except Exception:
+        # fall back to saving docs one at a time so a single bad doc
+        # doesn't prevent the rest of the chunk from being saved
+        for doc in docs:
+            if doc['_id'] in rows_by_doc_id:
+                adapter._best_effort_save_rows(rows_by_doc_id[doc['_id']], doc)
+    return len(docs)
+
+
+def _get_config(config_id):
+    if id_is_static(config_id):
+        return StaticDataSourceConfiguration.by_id(config_id)
+    return DataSourceConfiguration.get(config_id)
+
+
+def build_range(config_id, rebuild_range, chunk_size=REBUILD_CHUNK_SIZE):
+    """Worker function: process a single range, checkpointing after each chunk"""
+    config = _get_config(config_id)
+    adapter = get_indicator_adapter(config, load_source='parallel_rebuild')
+    checkpoints = RebuildCheckpoints(config)
+    progress = checkpoints.get(rebuild_range)
+    if progress.complete:
+        return rebuild_range, progress
+
+    progress.worker = os.getpid()
+    try:
+        for doc_ids, position in iter_range_doc_ids(config, rebuild_range, progress, chunk_size):
+            start = time.time()
+            build_indicators_for_ids(config, adapter, doc_ids)
+            progress.seconds += time.time() - start
+            progress.processed += len(doc_ids)
+            progress.position = position
+            checkpoints.set(rebuild_range, progress)
+    except Exception:
+        # log here since the traceback is lost on the other side of the process pool
+        logger.exception("Error rebuilding range %s of %s", rebuild_range, config_id)
+        raise
+
+    progress.complete = True
+    checkpoints.set(rebuild_range, progress)
+    return rebuild_range, progress
+
+
+def _build_range_star(args):
+    return build_range(*args)
+
+
+class ParallelRebuilder(object):
+    """Rebuild the rows for a data source by processing ranges of docs in parallel"""
+
+    def __init__(self, config, num_workers, chunk_size=REBUILD_CHUNK_SIZE):
+        assert num_workers > 0
+        self.config = config
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.checkpoints = RebuildCheckpoints(config)
+
+    def get_pending_ranges(self):
+        return [
+            rebuild_range for rebuild_range in get_rebuild_ranges(self.config)
+            if not self.checkpoints.get(rebuild_range).complete
+        ]
+
+    def run(self, progress_callback=None):
+        """
+        :param progress_callback: called with ``(RebuildRange, RangeProgress)``
+                                  as each range completes
+        :return: True if all ranges were completed
+        """
+        ranges = self.get_pending_ranges()
+        args = [(self.config._id, rebuild_range, self.chunk_size) for rebuild_range in ranges]
+
+        # connections can't be shared with forked processes
+        connections.close_all()
+        connection_manager.dispose_all()
+
+        success = True
+        pool = multiprocessing.Pool(processes=self.num_workers)
+        try:
+            results = pool.imap_unordered(_build_range_star, args)
+            while True:
+                try:
+                    rebuild_range, progress = next(results)
+                except StopIteration:
+                    break
+                except Exception:
+                    # already logged by the worker, leave the range to be resumed
+                    success = False
+                    continue
+                if progress_callback:
+                    progress_callback(rebuild_range, progress)
+        finally:
+            pool.close()
+            pool.join()
+
+        if success:
+            self.checkpoints.clear()
+        return success
+
+
+def get_throughput_by_worker(checkpoints):
+    """
+    :return: dict of worker -> (docs processed, seconds, docs / second)
+    """
+    totals = defaultdict(lambda: [0, 0.])
+    for progress in checkpoints.get_all().values():
+        totals[progress.worker][0] += progress.processed
+        totals[progress.worker][1] += progress.seconds
+    return {
+        worker: (processed, seconds, processed / seconds if seconds else 0.)
+        for worker, (processed, seconds) in totals.items()
+    }
@@ -31,7 +31,9 @@ from corehq.apps.userreports.exceptions import (
     TableRebuildError,
     UserReportsWarning,
 )
+from corehq.apps.userreports.expressions.shared import SharedExpressionPool
 from corehq.apps.userreports.models import AsyncIndicator
+from corehq.apps.userreports.prefetch import prefetch_related_docs
 from corehq.apps.userreports.rebuild import (
     get_table_diffs,
     get_tables_rebuild_migrate,
@@ -42,7 +44,11 @@ from corehq.apps.userreports.sql import get_metadata
 from corehq.apps.userreports.tasks import rebuild_indicators
 from corehq.apps.userreports.util import get_indicator_adapter
 from corehq.sql_db.connections import connection_manager
-from corehq.util.datadog.gauges import datadog_bucket_timer, datadog_histogram
+from corehq.util.datadog.gauges import (
+    datadog_bucket_timer,
+    datadog_counter,
+    datadog_histogram,
+)
 from corehq.util.soft_assert import soft_assert
 from corehq.util.timer import TimingContext
 
@@ -130,6 +136,7 @@ class ConfigurableReportTableManagerMixin(object):
         self.exclude_ucrs = exclude_ucrs
         self.bootstrap_interval = bootstrap_interval
         self.run_migrations = run_migrations
+        self.shared_expressions_by_domain = {}
         if self.include_ucrs and self.ucr_division:
             raise PillowConfigError("You can't have include_ucrs and ucr_division")
 
@@ -171,8 +178,12 @@ class ConfigurableReportTableManagerMixin(object):
             pillow_logging.warning("UCR pillow has no configs to process")
 
         self.table_adapters_by_domain = defaultdict(list)
+        # all data sources in a domain are compiled into one plan so identical
+        # sub-expressions are only evaluated once per doc
+        self.shared_expressions_by_domain = defaultdict(SharedExpressionPool)
 
         for config in configs:
+            config.share_expressions(self.shared_expressions_by_domain[config.domain])
             self.table_adapters_by_domain[config.domain].append(
                 get_indicator_adapter(config, raise_errors=True, load_source='change_feed')
             )
@@ -309,11 +320,14 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
             retry_changes, docs = bulk_fetch_changes_docs(to_update, domain)
         change_exceptions = []
 
+        with self._datadog_timing('prefetch'):
+            prefetch_cache, eval_contexts_by_doc_id = self._prefetch_related_docs(domain, docs)
+
         with self._datadog_timing('single_batch_transform'):
             for doc in docs:
                 change = changes_by_id[doc['_id']]
                 doc_subtype = change.metadata.document_subtype
-                eval_context = EvaluationContext(doc)
+                eval_context = eval_contexts_by_doc_id.get(doc['_id']) or EvaluationContext(doc)
                 with self._datadog_timing('single_doc_transform'):
                     for adapter in adapters:
                         with self._datadog_timing('transform', adapter.config._id):
@@ -355,6 +369,10 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
                     except Exception:
                         retry_changes.update(to_update)
 
+        self._record_shared_expression_stats(domain)
+        if prefetch_cache is not None:
+            self._record_prefetch_stats(prefetch_cache)
+
         if async_configs_by_doc_id:
             with self._datadog_timing('async_config_load'):
                 doc_type_by_id = {
@@ -365,6 +383,31 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
 
         return retry_changes, change_exceptions
 
+    def _prefetch_related_docs(self, domain, docs):
+        pool = self.shared_expressions_by_domain.get(domain)
+        if pool is None or not docs:
+            return None, {}
+        try:
+            return prefetch_related_docs(domain, docs, pool)
+        except Exception as e:
+            # docs will be loaded individually during evaluation instead
+            pillow_logging.exception("Error prefetching UCR related docs for domain %s: %s", domain, e)
+            return None, {}
+
+    def _record_prefetch_stats(self, prefetch_cache):
+        tags = ['index:ucr']
+        datadog_counter('commcare.change_feed.ucr.prefetch.hits', prefetch_cache.hits, tags=tags)
+        datadog_counter('commcare.change_feed.ucr.prefetch.misses', prefetch_cache.misses, tags=tags)
+
+    def _record_shared_expression_stats(self, domain):
+        pool = self.shared_expressions_by_domain.get(domain)
+        if pool is None:
+            return
+        tags = ['index:ucr']
+        datadog_counter('commcare.change_feed.ucr.shared_expression.hits', pool.evaluation_hits, tags=tags)
+        datadog_counter('commcare.change_feed.ucr.shared_expression.misses', pool.evaluation_misses, tags=tags)
+        pool.reset_stats()
+
     def _datadog_timing(self, step, config_id=None):
         tags = [
             'action:{}'.format(step),
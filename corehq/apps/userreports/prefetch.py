@@ -0,0 +1,174 @@
+from collections import defaultdict
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.expressions.specs import (
+    FormsExpressionSpec,
+    RelatedDocExpressionSpec,
+    SubcasesExpressionSpec,
+)
+from corehq.apps.userreports.specs import EvaluationContext
+from corehq.form_processor.backends.sql.dbaccessors import FormAccessorSQL
+from corehq.form_processor.interfaces.dbaccessors import (
+    CaseAccessors,
+    FormAccessors,
+)
+from corehq.form_processor.utils import should_use_sql_backend
+
+PREFETCHABLE_EXPRESSION_TYPES = (
+    RelatedDocExpressionSpec,
+    SubcasesExpressionSpec,
+    FormsExpressionSpec,
+)
+
+
+class PrefetchCache(object):
+    """
+    Chunk scoped cache of documents referenced by ``related_doc``,
+    ``get_subcases`` and ``get_case_forms`` expressions.
+
+    It is populated in bulk by ``prefetch_related_docs`` before a chunk of
+    documents is evaluated and attached to each document's EvaluationContext.
+    Lookups for anything that wasn't prefetched are counted as misses and
+    fall back to loading the document individually.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.related_docs = {}
+        self.subcases = {}
+        self.case_forms = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_related_doc(self, doc_type, doc_id):
+        return self._get(self.related_docs, (doc_type, doc_id))
+
+    def get_subcases(self, case_id):
+        return self._get(self.subcases, case_id)
+
+    def get_case_forms(self, case_id):
+        return self._get(self.case_forms, case_id)
+
+    def _get(self, cache, key):
+        """
+        :return: tuple of (found, value)
+        """
+        if key in cache:
+            self.hits += 1
+            return True, cache[key]
+        self.misses += 1
+        return False, None
+
+    def load_related_docs(self, doc_type, doc_ids):
+        doc_ids = [doc_id for doc_id in doc_ids if (doc_type, doc_id) not in self.related_docs]
+        if not doc_ids:
+            return
+        document_store = get_document_store_for_doc_type(
+            self.domain, doc_type, load_source="related_doc_prefetch")
+        # docs that aren't found or are in another domain are cached as None,
+        # matching RelatedDocExpressionSpec
+        docs_by_id = {
+            doc['_id']: doc
+            for doc in document_store.iter_documents(doc_ids)
+            if doc.get('domain') == self.domain
+        }
+        for doc_id in doc_ids:
+            self.related_docs[(doc_type, doc_id)] = docs_by_id.get(doc_id)
+
+    def load_subcases(self, case_ids):
+        case_ids = [case_id for case_id in case_ids if case_id not in self.subcases]
+        if not case_ids:
+            return
+        subcases_by_case_id = defaultdict(list)
+        requested_ids = set(case_ids)
+        for subcase in CaseAccessors(self.domain).get_reverse_indexed_cases(case_ids):
+            subcase_json = subcase.to_json()
+            for referenced_id in {index.referenced_id for index in subcase.indices}:
+                if referenced_id in requested_ids:
+                    subcases_by_case_id[referenced_id].append(subcase_json)
+        for case_id in case_ids:
+            self.subcases[case_id] = subcases_by_case_id[case_id]
+
+    def load_case_forms(self, case_ids):
+        case_ids = [case_id for case_id in case_ids if case_id not in self.case_forms]
+        if not case_ids:
+            return
+        form_ids_by_case_id = CaseAccessors(self.domain).get_case_xform_ids_by_case_id(case_ids)
+        all_form_ids = list({
+            form_id
+            for form_ids in form_ids_by_case_id.values()
+            for form_id in form_ids
+        })
+        if should_use_sql_backend(self.domain):
+            forms = FormAccessorSQL.get_forms_with_attachments_meta(all_form_ids)
+        else:
+            forms = FormAccessors(self.domain).iter_forms(all_form_ids)
+        forms_by_id = {form.form_id: form for form in forms}
+        for case_id, form_ids in form_ids_by_case_id.items():
+            self.case_forms[case_id] = [
+                forms_by_id[form_id] for form_id in form_ids if form_id in forms_by_id
+            ]
+
+
+def get_prefetchable_expressions(pool):
+    return [
+        expression for expression in pool.built_expressions
+        if isinstance(expression, PREFETCHABLE_EXPRESSION_TYPES)
+    ]
+
+
+def prefetch_related_docs(domain, docs, pool):
+    """
+    Bulk load every document that the data sources compiled against ``pool``
+    will look up while evaluating ``docs``.
+
+    Expressions are processed in the order they were compiled, which puts
+    nested lookups ahead of the lookups that depend on them, so the IDs for
+    later lookups can be computed from the already prefetched documents.
+
+    :return: tuple of (PrefetchCache, dict of doc ID -> EvaluationContext). The
+             contexts already have the prefetch cache attached and should be used
+             when evaluating the docs so that any values computed here are reused.
+    """
+    prefetch_cache = PrefetchCache(domain)
+    contexts_by_doc_id = {
+        doc['_id']: EvaluationContext(doc, prefetch_cache=prefetch_cache)
+        for doc in docs
+    }
+    for expression in get_prefetchable_expressions(pool):
+        related_ids = set()
+        for doc in docs:
+            related_id = _get_related_id(expression, doc, contexts_by_doc_id[doc['_id']])
+            if related_id and isinstance(related_id, str):
+                related_ids.add(related_id)
+        if not related_ids:
+            continue
+
+        related_ids = list(related_ids)
+        if isinstance(expression, RelatedDocExpressionSpec):
+            prefetch_cache.load_related_docs(expression.related_doc_type, related_ids)
+        elif isinstance(expression, SubcasesExpressionSpec):
+            prefetch_cache.load_subcases(related_ids)
+        elif isinstance(expression, FormsExpressionSpec):
+            prefetch_cache.load_case_forms(related_ids)
+
+    # the ID lookups above shouldn't count towards evaluation stats
+    prefetch_cache.hits = prefetch_cache.misses = 0
+    for context in contexts_by_doc_id.values():
+        context.reset_iteration()
+    return prefetch_cache, contexts_by_doc_id
+
+
+def _get_related_id(expression, doc, context):
+    # Only lookups made against the root document can be prefetched; lookups
+    # made from repeat items will generally produce no ID here and fall back to
+    # loading individually.
+    try:
+        if isinstance(expression, RelatedDocExpressionSpec):
+            return expression.get_doc_id(doc, context)
+        return expression.get_case_id(doc, context)
+    except Exception:
+        # errors are surfaced when the doc is actually evaluated
+        return None
@@ -13,7 +13,18 @@ def TypeProperty(value):
     return StringProperty(required=True, choices=[value])
 
 
-class FactoryContext(namedtuple('FactoryContext', ('named_expressions', 'named_filters'))):
+class FactoryContext(namedtuple('FactoryContext', ('named_expressions', 'named_filters', 'shared_expressions'))):
+    """
+    Context used when building expressions and filters from their specs.
+
+    ``shared_expressions`` is an optional
+    :py:class:`corehq.apps.userreports.expressions.shared.SharedExpressionPool`.
+    When set, identical sub-expressions are compiled once and their values are
+    shared between every data source built against the same pool.
+    """
+
+    def __new__(cls, named_expressions, named_filters, shared_expressions=None):
+        return super(FactoryContext, cls).__new__(cls, named_expressions, named_filters, shared_expressions)
 
     @staticmethod
     def empty():
@@ -26,9 +37,11 @@ class EvaluationContext(object):
     as the root document and the iteration number.
     """
 
-    def __init__(self, root_doc, iteration=0):
+    def __init__(self, root_doc, iteration=0, prefetch_cache=None):
         self.root_doc = root_doc
         self.iteration = iteration
+        # optional corehq.apps.userreports.prefetch.PrefetchCache shared by a chunk of docs
+        self.prefetch_cache = prefetch_cache
         self.inserted_timestamp = datetime.utcnow()
         self.cache = {}
         self.iteration_cache = {}
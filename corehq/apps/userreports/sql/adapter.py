@@ -12,11 +12,13 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.schema import Index, PrimaryKeyConstraint
 
 from corehq.apps.userreports.adapter import IndicatorAdapter
+from corehq.apps.userreports.const import UCR_COPY_LOAD_THRESHOLD
 from corehq.apps.userreports.exceptions import (
     ColumnNotFoundError,
     TableRebuildError,
     translate_programming_error,
 )
+from corehq.apps.userreports.sql.bulk_load import copy_rows
 from corehq.apps.userreports.sql.columns import column_to_sql
 from corehq.apps.userreports.util import get_table_name
 from corehq.sql_db.connections import connection_manager
@@ -34,6 +36,7 @@ def get_metadata(engine_id):
 
 
 class IndicatorSqlAdapter(IndicatorAdapter):
+    copy_load_threshold = UCR_COPY_LOAD_THRESHOLD
 
     def __init__(self, config, override_table_name=None, engine_id=None):
         super(IndicatorSqlAdapter, self).__init__(config)
@@ -180,6 +183,10 @@ class IndicatorSqlAdapter(IndicatorAdapter):
             {i.column.database_column_name.decode('utf-8'): i.value for i in row}
             for row in rows
         ]
+        if len(formatted_rows) >= self.copy_load_threshold:
+            self._copy_rows(formatted_rows)
+            return
+
         if self.session_helper.is_citus_db:
             config = self.config.sql_settings.citus_config
             if config.distribution_type == 'hash':
@@ -205,6 +212,28 @@ class IndicatorSqlAdapter(IndicatorAdapter):
             for query in queries:
                 session.execute(query)
 
+    def _copy_rows(self, rows):
+        """
+        Save a large batch of rows by streaming them into a staging table with
+        COPY and merging them into the table from there.
+        """
+        distribution_column = None
+        if self.session_helper.is_citus_db:
+            config = self.config.sql_settings.citus_config
+            if config.distribution_type == 'hash':
+                distribution_column = config.distribution_column
+
+        with self.session_context() as session:
+            cursor = session.connection().connection.cursor()
+            try:
+                copy_rows(
+                    cursor, self.get_table(), rows,
+                    distribution_column=distribution_column,
+                    upsert=self.supports_upsert(),
+                )
+            finally:
+                cursor.close()
+
     def _by_column_update(self, rows):
         config = self.config.sql_settings.citus_config
         shard_col = config.distribution_column
@@ -0,0 +1,172 @@
+"""
+Load large batches of UCR rows with PostgreSQL ``COPY``.
+
+Rows are streamed into a temporary staging table with ``COPY ... FROM STDIN``
+and then merged into the data source table with a single statement (or one
+statement per distribution column value for Citus hash distributed tables).
+This avoids building and binding a huge ``INSERT ... VALUES`` statement.
+"""
+import datetime
+import uuid
+
+from psycopg2 import sql
+
+COPY_NULL = '\\N'
+
+_COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\t': '\\t',
+})
+
+
+def copy_rows(cursor, table, rows, distribution_column=None, upsert=True):
+    """
+    :param cursor: psycopg2 cursor inside the transaction the rows should be saved in
+    :param table: sqlalchemy table to save the rows to
+    :param rows: list of dicts mapping column name to value
+    :param distribution_column: Citus distribution column. If supplied rows are
+        merged one distribution column value at a time so that each statement
+        only touches a single shard.
+    :param upsert: merge with ``INSERT ... ON CONFLICT DO UPDATE`` if True otherwise
+        delete existing rows for the docs and insert the new ones
+    """
+    column_names = list(rows[0])
+    staging_table = _create_staging_table(cursor, table)
+    cursor.copy_expert(
+        sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(staging_table),
+            sql.SQL(', ').join(map(sql.Identifier, column_names)),
+        ).as_string(cursor),
+        RowStream(rows, column_names),
+    )
+
+    if distribution_column:
+        for shard_value in {row[distribution_column] for row in rows}:
+            _merge_staging_table(
+                cursor, table, staging_table, column_names, upsert, distribution_column, shard_value
+            )
+    else:
+        _merge_staging_table(cursor, table, staging_table, column_names, upsert)
+
+
+def _create_staging_table(cursor, table):
+    staging_table = 'tmp_ucr_copy_{}'.format(uuid.uuid4().hex[:12])
+    cursor.execute(sql.SQL(
+        "CREATE TEMPORARY TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP"
+    ).format(sql.Identifier(staging_table), sql.Identifier(table.name)))
+    return staging_table
+
+
+def _merge_staging_table(cursor, table, staging_table, column_names, upsert,
+                         distribution_column=None, shard_value=None):
+    target = sql.Identifier(table.name)
+    staging = sql.Identifier(staging_table)
+    columns = sql.SQL(', ').join(map(sql.Identifier, column_names))
+    if distribution_column:
+        shard_condition, params = _shard_condition(distribution_column, shard_value)
+        where = sql.SQL(" WHERE {}").format(shard_condition)
+    else:
+        shard_condition, params = None, []
+        where = sql.SQL("")
+
+    if upsert:
+        primary_key = [col.name for col in table.primary_key]
+        updates = [
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(name))
+            for name in column_names if name not in primary_key
+        ]
+        if updates:
+            on_conflict = sql.SQL("DO UPDATE SET {}").format(sql.SQL(', ').join(updates))
+        else:
+            on_conflict = sql.SQL("DO NOTHING")
+        cursor.execute(sql.SQL(
+            "INSERT INTO {target} ({columns}) SELECT {columns} FROM {staging}{where} "
+            "ON CONFLICT ({primary_key}) {on_conflict}"
+        ).format(
+            target=target,
+            columns=columns,
+            staging=staging,
+            where=where,
+            primary_key=sql.SQL(', ').join(map(sql.Identifier, primary_key)),
+            on_conflict=on_conflict,
+        ), params)
+        return
+
+    # as in IndicatorSqlAdapter._by_column_update the shard column is included in
+    # the delete so Citus only locks a single shard
+    delete_where = sql.SQL("doc_id IN (SELECT doc_id FROM {}{})").format(staging, where)
+    if shard_condition is not None:
+        delete_where = sql.SQL("{} AND {}").format(shard_condition, delete_where)
+    cursor.execute(sql.SQL("DELETE FROM {} WHERE {}").format(target, delete_where), params + params)
+    cursor.execute(sql.SQL(
+        "INSERT INTO {target} ({columns}) SELECT {columns} FROM {staging}{where}"
+    ).format(target=target, columns=columns, staging=staging, where=where), params)
+
+
+def _shard_condition(column, value):
+    if value is None:
+        return sql.SQL("{} IS NULL").format(sql.Identifier(column)), []
+    return sql.SQL("{} = %s").format(sql.Identifier(column)), [value]
+
+
+class RowStream(object):
+    """
+    File-like object that lazily serializes rows to the PostgreSQL COPY text
+    format so the whole payload is never held in memory at once.
+    """
+
+    def __init__(self, rows, column_names):
+        self._lines = (format_copy_row(row, column_names) for row in rows)
+        self._buffer = ''
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._buffer + ''.join(self._lines)
+            self._buffer = ''
+            return data
+
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        for line in self._lines:
+            chunks.append(line)
+            length += len(line)
+            if length >= size:
+                break
+        data = ''.join(chunks)
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def format_copy_row(row, column_names):
+    return '\t'.join(format_copy_value(row[name]) for name in column_names) + '\n'
+
+
+def format_copy_value(value):
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, (list, tuple)):
+        text = _format_array(value)
+    else:
+        text = _to_text(value)
+    return text.translate(_COPY_ESCAPES)
+
+
+def _to_text(value):
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return str(value)
+
+
+def _format_array(values):
+    def _format_element(element):
+        if element is None:
+            return 'NULL'
+        return '"{}"'.format(_to_text(element).replace('\\', '\\\\').replace('"', '\\"'))
+
+    return '{' + ','.join(_format_element(element) for element in values) + '}'
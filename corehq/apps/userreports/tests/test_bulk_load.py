@@ -0,0 +1,112 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+from django.test import SimpleTestCase, TestCase
+
+from corehq.apps.userreports.app_manager.helpers import clean_table_name
+from corehq.apps.userreports.models import DataSourceConfiguration
+from corehq.apps.userreports.sql.bulk_load import (
+    RowStream,
+    format_copy_value,
+)
+from corehq.apps.userreports.util import get_indicator_adapter
+
+
+class FormatCopyValueTest(SimpleTestCase):
+
+    def test_null(self):
+        self.assertEqual('\\N', format_copy_value(None))
+
+    def test_empty_string(self):
+        self.assertEqual('', format_copy_value(''))
+
+    def test_escapes(self):
+        self.assertEqual('a\\tb\\nc\\\\d\\re', format_copy_value('a\tb\nc\\d\re'))
+
+    def test_bool(self):
+        self.assertEqual(['t', 'f'], [format_copy_value(True), format_copy_value(False)])
+
+    def test_numbers(self):
+        self.assertEqual(['1', '2.5'], [format_copy_value(1), format_copy_value(Decimal('2.5'))])
+
+    def test_dates(self):
+        self.assertEqual('2019-01-02', format_copy_value(datetime.date(2019, 1, 2)))
+        self.assertEqual('2019-01-02T03:04:05', format_copy_value(datetime.datetime(2019, 1, 2, 3, 4, 5)))
+
+    def test_array(self):
+        self.assertEqual('{"a","b\\\\"c",NULL}', format_copy_value(['a', 'b"c', None]))
+
+
+class RowStreamTest(SimpleTestCase):
+
+    def test_read_in_chunks(self):
+        rows = [{'doc_id': str(i), 'name': 'name {}'.format(i)} for i in range(50)]
+        expected = ''.join('{0}\tname {0}\n'.format(i) for i in range(50))
+        stream = RowStream(rows, ['doc_id', 'name'])
+        chunks = []
+        while True:
+            chunk = stream.read(7)
+            if not chunk:
+                break
+            self.assertLessEqual(len(chunk), 7)
+            chunks.append(chunk)
+        self.assertEqual(expected, ''.join(chunks))
+
+    def test_read_all(self):
+        stream = RowStream([{'doc_id': '1'}, {'doc_id': '2'}], ['doc_id'])
+        self.assertEqual('1\n2\n', stream.read())
+
+
+class CopySaveRowsTest(TestCase):
+
+    def setUp(self):
+        self.config = DataSourceConfiguration(
+            domain='domain',
+            display_name='foo',
+            referenced_doc_type='CommCareCase',
+            table_id=clean_table_name('domain', str(uuid.uuid4().hex)),
+            configured_indicators=[{
+                "type": "expression",
+                "expression": {
+                    "type": "property_name",
+                    "property_name": 'name'
+                },
+                "column_id": 'name',
+                "display_name": 'name',
+                "datatype": "string"
+            }],
+        )
+        self.adapter = get_indicator_adapter(self.config, raise_errors=True)
+        self.adapter.build_table()
+        self.adapter.copy_load_threshold = 1
+
+    def tearDown(self):
+        self.adapter.drop_table()
+
+    def _save(self, names_by_id):
+        rows = []
+        for doc_id, name in names_by_id.items():
+            rows.extend(self.adapter.get_all_values({
+                '_id': doc_id,
+                'domain': 'domain',
+                'doc_type': 'CommCareCase',
+                'name': name,
+            }))
+        self.adapter.save_rows(rows)
+
+    def _get_names(self):
+        table = self.adapter.get_table()
+        return {
+            row.doc_id: row.name
+            for row in self.adapter.get_query_object().with_entities(table.c.doc_id, table.c.name)
+        }
+
+    def test_insert(self):
+        self._save({'1': 'bob', '2': 'tab\tand "quotes"', '3': None})
+        self.assertEqual({'1': 'bob', '2': 'tab\tand "quotes"', '3': None}, self._get_names())
+
+    def test_update(self):
+        self._save({'1': 'bob', '2': 'alice'})
+        self._save({'2': 'carol', '3': 'dave'})
+        self.assertEqual({'1': 'bob', '2': 'carol', '3': 'dave'}, self._get_names())
@@ -0,0 +1,164 @@
+from django.test import SimpleTestCase
+
+from mock import MagicMock, patch
+
+from corehq.apps.userreports.parallel_rebuild import (
+    RangeProgress,
+    RebuildCheckpoints,
+    RebuildRange,
+    build_range,
+    get_rebuild_ranges,
+    get_throughput_by_worker,
+)
+
+
+class FakeRedis(object):
+
+    def __init__(self):
+        self.data = {}
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def hgetall(self, key):
+        return {
+            field.encode('utf-8'): value.encode('utf-8')
+            for field, value in self.data.get(key, {}).items()
+        }
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[field] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def exists(self, key):
+        return key in self.data
+
+
+def _config(doc_type='CommCareCase', filters=('c1', 'c2')):
+    config = MagicMock(domain='domain', referenced_doc_type=doc_type, _id='config-id', _rev='1-abc')
+    config.get_case_type_or_xmlns_filter.return_value = list(filters)
+    return config
+
+
+class ParallelRebuildTestBase(SimpleTestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = patch('corehq.apps.userreports.parallel_rebuild.get_redis_client')
+        get_redis_client = patcher.start()
+        get_redis_client.return_value.client.get_client.return_value = self.redis
+        self.addCleanup(patcher.stop)
+
+
+class RebuildCheckpointsTest(ParallelRebuildTestBase):
+
+    def test_round_trip(self):
+        checkpoints = RebuildCheckpoints(_config())
+        rebuild_range = RebuildRange('c1', 'p1')
+        self.assertEqual(RangeProgress(), checkpoints.get(rebuild_range))
+
+        progress = RangeProgress(position=10, processed=100, seconds=2., worker=123)
+        checkpoints.set(rebuild_range, progress)
+        self.assertEqual(progress, checkpoints.get(rebuild_range))
+        self.assertEqual({rebuild_range.key: progress}, checkpoints.get_all())
+
+        checkpoints.clear()
+        self.assertFalse(checkpoints.has_checkpoints())
+
+    def test_throughput_by_worker(self):
+        checkpoints = RebuildCheckpoints(_config())
+        checkpoints.set(RebuildRange('c1', 'p1'), RangeProgress(processed=100, seconds=2., worker=1))
+        checkpoints.set(RebuildRange('c1', 'p2'), RangeProgress(processed=50, seconds=3., worker=1))
+        checkpoints.set(RebuildRange('c2', 'p1'), RangeProgress(processed=30, seconds=0., worker=2))
+        self.assertEqual({
+            1: (150, 5., 30.),
+            2: (30, 0., 0.),
+        }, get_throughput_by_worker(checkpoints))
+
+
+@patch('corehq.apps.userreports.parallel_rebuild.get_db_aliases_for_partitioned_query',
+       return_value=['p1', 'p2'])
+class GetRebuildRangesTest(SimpleTestCase):
+
+    @patch('corehq.apps.userreports.parallel_rebuild.should_use_sql_backend', return_value=True)
+    def test_sql_ranges_per_shard(self, *args):
+        self.assertEqual([
+            RebuildRange('c1', 'p1'),
+            RebuildRange('c1', 'p2'),
+            RebuildRange('c2', 'p1'),
+            RebuildRange('c2', 'p2'),
+        ], get_rebuild_ranges(_config()))
+
+    @patch('corehq.apps.userreports.parallel_rebuild.should_use_sql_backend', return_value=True)
+    def test_sql_other_doc_type(self, *args):
+        self.assertEqual(
+            [RebuildRange(None)],
+            get_rebuild_ranges(_config(doc_type='CommCareUser', filters=[None]))
+        )
+
+    @patch('corehq.apps.userreports.parallel_rebuild.should_use_sql_backend', return_value=False)
+    def test_couch_ranges(self, *args):
+        self.assertEqual([RebuildRange('c1'), RebuildRange('c2')], get_rebuild_ranges(_config()))
+
+
+@patch('corehq.apps.userreports.parallel_rebuild.get_indicator_adapter')
+@patch('corehq.apps.userreports.parallel_rebuild.build_indicators_for_ids')
+@patch('corehq.apps.userreports.parallel_rebuild.iter_range_doc_ids')
+class BuildRangeTest(ParallelRebuildTestBase):
+
+    def setUp(self):
+        super(BuildRangeTest, self).setUp()
+        self.config = _config()
+        patcher = patch('corehq.apps.userreports.parallel_rebuild._get_config', return_value=self.config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rebuild_range = RebuildRange('c1', 'p1')
+
+    def test_checkpoint_after_each_chunk(self, iter_range_doc_ids, build_indicators_for_ids, _):
+        checkpoints = RebuildCheckpoints(self.config)
+        positions = []
+
+        def _build(config, adapter, doc_ids):
+            positions.append(checkpoints.get(self.rebuild_range).position)
+
+        build_indicators_for_ids.side_effect = _build
+        iter_range_doc_ids.return_value = [(['a', 'b'], 2), (['c'], 3)]
+        rebuild_range, progress = build_range('config-id', self.rebuild_range)
+
+        self.assertEqual([None, 2], positions)
+        self.assertEqual(3, progress.processed)
+        self.assertTrue(progress.complete)
+        self.assertEqual(progress, checkpoints.get(self.rebuild_range))
+
+    def test_failure_keeps_last_checkpoint(self, iter_range_doc_ids, build_indicators_for_ids, _):
+        build_indicators_for_ids.side_effect = [None, Exception('boom')]
+        iter_range_doc_ids.return_value = [(['a', 'b'], 2), (['c'], 3)]
+        with self.assertRaises(Exception):
+            build_range('config-id', self.rebuild_range)
+
+        progress = RebuildCheckpoints(self.config).get(self.rebuild_range)
+        self.assertEqual(2, progress.position)
+        self.assertEqual(2, progress.processed)
+        self.assertFalse(progress.complete)
+
+    def test_resume_from_checkpoint(self, iter_range_doc_ids, build_indicators_for_ids, _):
+        checkpoints = RebuildCheckpoints(self.config)
+        checkpoints.set(self.rebuild_range, RangeProgress(position=2, processed=2, seconds=1.))
+        start_positions = []
+
+        def _iter(config, rebuild_range, progress, chunk_size):
+            start_positions.append(progress.position)
+            return [(['c'], 3)]
+
+        iter_range_doc_ids.side_effect = _iter
+        rebuild_range, progress = build_range('config-id', self.rebuild_range)
+
+        self.assertEqual([2], start_positions)
+        self.assertEqual(3, progress.processed)
+
+    def test_skip_complete_range(self, iter_range_doc_ids, build_indicators_for_ids, _):
+        RebuildCheckpoints(self.config).set(self.rebuild_range, RangeProgress(complete=True))
+        build_range('config-id', self.rebuild_range)
+        self.assertFalse(iter_range_doc_ids.called)
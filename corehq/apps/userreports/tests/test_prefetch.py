@@ -0,0 +1,116 @@
+from django.test import SimpleTestCase
+
+from mock import MagicMock, patch
+
+from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.expressions.shared import SharedExpressionPool
+from corehq.apps.userreports.prefetch import (
+    PrefetchCache,
+    prefetch_related_docs,
+)
+from corehq.apps.userreports.specs import EvaluationContext, FactoryContext
+
+
+class PrefetchCacheTest(SimpleTestCase):
+
+    def test_hits_and_misses(self):
+        cache = PrefetchCache('domain')
+        cache.related_docs[('CommCareCase', 'found')] = {'_id': 'found'}
+        cache.related_docs[('CommCareCase', 'missing')] = None
+
+        self.assertEqual((True, {'_id': 'found'}), cache.get_related_doc('CommCareCase', 'found'))
+        self.assertEqual((True, None), cache.get_related_doc('CommCareCase', 'missing'))
+        self.assertEqual((False, None), cache.get_related_doc('CommCareCase', 'not-prefetched'))
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    @patch('corehq.apps.userreports.prefetch.should_use_sql_backend', return_value=True)
+    @patch('corehq.apps.userreports.prefetch.FormAccessorSQL')
+    @patch('corehq.apps.userreports.prefetch.CaseAccessors')
+    def test_load_case_forms(self, case_accessors, form_accessor, _):
+        form1, form2 = MagicMock(form_id='form1'), MagicMock(form_id='form2')
+        case_accessor = case_accessors.return_value
+        case_accessor.get_case_xform_ids_by_case_id.return_value = {
+            'case1': ['form1', 'form2'],
+            'case2': ['form2', 'missing'],
+        }
+        form_accessor.get_forms_with_attachments_meta.return_value = [form1, form2]
+
+        cache = PrefetchCache('domain')
+        cache.load_case_forms(['case1', 'case2'])
+
+        case_accessor.get_case_xform_ids_by_case_id.assert_called_once_with(['case1', 'case2'])
+        self.assertFalse(case_accessor.get_case_xform_ids.called)
+        self.assertEqual(1, form_accessor.get_forms_with_attachments_meta.call_count)
+        self.assertEqual({'case1': [form1, form2], 'case2': [form2]}, cache.case_forms)
+
+
+class PrefetchRelatedDocsTest(SimpleTestCase):
+    domain = 'prefetch-domain'
+
+    def setUp(self):
+        self.pool = SharedExpressionPool()
+        with patch('corehq.apps.userreports.expressions.specs.get_db_by_doc_type'):
+            self.expression = ExpressionFactory.from_spec({
+                "type": "related_doc",
+                "related_doc_type": "CommCareCase",
+                "doc_id_expression": {
+                    "type": "property_path",
+                    "property_path": ["form", "case", "@case_id"]
+                },
+                "value_expression": {
+                    "type": "property_name",
+                    "property_name": "owner_id"
+                }
+            }, FactoryContext({}, {}, self.pool))
+        self.docs = [
+            _form('form1', 'case1'),
+            _form('form2', 'case2'),
+            _form('form3', 'case1'),
+            _form('form4', 'other-domain-case'),
+        ]
+        self.related_docs = [
+            {'_id': 'case1', 'domain': self.domain, 'owner_id': 'owner1'},
+            {'_id': 'case2', 'domain': self.domain, 'owner_id': 'owner2'},
+            {'_id': 'other-domain-case', 'domain': 'other', 'owner_id': 'owner3'},
+        ]
+
+    def test_prefetch(self):
+        document_store = MagicMock()
+        document_store.iter_documents.return_value = self.related_docs
+        with patch('corehq.apps.userreports.prefetch.get_document_store_for_doc_type',
+                   return_value=document_store):
+            prefetch_cache, contexts = prefetch_related_docs(self.domain, self.docs, self.pool)
+
+        self.assertEqual(1, document_store.iter_documents.call_count)
+        self.assertEqual(
+            {'case1', 'case2', 'other-domain-case'},
+            set(document_store.iter_documents.call_args[0][0])
+        )
+
+        with patch('corehq.apps.userreports.expressions.specs.get_document_store_for_doc_type') as single_fetch:
+            values = [self.expression(doc, contexts[doc['_id']]) for doc in self.docs]
+        self.assertFalse(single_fetch.called)
+        self.assertEqual(['owner1', 'owner2', 'owner1', None], values)
+        self.assertEqual(4, prefetch_cache.hits)
+        self.assertEqual(0, prefetch_cache.misses)
+
+    def test_miss_falls_back_to_single_fetch(self):
+        prefetch_cache = PrefetchCache(self.domain)
+        doc = _form('form1', 'case1')
+        document_store = MagicMock()
+        document_store.get_document.return_value = self.related_docs[0]
+        with patch('corehq.apps.userreports.expressions.specs.get_document_store_for_doc_type',
+                   return_value=document_store):
+            value = self.expression(doc, EvaluationContext(doc, prefetch_cache=prefetch_cache))
+        self.assertEqual('owner1', value)
+        self.assertEqual(1, prefetch_cache.misses)
+
+
+def _form(form_id, case_id):
+    return {
+        '_id': form_id,
+        'domain': PrefetchRelatedDocsTest.domain,
+        'doc_type': 'XFormInstance',
+        'form': {'case': {'@case_id': case_id}},
+    }
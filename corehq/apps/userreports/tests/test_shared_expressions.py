@@ -0,0 +1,140 @@
+from django.test import SimpleTestCase
+
+from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.expressions.shared import (
+    SharedExpression,
+    SharedExpressionPool,
+    is_shareable_spec,
+)
+from corehq.apps.userreports.specs import EvaluationContext, FactoryContext
+from corehq.apps.userreports.tests.utils import get_sample_data_source
+
+
+class SharedExpressionPoolTest(SimpleTestCase):
+
+    def setUp(self):
+        self.pool = SharedExpressionPool()
+        self.context = FactoryContext({}, {}, self.pool)
+
+    def test_identical_specs_are_compiled_once(self):
+        spec = {'type': 'property_path', 'property_path': ['form', 'age']}
+        first = ExpressionFactory.from_spec(dict(spec), self.context)
+        second = ExpressionFactory.from_spec(dict(spec), self.context)
+        self.assertIsInstance(first, SharedExpression)
+        self.assertIs(first, second)
+        self.assertEqual(1, len(self.pool))
+        self.assertEqual(1, self.pool.shared_count)
+
+    def test_constants_not_shared(self):
+        expression = ExpressionFactory.from_spec(7, self.context)
+        self.assertNotIsInstance(expression, SharedExpression)
+        self.assertEqual(0, len(self.pool))
+
+    def test_value_shared_within_context(self):
+        expression = ExpressionFactory.from_spec({'type': 'property_name', 'property_name': 'age'}, self.context)
+        doc = {'age': 7}
+        eval_context = EvaluationContext(doc)
+        self.assertEqual(7, expression(doc, eval_context))
+        doc['age'] = 8
+        self.assertEqual(7, expression(doc, eval_context))
+        self.assertEqual(1, self.pool.evaluation_hits)
+        self.assertEqual(1, self.pool.evaluation_misses)
+
+        # a new context is a new document
+        self.assertEqual(8, expression(doc, EvaluationContext(doc)))
+
+    def test_value_not_shared_across_items(self):
+        expression = ExpressionFactory.from_spec({'type': 'property_name', 'property_name': 'age'}, self.context)
+        doc = {'age': 7, 'children': [{'age': 1}, {'age': 2}]}
+        eval_context = EvaluationContext(doc)
+        self.assertEqual(
+            [7, 1, 2],
+            [expression(item, eval_context) for item in [doc] + doc['children']]
+        )
+
+    def test_no_context(self):
+        expression = ExpressionFactory.from_spec({'type': 'property_name', 'property_name': 'age'}, self.context)
+        self.assertEqual(7, expression({'age': 7}))
+        self.assertEqual(0, self.pool.evaluation_misses)
+
+
+class ShareableSpecTest(SimpleTestCase):
+
+    def test_property_path(self):
+        self.assertTrue(is_shareable_spec({'type': 'property_path', 'property_path': ['form', 'age']}))
+
+    def test_named_expression(self):
+        self.assertFalse(is_shareable_spec({
+            'type': 'root_doc',
+            'expression': {'type': 'named', 'name': 'age'},
+        }))
+
+    def test_named_filter(self):
+        self.assertFalse(is_shareable_spec({
+            'type': 'conditional',
+            'test': {'type': 'named', 'name': 'is_adult'},
+            'expression_if_true': 'adult',
+            'expression_if_false': 'child',
+        }))
+
+    def test_iteration_number(self):
+        self.assertFalse(is_shareable_spec({
+            'type': 'coalesce',
+            'expression': {'type': 'base_iteration_number'},
+            'default_expression': 0,
+        }))
+
+    def test_dict_property_called_type(self):
+        self.assertTrue(is_shareable_spec({
+            'type': 'dict',
+            'properties': {'type': {'type': 'property_name', 'property_name': 'type'}},
+        }))
+
+    def test_custom_expression(self):
+        self.assertFalse(is_shareable_spec({'type': 'abt_supervisor'}))
+
+
+class SharedDataSourceTest(SimpleTestCase):
+
+    def setUp(self):
+        self.pool = SharedExpressionPool()
+        self.configs = [get_sample_data_source(), get_sample_data_source()]
+        self.configs[1].table_id = 'other_sample'
+        self.doc = {
+            '_id': 'some-doc-id',
+            'doc_type': 'CommCareCase',
+            'domain': 'user-reports',
+            'type': 'ticket',
+            'opened_on': '2014-06-21T00:00:00.000000Z',
+            'owner_id': 'some-user-id',
+            'priority': '3',
+            'category': 'bug',
+        }
+
+    def test_same_rows_as_unshared(self):
+        expected = [config.get_all_values(self.doc) for config in self.configs]
+        for config in self.configs:
+            config.share_expressions(self.pool)
+
+        eval_context = EvaluationContext(self.doc)
+        rows = []
+        for config in self.configs:
+            rows.append(config.get_all_values(self.doc, eval_context))
+            eval_context.reset_iteration()
+
+        self.assertEqual(
+            _strip_inserted_at(expected),
+            _strip_inserted_at(rows),
+        )
+        self.assertGreater(self.pool.shared_count, 0)
+        self.assertGreater(self.pool.evaluation_hits, 0)
+
+
+def _strip_inserted_at(rows_by_config):
+    return [
+        [
+            [(value.column.id, value.value) for value in row if value.column.id != 'inserted_at']
+            for row in rows
+        ]
+        for rows in rows_by_config
+    ]
@@ -19,3 +19,6 @@ RESTORE_CACHE_KEY_PREFIX = "ota-restore"
 # case sync algorithms
 CLEAN_OWNERS = 'clean_owners'
 LIVEQUERY = 'livequery'
+
+# maximum size (in bytes) of serialized case XML cached per process
+CASE_XML_CACHE_SIZE = 32 * 1024 * 1024
@@ -0,0 +1,512 @@
+"""Persisted livequery case graph
+
+A livequery restore traverses the owner -> index -> extension graph of
+the user's cases to find the set of live case ids. The graph is saved on
+the sync log as a ``CaseGraphSnapshot`` so the next restore from that
+sync log only needs to replay the cases modified since the last sync
+instead of traversing the whole graph again.
+
+The snapshot is serialized in a compact form where each case id is
+stored once and cases are referred to by their position in that list.
+"""
+import logging
+from array import array
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from itertools import accumulate, compress, count
+from operator import attrgetter
+
+from casexml.apps.case.const import CASE_INDEX_EXTENSION as EXTENSION
+from dimagi.utils.parsing import json_format_datetime, string_to_utc_datetime
+
+SNAPSHOT_VERSION = 2
+
+# Cases can be saved with a ``server_modified_on`` slightly before the
+# sync log date but only be committed after the restore queries ran, so
+# replay everything modified in this window before the last sync.
+MODIFIED_SINCE_MARGIN = timedelta(minutes=15)
+
+# Cases that leave the graph are never removed from the snapshot, so do
+# a full traversal periodically to keep it from growing indefinitely and
+# to discard any errors introduced by replaying modified cases.
+MAX_SNAPSHOT_AGE = timedelta(days=7)
+
+# Case graphs with this many indices are interned to integer ids to save
+# memory. Interning costs more CPU time than it saves on smaller graphs.
+INTERN_MIN_INDICES = 1000000
+
+IndexInfo = namedtuple('IndexInfo', 'case_id identifier referenced_id relationship')
+
+
+class CaseGraphSnapshot(object):
+    """The case graph computed by a livequery restore
+
+    :param owner_ids: Owner ids the graph was computed for.
+    :param owned_ids: Open cases owned by one of ``owner_ids``.
+    :param open_ids: Open cases in the graph.
+    :param indices: Dict of case id -> dict of index identifier -> ``IndexInfo``
+    :param live_ids: Live case ids.
+    :param traversed_on: When the full traversal the graph was built from
+    was done, defaults to now. It is kept when the graph is updated.
+    """
+
+    def __init__(self, owner_ids, owned_ids, open_ids, indices, live_ids, traversed_on=None):
+        self.owner_ids = set(owner_ids)
+        self.owned_ids = set(owned_ids)
+        self.open_ids = set(open_ids)
+        self.indices = indices
+        self.live_ids = set(live_ids)
+        self.traversed_on = traversed_on or datetime.utcnow()
+
+    @classmethod
+    def from_livequery(cls, owner_ids, owned_ids, open_ids, indices, live_ids):
+        """Create a snapshot from the data structures of a full livequery traversal
+
+        :param indices: Dict of case id -> list of CommCareCaseIndex-like objects.
+        """
+        return cls(owner_ids, owned_ids, open_ids, _index_infos(
+            index for case_indices in indices.values() for index in case_indices
+        ), live_ids)
+
+    @property
+    def case_ids(self):
+        case_ids = self.owned_ids | self.open_ids | self.live_ids
+        for case_id, case_indices in self.indices.items():
+            case_ids.add(case_id)
+            case_ids.update(index.referenced_id for index in case_indices.values())
+        return case_ids
+
+    def iter_indices(self):
+        for case_indices in self.indices.values():
+            yield from case_indices.values()
+
+    def to_json(self):
+        case_ids = sorted(self.case_ids)
+        position = {case_id: i for i, case_id in enumerate(case_ids)}
+        return {
+            'version': SNAPSHOT_VERSION,
+            'traversed_on': json_format_datetime(self.traversed_on),
+            'owner_ids': sorted(self.owner_ids),
+            'case_ids': case_ids,
+            'owned': sorted(position[case_id] for case_id in self.owned_ids),
+            'open': sorted(position[case_id] for case_id in self.open_ids),
+            'live': sorted(position[case_id] for case_id in self.live_ids),
+            'indices': [
+                [position[index.case_id], index.identifier, position[index.referenced_id], index.relationship]
+                for index in self.iter_indices()
+            ],
+        }
+
+    @classmethod
+    def wrap(cls, data):
+        """Load a snapshot saved with ``to_json``
+
+        :returns: A snapshot or ``None`` if the data is missing or was
+        saved by an incompatible version.
+        """
+        if not data or data.get('version') != SNAPSHOT_VERSION:
+            return None
+        try:
+            case_ids = data['case_ids']
+            return cls(
+                data['owner_ids'],
+                [case_ids[i] for i in data['owned']],
+                [case_ids[i] for i in data['open']],
+                _index_infos(
+                    IndexInfo(case_ids[sub], identifier, case_ids[ref], relationship)
+                    for sub, identifier, ref, relationship in data['indices']
+                ),
+                [case_ids[i] for i in data['live']],
+                string_to_utc_datetime(data['traversed_on']),
+            )
+        except (KeyError, IndexError, TypeError, ValueError, OverflowError):
+            logging.getLogger(__name__).warning("invalid case graph snapshot", exc_info=True)
+            return None
+
+    def update(self, accessor, since, timing_context):
+        """Replay cases modified since the given date into the graph
+
+        Cases need to be replayed if they are in the graph and have been
+        modified, they are now owned by one of the graph's owners, or they
+        are new open extensions of a case in the graph. The indices of those
+        cases are fetched again and any cases not yet in the graph that they
+        reach are traversed in the same way as a full livequery restore.
+
+        :returns: True if the graph changed.
+        """
+        since = since - MODIFIED_SINCE_MARGIN
+        graph_ids = self.case_ids
+        with timing_context("get_modified_graph_cases({} cases)".format(len(graph_ids))):
+            dates = accessor.get_last_modified_dates(list(graph_ids)) or {}
+            # cases missing from the result have been hard deleted
+            modified_ids = {case_id for case_id in graph_ids
+                if case_id not in dates or _is_modified(dates[case_id], since)}
+            gone_ids = graph_ids - set(dates)
+
+        with timing_context("get_newly_owned_cases"):
+            owned_modified_ids = set()
+            for owner_id in self.owner_ids:
+                owned_modified_ids.update(
+                    accessor.get_case_ids_modified_with_owner_since(owner_id, since))
+
+        with timing_context("get_new_extension_cases"):
+            new_extension_ids = set(
+                accessor.get_extension_case_ids(list(graph_ids), include_closed=False)
+            ) - graph_ids
+
+        dirty_ids = modified_ids | owned_modified_ids | new_extension_ids
+        logging.getLogger(__name__).debug("replay: %r", dirty_ids)
+        if not dirty_ids:
+            return False
+
+        with timing_context("replay_cases({} cases)".format(len(dirty_ids))):
+            self._replay(accessor, dirty_ids, gone_ids, owned_modified_ids, graph_ids)
+        with timing_context("compute_live_ids"):
+            self.live_ids = compute_live_ids(self.owned_ids, self.open_ids, self.iter_indices())
+        return True
+
+    def _replay(self, accessor, dirty_ids, gone_ids, owned_modified_ids, graph_ids):
+        for case_id in dirty_ids:
+            self.indices.pop(case_id, None)
+            self.owned_ids.discard(case_id)
+            self.open_ids.discard(case_id)
+
+        deleted_ids = set(gone_ids)
+        closed_ids = set()
+        checked_ids = graph_ids - dirty_ids  # open/closed status is known
+        known_ids = graph_ids - dirty_ids
+        next_ids = set(dirty_ids)
+        while next_ids:
+            known_ids.update(next_ids)
+            exclude = {_index_key(index)
+                for index in self.iter_indices()
+                if index.case_id in next_ids or index.referenced_id in next_ids}
+            related = accessor.get_related_indices(list(next_ids), exclude)
+
+            check_ids = {case_id
+                for index in related
+                for case_id in [index.case_id, index.referenced_id]}
+            check_ids.update(next_ids)
+            check_ids -= checked_ids
+            checked_ids.update(check_ids)
+            # extension cases returned by get_related_indices are open
+            open_extension_ids = {index.case_id for index in related
+                if index.relationship == EXTENSION and index.case_id not in next_ids}
+            rows = accessor.get_closed_and_deleted_ids(list(check_ids - open_extension_ids - deleted_ids))
+            for case_id, closed, deleted in rows:
+                if deleted:
+                    deleted_ids.add(case_id)
+                if closed or deleted:
+                    closed_ids.add(case_id)
+            self.open_ids.update(check_ids - closed_ids - deleted_ids)
+
+            next_ids = set()
+            for index in related:
+                sub_id = index.case_id
+                ref_id = index.referenced_id
+                if sub_id in deleted_ids or ref_id in deleted_ids:
+                    continue
+                self.indices.setdefault(sub_id, {})[index.identifier] = _index_info(index)
+                for case_id in [sub_id, ref_id]:
+                    if case_id not in known_ids:
+                        next_ids.add(case_id)
+
+        self.owned_ids.update((owned_modified_ids & self.open_ids) - deleted_ids)
+        if deleted_ids:
+            self._remove_cases(deleted_ids)
+
+    def _remove_cases(self, case_ids):
+        self.owned_ids -= case_ids
+        self.open_ids -= case_ids
+        for case_id in case_ids:
+            self.indices.pop(case_id, None)
+        for sub_id, case_indices in list(self.indices.items()):
+            for identifier, index in list(case_indices.items()):
+                if index.referenced_id in case_ids:
+                    del case_indices[identifier]
+            if not case_indices:
+                del self.indices[sub_id]
+
+
+def get_case_graph_snapshot(restore_state):
+    """Get the snapshot saved on the last sync log if it can be updated
+    for this restore
+
+    :returns: A ``CaseGraphSnapshot`` or ``None`` if the case graph needs
+    to be computed from scratch.
+    """
+    sync_log = restore_state.last_sync_log
+    if not sync_log or not sync_log.date:
+        return None
+    snapshot = CaseGraphSnapshot.wrap(getattr(sync_log, 'case_graph_snapshot', None))
+    if snapshot is None or snapshot.owner_ids != set(restore_state.owner_ids):
+        return None
+    if datetime.utcnow() - snapshot.traversed_on > MAX_SNAPSHOT_AGE:
+        return None
+    return snapshot
+
+
+def compute_live_ids(owned_ids, open_ids, indices):
+    """Compute live case ids from a case graph
+
+    - A case is available if
+        - it is open and not an extension case.
+        - it is open and is the extension of an available case.
+    - A case is live if
+        - it is owned and available.
+        - it has a live child.
+        - it has a live extension.
+        - it is open and is the extension of a live case.
+
+    A case that is both a child and an extension is not an extension.
+
+    Graphs with at least ``INTERN_MIN_INDICES`` indices are computed with
+    ``InternedCaseGraph``, which uses less memory but more CPU time.
+
+    :param owned_ids: Open cases owned by the restore user.
+    :param open_ids: Open case ids.
+    :param indices: Iterable of CommCareCaseIndex-like objects.
+    :returns: Set of live case ids.
+    """
+    if not isinstance(indices, list):
+        indices = list(indices)
+    if len(indices) >= INTERN_MIN_INDICES:
+        return InternedCaseGraph(owned_ids, open_ids, indices).get_live_ids()
+    return _compute_live_ids_with_sets(owned_ids, open_ids, indices)
+
+
+def _compute_live_ids_with_sets(owned_ids, open_ids, indices):
+    """Compute live case ids over sets and dicts keyed by case id
+
+    Cases are enlivened with an iterative worklist while the indices are
+    read, so only the edges between cases whose liveness is still pending
+    are stored.
+    """
+    live_ids = set()
+    enliven_graph = defaultdict(list)  # pending: case id -> case ids it makes live
+    hosts_by_open_extension = defaultdict(list)
+    has_host = set()
+    has_parent = set()
+    add_host = has_host.add
+    add_parent = has_parent.add
+
+    def enliven(case_id):
+        stack = [case_id]
+        while stack:
+            case_id = stack.pop()
+            if case_id not in live_ids:
+                live_ids.add(case_id)
+                stack.extend(enliven_graph.get(case_id, ()))
+
+    for index in indices:
+        sub_id = index.case_id
+        ref_id = index.referenced_id
+        if index.relationship == EXTENSION:
+            add_host(sub_id)
+            if sub_id in open_ids:
+                hosts_by_open_extension[sub_id].append(ref_id)
+                if sub_id in live_ids:
+                    if ref_id not in live_ids:
+                        # ref has a live extension
+                        enliven(ref_id)
+                elif ref_id in live_ids:
+                    # sub is open and is the extension of a live case
+                    enliven(sub_id)
+                else:
+                    enliven_graph[sub_id].append(ref_id)
+                    enliven_graph[ref_id].append(sub_id)
+            elif sub_id in live_ids:
+                if ref_id not in live_ids:
+                    enliven(ref_id)
+            else:
+                enliven_graph[sub_id].append(ref_id)
+        else:
+            add_parent(sub_id)
+            if sub_id in live_ids:
+                if ref_id not in live_ids:
+                    # ref has a live child
+                    enliven(ref_id)
+            elif sub_id in owned_ids:
+                # sub is owned and available (open and not an extension case)
+                enliven(sub_id)
+                enliven(ref_id)
+            else:
+                enliven_graph[sub_id].append(ref_id)
+
+    extension_ids = has_host - has_parent
+
+    # owned, open, not an extension -> live
+    for case_id in owned_ids:
+        if case_id not in live_ids and case_id not in extension_ids:
+            enliven(case_id)
+
+    # available case with live extension -> live
+    # See InternedCaseGraph._get_cases_with_owned_extension
+    has_owned_extension = set()
+    stack = list(owned_ids)
+    while stack:
+        for host_id in hosts_by_open_extension.get(stack.pop(), ()):
+            if host_id not in has_owned_extension:
+                has_owned_extension.add(host_id)
+                stack.append(host_id)
+    for case_id in has_owned_extension:
+        if (case_id not in live_ids
+                and case_id in open_ids
+                and case_id not in extension_ids):
+            enliven(case_id)
+
+    return live_ids
+
+
+class InternedCaseGraph(object):
+    """Case graph optimized for computing liveness of large case networks
+
+    Case ids are interned to integers and adjacency lists are stored in
+    compressed sparse row (CSR) form: the neighbors of case ``i`` are
+    ``targets[offsets[i]:offsets[i + 1]]``. Liveness is computed with
+    iterative worklists so the depth of the graph is not limited by the
+    recursion limit.
+    """
+
+    def __init__(self, owned_ids, open_ids, indices):
+        ints = defaultdict(count().__next__)  # case id -> int
+        intern = ints.__getitem__
+        self.owned = array('i', map(intern, owned_ids))
+        self.open = array('i', map(intern, open_ids))
+        indices = list(indices)
+        subs = array('i', map(intern, map(attrgetter('case_id'), indices)))
+        refs = array('i', map(intern, map(attrgetter('referenced_id'), indices)))
+        relationships = list(map(attrgetter('relationship'), indices))
+        del indices
+        is_ext = bytearray(map(EXTENSION.__eq__, relationships))
+        is_child = bytearray(map(EXTENSION.__ne__, relationships))
+        del relationships
+        self.case_ids = list(ints)  # int -> case id
+        del ints
+
+        # (sub, ref) pairs for extension indices, (child, parent) for others
+        ext_subs = array('i', compress(subs, is_ext))
+        ext_refs = array('i', compress(refs, is_ext))
+        child_subs = array('i', compress(subs, is_child))
+        child_refs = array('i', compress(refs, is_child))
+        del subs, refs, is_ext, is_child
+
+        size = len(self.case_ids)
+        self.is_open = _flags(size, self.open)
+        self.has_host = _flags(size, ext_subs)
+        self.has_parent = _flags(size, child_subs)
+
+        is_open_ext = bytearray(map(self.is_open.__getitem__, ext_subs))
+        open_ext_subs = array('i', compress(ext_subs, is_open_ext))
+        open_ext_refs = array('i', compress(ext_refs, is_open_ext))
+
+        # A live case makes all of these live:
+        # - its open extensions (open and the extension of a live case)
+        # - its hosts (has live extension)
+        # - its parents (has live child)
+        self.enliven_graph = _csr(
+            size,
+            open_ext_refs + ext_subs + child_subs,
+            open_ext_subs + ext_refs + child_refs,
+        )
+        # open extension -> hosts
+        self.hosts_by_open_extension = _csr(size, open_ext_subs, open_ext_refs)
+
+    def is_extension(self, case):
+        """A case that is both a child and an extension is not an extension"""
+        return self.has_host[case] and not self.has_parent[case]
+
+    def get_live_ids(self):
+        live = bytearray(len(self.case_ids))
+        offsets, targets = self.enliven_graph
+        stack = array('i')
+
+        def enliven(case):
+            stack.append(case)
+            while stack:
+                case = stack.pop()
+                if not live[case]:
+                    live[case] = 1
+                    stack.extend(targets[offsets[case]:offsets[case + 1]])
+
+        # owned, open, not an extension -> live
+        for case in self.owned:
+            if not live[case] and not self.is_extension(case):
+                enliven(case)
+
+        # available case with live extension -> live
+        has_owned_extension = self._get_cases_with_owned_extension()
+        for case in self.open:
+            if (not live[case]
+                    and has_owned_extension[case]
+                    and not self.is_extension(case)):
+                enliven(case)
+
+        return set(compress(self.case_ids, live))
+
+    def _get_cases_with_owned_extension(self):
+        """Find cases with an owned (direct or indirect) open extension
+
+        Every host of a live case is live, so a case that is not yet
+        live cannot have a live extension. Once the owned roots have been
+        enlivened, a case only needs to be enlivened because of its
+        extensions if one of them is owned, and that does not change as
+        more cases become live.
+        """
+        offsets, targets = self.hosts_by_open_extension
+        result = bytearray(len(self.case_ids))
+        stack = array('i', self.owned)
+        while stack:
+            case = stack.pop()
+            for host in targets[offsets[case]:offsets[case + 1]]:
+                if not result[host]:
+                    result[host] = 1
+                    stack.append(host)
+        return result
+
+
+def _flags(size, cases):
+    flags = bytearray(size)
+    for case in cases:
+        flags[case] = 1
+    return flags
+
+
+def _csr(size, sources, targets):
+    """Build a compressed sparse row adjacency list
+
+    :returns: Tuple ``(offsets, targets)`` of ``array('i')``.
+    """
+    offsets = array('i', [0]) * (size + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    offsets = array('i', accumulate(offsets))
+    position = offsets[:-1]
+    result = array('i', [0]) * len(sources)
+    for source, target in zip(sources, targets):
+        result[position[source]] = target
+        position[source] += 1
+    return offsets, result
+
+
+def _is_modified(server_modified_on, since):
+    if server_modified_on is None:
+        return True
+    if server_modified_on.tzinfo is not None:
+        server_modified_on = server_modified_on.replace(tzinfo=None)
+    return server_modified_on >= since
+
+
+def _index_key(index):
+    return '{} {}'.format(index.case_id, index.identifier)
+
+
+def _index_info(index):
+    return IndexInfo(index.case_id, index.identifier, index.referenced_id, index.relationship)
+
+
+def _index_infos(indices):
+    result = defaultdict(dict)
+    for index in indices:
+        result[index.case_id][index.identifier] = _index_info(index)
+    return dict(result)
@@ -22,12 +22,21 @@ Example case graphs with outcomes:
    a(closed) <--ext-- b <--chi-- c(owned) >> []
 """
 import logging
+import threading
 from collections import defaultdict
 from functools import wraps
 from itertools import chain, islice
+from queue import Full, Queue
+
+from django.db import connections
 
 from casexml.apps.case.const import CASE_INDEX_EXTENSION as EXTENSION
 from casexml.apps.phone.const import ASYNC_RETRY_AFTER
+from casexml.apps.phone.data_providers.case.case_graph import (
+    CaseGraphSnapshot,
+    compute_live_ids,
+    get_case_graph_snapshot,
+)
 from casexml.apps.phone.data_providers.case.load_testing import (
     get_xml_for_response,
 )
@@ -35,8 +44,16 @@ from casexml.apps.phone.data_providers.case.stock import get_stock_payload
 from casexml.apps.phone.data_providers.case.utils import get_case_sync_updates
 from casexml.apps.phone.tasks import ASYNC_RESTORE_SENT
 from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
-from corehq.sql_db.routers import read_from_plproxy_standbys
-from corehq.toggles import LIVEQUERY_READ_FROM_STANDBYS, NAMESPACE_USER
+from corehq.sql_db.routers import (
+    allow_read_from_plproxy_standby,
+    read_from_plproxy_standbys,
+)
+from corehq.toggles import (
+    LIVEQUERY_INCREMENTAL,
+    LIVEQUERY_PREFETCH_CASES,
+    LIVEQUERY_READ_FROM_STANDBYS,
+    NAMESPACE_USER,
+)
 from corehq.util.datadog.utils import case_load_counter
 
 
@@ -63,106 +80,27 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
     def index_key(index):
         return '{} {}'.format(index.case_id, index.identifier)
 
-    def is_extension(case_id):
-        """Determine if case_id is an extension case
-
-        A case that is both a child and an extension is not an extension.
-        """
-        return case_id in hosts_by_extension and case_id not in parents_by_child
-
-    def has_live_extension(case_id, cache={}):
-        """Check if available case_id has a live extension case
-
-        Do not check for live children because an available parent
-        cannot cause it's children to become live. This is unlike an
-        available host, which can cause its available extension to
-        become live through the recursive rules:
-
-        - A case is available if
-            - it is open and not an extension case (applies to host).
-            - it is open and is the extension of an available case.
-        - A case is live if it is owned and available.
-
-        The result is cached to reduce recursion in subsequent calls
-        and to prevent infinite recursion.
-        """
-        try:
-            return cache[case_id]
-        except KeyError:
-            cache[case_id] = False
-        cache[case_id] = result = any(
-            ext_id in live_ids      # has live extension
-            or ext_id in owned_ids  # ext is owned and available, will be live
-            or has_live_extension(ext_id)
-            for ext_id in extensions_by_host[case_id]
-        )
-        return result
-
-    def enliven(case_id):
-        """Mark the given case, its extensions and their hosts as live
-
-        This closure mutates `live_ids` from the enclosing function.
-        """
-        if case_id in live_ids:
-            # already live
-            return
-        debug('enliven(%s)', case_id)
-        live_ids.add(case_id)
-        # case is open and is the extension of a live case
-        ext_ids = extensions_by_host.get(case_id, [])
-        # case has live extension
-        host_ids = hosts_by_extension.get(case_id, [])
-        # case has live child
-        parent_ids = parents_by_child.get(case_id, [])
-        for cid in chain(ext_ids, host_ids, parent_ids):
-            enliven(cid)
-
     def classify(index, prev_ids):
-        """Classify index as either live or extension with live status pending
+        """Add index to the case graph
 
         This closure mutates case graph data structures from the
-        enclosing function.
+        enclosing function. Liveness is computed once the whole graph
+        has been fetched.
 
         :returns: Case id for next related index fetch or IGNORE
         if the related case should be ignored.
         """
         sub_id = index.case_id
         ref_id = index.referenced_id  # aka parent/host/super
-        relationship = index.relationship
         ix_key = index_key(index)
         if ix_key in seen_ix[sub_id]:
             return IGNORE  # unexpected, don't process duplicate index twice
         seen_ix[sub_id].add(ix_key)
         seen_ix[ref_id].add(ix_key)
         indices[sub_id].append(index)
-        debug("%s --%s--> %s", sub_id, relationship, ref_id)
-        if sub_id in live_ids:
-            # ref has a live child or extension
-            enliven(ref_id)
-            # It does not matter that sub_id -> ref_id never makes it into
-            # hosts_by_extension since both are live and therefore this index
-            # will not need to be traversed in other liveness calculations.
-        elif relationship == EXTENSION:
-            if sub_id in open_ids:
-                if ref_id in live_ids:
-                    # sub is open and is the extension of a live case
-                    enliven(sub_id)
-                else:
-                    # live status pending:
-                    # if ref becomes live -> sub is open extension of live case
-                    # if sub becomes live -> ref has a live extension
-                    extensions_by_host[ref_id].add(sub_id)
-                    hosts_by_extension[sub_id].add(ref_id)
-            else:
-                return IGNORE  # closed extension
-        elif sub_id in owned_ids:
-            # sub is owned and available (open and not an extension case)
-            enliven(sub_id)
-            # ref has a live child
-            enliven(ref_id)
-        else:
-            # live status pending: if sub becomes live -> ref has a live child
-            parents_by_child[sub_id].add(ref_id)
+        debug("%s --%s--> %s", sub_id, index.relationship, ref_id)
+        if index.relationship == EXTENSION and sub_id not in open_ids:
+            return IGNORE  # closed extension
 
         next_id = ref_id if sub_id in prev_ids else sub_id
         if next_id not in all_ids:
@@ -200,55 +138,60 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
     accessor = CaseAccessors(restore_state.domain)
 
     # case graph data structures
-    live_ids = set()
     deleted_ids = set()
-    extensions_by_host = defaultdict(set)  # host_id -> (open) extension_ids
-    hosts_by_extension = defaultdict(set)  # (open) extension_id -> host_ids
-    parents_by_child = defaultdict(set)    # child_id -> parent_ids
     indices = defaultdict(list)  # case_id -> list of CommCareCaseIndex-like
     seen_ix = defaultdict(set)   # case_id -> set of '<index.case_id> <index.identifier>'
     owner_ids = list(restore_state.owner_ids)
 
     debug("sync %s for %r", restore_state.current_sync_log._id, owner_ids)
+    use_snapshot = LIVEQUERY_INCREMENTAL.enabled(restore_state.restore_user.user_id, NAMESPACE_USER)
+    snapshot = get_case_graph_snapshot(restore_state) if use_snapshot else None
     with timing_context("livequery"):
-        with timing_context("get_case_ids_by_owners"):
-            owned_ids = accessor.get_case_ids_by_owners(owner_ids, closed=False)
-            debug("owned: %r", owned_ids)
-
-        next_ids = all_ids = set(owned_ids)
-        owned_ids = set(owned_ids)  # owned, open case ids (may be extensions)
-        open_ids = set(owned_ids)
-        while next_ids:
-            exclude = set(chain.from_iterable(seen_ix[id] for id in next_ids))
-            with timing_context("get_related_indices({} cases, {} seen)".format(
-                    len(next_ids), len(exclude))):
-                related = accessor.get_related_indices(list(next_ids), exclude)
-                if not related:
-                    break
-                update_open_and_deleted_ids(related)
-                next_ids = {classify(index, next_ids)
-                    for index in related
-                    if index.referenced_id not in deleted_ids
-                        and index.case_id not in deleted_ids}
-                next_ids.discard(IGNORE)
-                all_ids.update(next_ids)
-                debug('next: %r', next_ids)
-
-        with timing_context("enliven open roots (%s cases)" % len(open_ids)):
-            debug('open: %r', open_ids)
-            # owned, open, not an extension -> live
-            for case_id in owned_ids:
-                if not is_extension(case_id):
-                    enliven(case_id)
-
-            # available case with live extension -> live
-            for case_id in open_ids:
-                if (case_id not in live_ids
-                        and not is_extension(case_id)
-                        and has_live_extension(case_id)):
-                    enliven(case_id)
-
-            debug('live: %r', live_ids)
+        if snapshot is not None:
+            with timing_context("update_case_graph_snapshot"):
+                debug('snapshot from: %s', restore_state.last_sync_log._id)
+                snapshot.update(accessor, restore_state.last_sync_log.date, timing_context)
+                live_ids = snapshot.live_ids
+                debug('live: %r', live_ids)
+            # indices are only known for the case graph, not for all cases synced
+            iaccessor = accessor
+        else:
+            with timing_context("get_case_ids_by_owners"):
+                owned_ids = accessor.get_case_ids_by_owners(owner_ids, closed=False)
+                debug("owned: %r", owned_ids)
+
+            next_ids = all_ids = set(owned_ids)
+            owned_ids = set(owned_ids)  # owned, open case ids (may be extensions)
+            open_ids = set(owned_ids)
+            while next_ids:
+                exclude = set(chain.from_iterable(seen_ix[id] for id in next_ids))
+                with timing_context("get_related_indices({} cases, {} seen)".format(
+                        len(next_ids), len(exclude))):
+                    related = accessor.get_related_indices(list(next_ids), exclude)
+                    if not related:
+                        break
+                    update_open_and_deleted_ids(related)
+                    next_ids = {classify(index, next_ids)
+                        for index in related
+                        if index.referenced_id not in deleted_ids
+                            and index.case_id not in deleted_ids}
+                    next_ids.discard(IGNORE)
+                    all_ids.update(next_ids)
+                    debug('next: %r', next_ids)
+
+            with timing_context("compute_live_ids (%s cases)" % len(open_ids)):
+                debug('open: %r', open_ids)
+                live_ids = compute_live_ids(
+                    owned_ids, open_ids, chain.from_iterable(indices.values()))
+                debug('live: %r', live_ids)
+
+            iaccessor = PrefetchIndexCaseAccessor(accessor, indices)
+            if use_snapshot:
+                snapshot = CaseGraphSnapshot.from_livequery(
+                    owner_ids, owned_ids, open_ids, indices, live_ids)
+
+        if snapshot is not None:
+            restore_state.current_sync_log.case_graph_snapshot = snapshot.to_json()
 
         if restore_state.last_sync_log:
             with timing_context("discard_already_synced_cases"):
@@ -259,13 +202,15 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
             sync_ids = live_ids
         restore_state.current_sync_log.case_ids_on_phone = live_ids
 
+        batches = batch_cases(iaccessor, sync_ids)
+        if LIVEQUERY_PREFETCH_CASES.enabled(restore_state.restore_user.user_id, NAMESPACE_USER):
+            batches = prefetch_batches(batches)
         with timing_context("compile_response(%s cases)" % len(sync_ids)):
-            iaccessor = PrefetchIndexCaseAccessor(accessor, indices)
             compile_response(
                 timing_context,
                 restore_state,
                 response,
-                batch_cases(iaccessor, sync_ids),
+                batches,
                 init_progress(async_task, len(sync_ids)),
             )
 
@@ -315,6 +260,66 @@ def batch_cases(accessor, case_ids):
         yield accessor.get_cases(next_ids)
 
 
+def prefetch_batches(batches, timeout=1):
+    """Fetch batches on a background thread
+
+    The next batch is fetched from the database while the current batch
+    is being serialized. At most two batches are fetched ahead of the
+    consumer: one waiting in the queue and one being fetched.
+
+    Exceptions raised while fetching are re-raised in the consumer.
+    Database connections opened by the background thread are closed
+    when it exits.
+    """
+    def fetch():
+        try:
+            if read_from_standbys:
+                with read_from_plproxy_standbys():
+                    fetch_all()
+            else:
+                fetch_all()
+        except BaseException as err:
+            put((None, err))
+        else:
+            put(DONE)
+        finally:
+            connections.close_all()
+
+    def fetch_all():
+        for batch in batches:
+            if not put((batch, None)):
+                break
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=timeout)
+                return True
+            except Full:
+                pass
+        return False
+
+    DONE = object()
+    queue = Queue(maxsize=1)
+    stop = threading.Event()
+    # the standby routing flag is thread local
+    read_from_standbys = allow_read_from_plproxy_standby()
+    thread = threading.Thread(target=fetch, name="livequery-prefetch", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = queue.get()
+            if item is DONE:
+                break
+            batch, error = item
+            if error is not None:
+                raise error
+            yield batch
+    finally:
+        stop.set()
+        thread.join()
+
+
 def init_progress(async_task, total):
     if not async_task:
         return lambda done: None
@@ -1,7 +1,9 @@
 from copy import deepcopy
 from casexml.apps.phone.data_providers.case.utils import CaseSyncUpdate
+from casexml.apps.phone.data_providers.case.xml_cache import get_cached_case_xml
 from casexml.apps.phone.xml import get_case_element, tostring
 from corehq.apps.app_manager.const import USERCASE_TYPE
+from corehq.toggles import NAMESPACE_DOMAIN, RESTORE_CASE_XML_CACHE
 
 
 def transform_loadtest_update(update, factor):
@@ -27,9 +29,14 @@ def get_xml_for_response(update, restore_state):
     current_count = 0
     original_update = update
     elements = []
+    use_cache = RESTORE_CASE_XML_CACHE.enabled(restore_state.domain, NAMESPACE_DOMAIN)
     while current_count < restore_state.loadtest_factor:
-        element = get_case_element(update.case, update.required_updates, restore_state.version)
-        elements.append(tostring(element))
+        if use_cache and update is original_update:
+            elements.append(get_cached_case_xml(
+                update.case, update.required_updates, restore_state.version))
+        else:
+            element = get_case_element(update.case, update.required_updates, restore_state.version)
+            elements.append(tostring(element))
         current_count += 1
         if current_count < restore_state.loadtest_factor:
             update = transform_loadtest_update(original_update, current_count)
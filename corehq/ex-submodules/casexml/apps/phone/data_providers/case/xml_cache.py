@@ -0,0 +1,96 @@
+"""Process local cache of serialized case XML
+
+Cases shared by many users (for example through case sharing groups)
+are serialized once per restore of each user. The serialized XML of a
+case only changes when the case is saved, so it is cached by case id and
+``server_modified_on`` along with everything else that affects the
+output of ``get_case_element``.
+"""
+import threading
+from collections import OrderedDict
+
+from casexml.apps.case.xml.generator import _sync_attachments
+from casexml.apps.phone.const import CASE_XML_CACHE_SIZE
+from casexml.apps.phone.xml import get_case_element, tostring
+
+
+class CaseXMLCache(object):
+    """Thread safe least-recently-used cache of bytes values
+
+    The cache is bounded by the total length of the cached values.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._data[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                __, discarded = self._data.popitem(last=False)
+                self.size -= len(discarded)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+
+case_xml_cache = CaseXMLCache(CASE_XML_CACHE_SIZE)
+
+
+def get_cached_case_xml(case, updates, version):
+    """Get serialized case XML, using the cache if possible
+
+    :param updates: Required updates (create, update, close, etc.)
+    :returns: UTF-8 encoded XML bytes.
+    """
+    key = get_case_xml_cache_key(case, updates, version)
+    if key is None:
+        return tostring(get_case_element(case, updates, version))
+    xml = case_xml_cache.get(key)
+    if xml is None:
+        xml = tostring(get_case_element(case, updates, version))
+        case_xml_cache.set(key, xml)
+    return xml
+
+
+def get_case_xml_cache_key(case, updates, version):
+    """Get cache key for serialized case XML
+
+    :returns: A hashable key or ``None`` if the case cannot be cached.
+    """
+    if not case.server_modified_on:
+        return None  # unsaved case
+    return (
+        case.case_id,
+        case.server_modified_on,
+        version,
+        tuple(sorted(updates)),
+        _sync_attachments(case.domain),
+    )
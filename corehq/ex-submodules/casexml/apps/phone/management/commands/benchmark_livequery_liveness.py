@@ -0,0 +1,173 @@
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict, namedtuple
+from itertools import chain
+
+from django.core.management import BaseCommand
+
+from casexml.apps.case.const import CASE_INDEX_CHILD as CHILD
+from casexml.apps.case.const import CASE_INDEX_EXTENSION as EXTENSION
+from casexml.apps.phone.data_providers.case.case_graph import (
+    InternedCaseGraph,
+    compute_live_ids,
+)
+
+Index = namedtuple('Index', 'case_id identifier referenced_id relationship')
+
+
+class Command(BaseCommand):
+    """Compare the time and peak memory used to compute live case ids on
+    a synthetic case graph with ``compute_live_ids``, ``InternedCaseGraph``
+    (used by ``compute_live_ids`` for large graphs) and the recursive set
+    based algorithm they replaced.
+
+    Usage: ./manage.py benchmark_livequery_liveness --cases 100000 --indices 300000
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=100000)
+        parser.add_argument('--indices', type=int, default=300000)
+        parser.add_argument('--owned', type=float, default=0.2, help='Fraction of cases that are owned')
+        parser.add_argument('--closed', type=float, default=0.1, help='Fraction of cases that are closed')
+        parser.add_argument('--extensions', type=float, default=0.3,
+                            help='Fraction of indices that are extension indices')
+        parser.add_argument('--recursion-limit', type=int, default=sys.getrecursionlimit(),
+                            dest='recursion_limit')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, **options):
+        owned_ids, open_ids, indices = make_graph(
+            options['cases'], options['indices'], options['owned'], options['closed'],
+            options['extensions'], random.Random(options['seed']),
+        )
+        print("{} cases, {} owned, {} open, {} indices".format(
+            options['cases'], len(owned_ids), len(open_ids), len(indices)))
+
+        old_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(options['recursion_limit'])
+        try:
+            results = {
+                'compute_live_ids': self.run(
+                    'compute_live_ids', compute_live_ids, owned_ids, open_ids, indices),
+                'interned': self.run('interned', interned_live_ids, owned_ids, open_ids, indices),
+                'recursive': self.run('recursive', recursive_live_ids, owned_ids, open_ids, indices),
+            }
+        finally:
+            sys.setrecursionlimit(old_limit)
+
+        for name in ['interned', 'recursive']:
+            if results['compute_live_ids'] is not None and results[name] is not None:
+                diff = results['compute_live_ids'] ^ results[name]
+                print("{}: live ids differ for {} cases".format(name, len(diff)) if diff
+                      else "{}: live ids match".format(name))
+
+    def run(self, name, func, owned_ids, open_ids, indices):
+        try:
+            start = time.perf_counter()
+            live_ids = func(owned_ids, open_ids, indices)
+            elapsed = time.perf_counter() - start
+
+            tracemalloc.start()
+            func(owned_ids, open_ids, indices)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        except RecursionError:
+            tracemalloc.stop()
+            print("{:>16}: RecursionError (limit {})".format(name, sys.getrecursionlimit()))
+            return None
+        print("{:>16}: {:.3f}s, peak memory {:.1f} MB, {} live".format(
+            name, elapsed, peak / 1024 / 1024, len(live_ids)))
+        return live_ids
+
+
+def make_graph(num_cases, num_indices, owned_fraction, closed_fraction, extension_fraction, rand):
+    """Generate a random case graph
+
+    Indices always reference a case created earlier so that chains of
+    indices get long, like households -> members -> visits.
+    """
+    case_ids = ['%032x' % rand.getrandbits(128) for i in range(num_cases)]
+    open_list = [case_id for case_id in case_ids if rand.random() >= closed_fraction]
+    owned_ids = {case_id for case_id in open_list if rand.random() < owned_fraction}
+    open_ids = set(open_list)
+    indices = []
+    for i in range(num_indices):
+        sub = rand.randrange(1, num_cases)
+        # mostly reference a recent case to produce deep chains
+        ref = max(0, sub - 1 - int(rand.expovariate(0.5)))
+        relationship = EXTENSION if rand.random() < extension_fraction else CHILD
+        indices.append(Index(case_ids[sub], 'ix{}'.format(i), case_ids[ref], relationship))
+    return owned_ids, open_ids, indices
+
+
+def interned_live_ids(owned_ids, open_ids, indices):
+    return InternedCaseGraph(owned_ids, open_ids, indices).get_live_ids()
+
+
+def recursive_live_ids(owned_ids, open_ids, indices):
+    """The liveness algorithm used by livequery before ``compute_live_ids``
+
+    Its result can depend on the order of ``indices``.
+    """
+
+    def is_extension(case_id):
+        return case_id in hosts_by_extension and case_id not in parents_by_child
+
+    def has_live_extension(case_id, cache={}):
+        try:
+            return cache[case_id]
+        except KeyError:
+            cache[case_id] = False
+        cache[case_id] = result = any(
+            ext_id in live_ids
+            or ext_id in owned_ids
+            or has_live_extension(ext_id)
+            for ext_id in extensions_by_host[case_id]
+        )
+        return result
+
+    def enliven(case_id):
+        if case_id in live_ids:
+            return
+        live_ids.add(case_id)
+        ext_ids = extensions_by_host.get(case_id, [])
+        host_ids = hosts_by_extension.get(case_id, [])
+        parent_ids = parents_by_child.get(case_id, [])
+        for cid in chain(ext_ids, host_ids, parent_ids):
+            enliven(cid)
+
+    def classify(index):
+        sub_id = index.case_id
+        ref_id = index.referenced_id
+        if sub_id in live_ids:
+            enliven(ref_id)
+        elif index.relationship == EXTENSION:
+            if sub_id in open_ids:
+                if ref_id in live_ids:
+                    enliven(sub_id)
+                else:
+                    extensions_by_host[ref_id].add(sub_id)
+                    hosts_by_extension[sub_id].add(ref_id)
+        elif sub_id in owned_ids:
+            enliven(sub_id)
+            enliven(ref_id)
+        else:
+            parents_by_child[sub_id].add(ref_id)
+
+    live_ids = set()
+    extensions_by_host = defaultdict(set)
+    hosts_by_extension = defaultdict(set)
+    parents_by_child = defaultdict(set)
+    for index in indices:
+        classify(index)
+    for case_id in owned_ids:
+        if not is_extension(case_id):
+            enliven(case_id)
+    for case_id in open_ids:
+        if (case_id not in live_ids
+                and not is_extension(case_id)
+                and has_live_extension(case_id)):
+            enliven(case_id)
+    return live_ids
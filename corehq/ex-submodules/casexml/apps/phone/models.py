@@ -592,6 +592,8 @@ class SimplifiedSyncLog(AbstractSyncLog):
     closed_cases = SetProperty(six.text_type)
     extensions_checked = BooleanProperty(default=False)
     device_id = StringProperty()
+    # livequery case graph, see casexml.apps.phone.data_providers.case.case_graph
+    case_graph_snapshot = DictProperty()
 
     _purged_cases = None
 
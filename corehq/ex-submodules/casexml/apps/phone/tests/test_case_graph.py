@@ -0,0 +1,264 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from casexml.apps.case.const import CASE_INDEX_CHILD as CHILD
+from casexml.apps.case.const import CASE_INDEX_EXTENSION as EXTENSION
+from casexml.apps.phone.data_providers.case.case_graph import (
+    CaseGraphSnapshot,
+    IndexInfo,
+    InternedCaseGraph,
+    compute_live_ids,
+    get_case_graph_snapshot,
+)
+
+LAST_SYNC = datetime(2019, 6, 1, 12)
+BEFORE_SYNC = LAST_SYNC - timedelta(days=1)
+AFTER_SYNC = LAST_SYNC + timedelta(hours=1)
+
+
+def _indices(*edges):
+    """Build indices from ``(case_id, relationship, referenced_id)`` tuples"""
+    indices = {}
+    for i, (case_id, relationship, referenced_id) in enumerate(edges):
+        identifier = 'ix{}'.format(i)
+        indices.setdefault(case_id, {})[identifier] = IndexInfo(
+            case_id, identifier, referenced_id, relationship)
+    return indices
+
+
+class ComputeLiveIdsTest(SimpleTestCase):
+
+    def assert_live(self, owned, open_ids, edges, expected):
+        indices = [index for ixs in _indices(*edges).values() for index in ixs.values()]
+        live = compute_live_ids(set(owned), set(open_ids), indices)
+        self.assertEqual(live, set(expected))
+        live = InternedCaseGraph(set(owned), set(open_ids), indices).get_live_ids()
+        self.assertEqual(live, set(expected), 'interned')
+
+    def test_extensions_of_host_with_owned_extension(self):
+        self.assert_live('d', 'abd', [('d', EXTENSION, 'a'), ('b', EXTENSION, 'a')], 'abd')
+
+    def test_owned_extension_of_closed_and_open_hosts(self):
+        self.assert_live('e', 'be', [('e', EXTENSION, 'a'), ('e', EXTENSION, 'b')], 'abe')
+
+    def test_owned_child_with_extension(self):
+        self.assert_live('a', 'ac', [('a', CHILD, 'b'), ('c', EXTENSION, 'a')], 'abc')
+
+    def test_owned_extension_of_closed_host(self):
+        self.assert_live('d', 'd', [('d', EXTENSION, 'a')], '')
+
+    def test_extension_chain(self):
+        self.assert_live('c', 'abc', [('b', EXTENSION, 'a'), ('c', EXTENSION, 'b')], 'abc')
+
+    def test_extension_chain_with_closed_host(self):
+        self.assert_live('c', 'bc', [('b', EXTENSION, 'a'), ('c', EXTENSION, 'b')], '')
+
+    def test_child_of_unavailable_extension(self):
+        self.assert_live(
+            'c', 'bcd',
+            [('b', EXTENSION, 'a'), ('c', EXTENSION, 'b'), ('d', CHILD, 'c')],
+            '',
+        )
+
+    def test_deep_chain(self):
+        # deeper than the default recursion limit
+        case_ids = ['case{}'.format(i) for i in range(5000)]
+        edges = [(case_ids[i + 1], CHILD, case_ids[i]) for i in range(len(case_ids) - 1)]
+        self.assert_live([case_ids[-1]], case_ids, edges, case_ids)
+
+
+class CaseGraphSnapshotSerializationTest(SimpleTestCase):
+
+    def test_round_trip(self):
+        snapshot = CaseGraphSnapshot(
+            ['user'], {'a'}, {'a', 'c'},
+            _indices(('a', CHILD, 'b'), ('c', EXTENSION, 'a')),
+            {'a', 'b', 'c'},
+            traversed_on=LAST_SYNC,
+        )
+        data = snapshot.to_json()
+        self.assertEqual(data['case_ids'], ['a', 'b', 'c'])
+
+        loaded = CaseGraphSnapshot.wrap(data)
+        self.assertEqual(loaded.owner_ids, {'user'})
+        self.assertEqual(loaded.owned_ids, {'a'})
+        self.assertEqual(loaded.open_ids, {'a', 'c'})
+        self.assertEqual(loaded.live_ids, {'a', 'b', 'c'})
+        self.assertEqual(loaded.indices, snapshot.indices)
+        self.assertEqual(loaded.traversed_on, LAST_SYNC)
+
+    def test_wrap_invalid(self):
+        self.assertIsNone(CaseGraphSnapshot.wrap({}))
+        self.assertIsNone(CaseGraphSnapshot.wrap({'version': -1}))
+        data = CaseGraphSnapshot(['user'], {'a'}, {'a'}, {}, {'a'}).to_json()
+        data['owned'] = [5]
+        self.assertIsNone(CaseGraphSnapshot.wrap(data))
+
+
+class FakeCase(object):
+
+    def __init__(self, case_id, owner_id='other', closed=False, deleted=False,
+                 modified=BEFORE_SYNC, indices=()):
+        self.case_id = case_id
+        self.owner_id = owner_id
+        self.closed = closed
+        self.deleted = deleted
+        self.modified = modified
+        self.indices = [
+            IndexInfo(case_id, identifier, referenced_id, relationship)
+            for identifier, relationship, referenced_id in indices
+        ]
+
+
+class FakeAccessor(object):
+
+    def __init__(self, *cases):
+        self.cases = {case.case_id: case for case in cases}
+        self.calls = []
+
+    def _all_indices(self):
+        return [index for case in self.cases.values() for index in case.indices]
+
+    def get_last_modified_dates(self, case_ids):
+        return {case_id: self.cases[case_id].modified
+            for case_id in case_ids if case_id in self.cases}
+
+    def get_case_ids_modified_with_owner_since(self, owner_id, since):
+        return [case.case_id for case in self.cases.values()
+            if case.owner_id == owner_id and case.modified >= since and not case.deleted]
+
+    def get_extension_case_ids(self, case_ids, include_closed=True):
+        return [index.case_id for index in self._all_indices()
+            if index.referenced_id in case_ids
+                and index.relationship == EXTENSION
+                and not self.cases[index.case_id].deleted
+                and (include_closed or not self.cases[index.case_id].closed)]
+
+    def get_related_indices(self, case_ids, exclude):
+        self.calls.append(('get_related_indices', set(case_ids)))
+        return [index for index in self._all_indices()
+            if '{} {}'.format(index.case_id, index.identifier) not in exclude
+                and (index.case_id in case_ids or (
+                    index.referenced_id in case_ids
+                    and index.relationship == EXTENSION
+                    and not self.cases[index.case_id].closed
+                    and not self.cases[index.case_id].deleted))]
+
+    def get_closed_and_deleted_ids(self, case_ids):
+        return [(case_id, self.cases[case_id].closed, self.cases[case_id].deleted)
+            for case_id in case_ids
+            if case_id in self.cases and (self.cases[case_id].closed or self.cases[case_id].deleted)]
+
+
+@contextmanager
+def timing_context(name):
+    yield
+
+
+class CaseGraphSnapshotUpdateTest(SimpleTestCase):
+
+    def get_snapshot(self):
+        # a(owned) <--ext-- b
+        return CaseGraphSnapshot(
+            ['user'], {'a'}, {'a', 'b'}, _indices(('b', EXTENSION, 'a')), {'a', 'b'})
+
+    def test_no_changes(self):
+        accessor = FakeAccessor(
+            FakeCase('a', owner_id='user'),
+            FakeCase('b', indices=[('host', EXTENSION, 'a')]),
+        )
+        snapshot = self.get_snapshot()
+        self.assertFalse(snapshot.update(accessor, LAST_SYNC, timing_context))
+        self.assertEqual(snapshot.live_ids, {'a', 'b'})
+        self.assertEqual(accessor.calls, [])
+
+    def test_new_owned_case_with_parent(self):
+        accessor = FakeAccessor(
+            FakeCase('a', owner_id='user'),
+            FakeCase('b', indices=[('host', EXTENSION, 'a')]),
+            FakeCase('c', owner_id='user', modified=AFTER_SYNC, indices=[('parent', CHILD, 'p')]),
+            FakeCase('p', closed=True),
+        )
+        snapshot = self.get_snapshot()
+        self.assertTrue(snapshot.update(accessor, LAST_SYNC, timing_context))
+        self.assertEqual(snapshot.live_ids, {'a', 'b', 'c', 'p'})
+        self.assertEqual(snapshot.open_ids, {'a', 'b', 'c'})
+
+    def test_new_extension_of_graph_case(self):
+        accessor = FakeAccessor(
+            FakeCase('a', owner_id='user'),
+            FakeCase('b', indices=[('host', EXTENSION, 'a')]),
+            FakeCase('e', modified=AFTER_SYNC, indices=[('host', EXTENSION, 'b')]),
+        )
+        snapshot = self.get_snapshot()
+        self.assertTrue(snapshot.update(accessor, LAST_SYNC, timing_context))
+        self.assertEqual(snapshot.live_ids, {'a', 'b', 'e'})
+
+    def test_owned_case_closed(self):
+        accessor = FakeAccessor(
+            FakeCase('a', owner_id='user', closed=True, modified=AFTER_SYNC),
+            FakeCase('b', indices=[('host', EXTENSION, 'a')]),
+        )
+        snapshot = self.get_snapshot()
+        self.assertTrue(snapshot.update(accessor, LAST_SYNC, timing_context))
+        self.assertEqual(snapshot.live_ids, set())
+        self.assertEqual(snapshot.owned_ids, set())
+
+    def test_extension_deleted(self):
+        accessor = FakeAccessor(
+            FakeCase('a', owner_id='user'),
+            FakeCase('b', deleted=True, modified=AFTER_SYNC, indices=[('host', EXTENSION, 'a')]),
+        )
+        snapshot = self.get_snapshot()
+        self.assertTrue(snapshot.update(accessor, LAST_SYNC, timing_context))
+        self.assertEqual(snapshot.live_ids, {'a'})
+        self.assertEqual(snapshot.case_ids, {'a'})
+
+
+class FakeSyncLog(object):
+
+    def __init__(self, date, case_graph_snapshot):
+        self.date = date
+        self.case_graph_snapshot = case_graph_snapshot
+
+
+class FakeRestoreState(object):
+
+    def __init__(self, last_sync_log, owner_ids=('user',)):
+        self.last_sync_log = last_sync_log
+        self.owner_ids = list(owner_ids)
+
+
+class GetCaseGraphSnapshotTest(SimpleTestCase):
+
+    def sync(self, restore_state, now, accessor):
+        """Update the snapshot like a restore at ``now`` and return the new sync log"""
+        with patch('casexml.apps.phone.data_providers.case.case_graph.datetime') as mock_datetime:
+            mock_datetime.utcnow.return_value = now
+            snapshot = get_case_graph_snapshot(restore_state)
+        if snapshot is not None:
+            snapshot.update(accessor, restore_state.last_sync_log.date, timing_context)
+        return snapshot, FakeSyncLog(now, snapshot.to_json() if snapshot is not None else None)
+
+    def test_frequent_syncs_rebuild_after_max_age(self):
+        accessor = FakeAccessor(FakeCase('a', owner_id='user'))
+        snapshot = CaseGraphSnapshot(['user'], {'a'}, {'a'}, {}, {'a'}, traversed_on=LAST_SYNC)
+        sync_log = FakeSyncLog(LAST_SYNC, snapshot.to_json())
+
+        # sync every day, each time from the previous day's sync log
+        for day in range(1, 8):
+            snapshot, sync_log = self.sync(FakeRestoreState(sync_log), LAST_SYNC + timedelta(days=day), accessor)
+            self.assertIsNotNone(snapshot, day)
+            self.assertEqual(snapshot.traversed_on, LAST_SYNC)
+
+        snapshot, sync_log = self.sync(FakeRestoreState(sync_log), LAST_SYNC + timedelta(days=8), accessor)
+        self.assertIsNone(snapshot)
+
+    def test_owner_ids_changed(self):
+        snapshot = CaseGraphSnapshot(['user'], {'a'}, {'a'}, {}, {'a'})
+        restore_state = FakeRestoreState(FakeSyncLog(LAST_SYNC, snapshot.to_json()), owner_ids=['user', 'group'])
+        self.assertIsNone(get_case_graph_snapshot(restore_state))
@@ -0,0 +1,80 @@
+from datetime import datetime
+
+from django.test import SimpleTestCase
+from mock import patch
+
+from casexml.apps.case.const import CASE_ACTION_CREATE, CASE_ACTION_UPDATE
+from casexml.apps.case.xml import V2, V3
+from casexml.apps.phone.data_providers.case.xml_cache import (
+    CaseXMLCache,
+    get_cached_case_xml,
+    get_case_xml_cache_key,
+)
+
+MODULE = 'casexml.apps.phone.data_providers.case.xml_cache'
+
+
+class FakeCase(object):
+    domain = 'test'
+
+    def __init__(self, case_id, server_modified_on):
+        self.case_id = case_id
+        self.server_modified_on = server_modified_on
+
+
+class CaseXMLCacheTest(SimpleTestCase):
+
+    def test_evict_least_recently_used(self):
+        cache = CaseXMLCache(max_bytes=10)
+        cache.set('a', b'1234')
+        cache.set('b', b'1234')
+        cache.get('a')
+        cache.set('c', b'1234')
+        self.assertEqual(cache.get('a'), b'1234')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), b'1234')
+        self.assertEqual(cache.size, 8)
+
+    def test_replace_value(self):
+        cache = CaseXMLCache(max_bytes=10)
+        cache.set('a', b'1234')
+        cache.set('a', b'12')
+        self.assertEqual(cache.size, 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_value_larger_than_cache_is_not_cached(self):
+        cache = CaseXMLCache(max_bytes=3)
+        cache.set('a', b'1234')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.size, 0)
+
+
+@patch(MODULE + '._sync_attachments', lambda domain: False)
+class GetCachedCaseXMLTest(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = CaseXMLCache(max_bytes=1000)
+        cache_patch = patch(MODULE + '.case_xml_cache', self.cache)
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+    def test_key(self):
+        case = FakeCase('abc', datetime(2019, 6, 1))
+        key = get_case_xml_cache_key(case, [CASE_ACTION_UPDATE, CASE_ACTION_CREATE], V2)
+        self.assertEqual(key, get_case_xml_cache_key(case, [CASE_ACTION_CREATE, CASE_ACTION_UPDATE], V2))
+        self.assertNotEqual(key, get_case_xml_cache_key(case, [CASE_ACTION_UPDATE], V2))
+        self.assertNotEqual(key, get_case_xml_cache_key(case, [CASE_ACTION_CREATE, CASE_ACTION_UPDATE], V3))
+        modified = FakeCase('abc', datetime(2019, 6, 2))
+        self.assertNotEqual(key, get_case_xml_cache_key(modified, [CASE_ACTION_CREATE, CASE_ACTION_UPDATE], V2))
+
+    def test_unsaved_case_is_not_cached(self):
+        self.assertIsNone(get_case_xml_cache_key(FakeCase('abc', None), [CASE_ACTION_UPDATE], V2))
+
+    @patch(MODULE + '.tostring', lambda element: element)
+    def test_serialize_once(self):
+        case = FakeCase('abc', datetime(2019, 6, 1))
+        with patch(MODULE + '.get_case_element', return_value=b'<case/>') as get_element:
+            self.assertEqual(get_cached_case_xml(case, [CASE_ACTION_UPDATE], V2), b'<case/>')
+            self.assertEqual(get_cached_case_xml(case, [CASE_ACTION_UPDATE], V2), b'<case/>')
+        self.assertEqual(get_element.call_count, 1)
+        self.assertEqual(self.cache.hits, 1)
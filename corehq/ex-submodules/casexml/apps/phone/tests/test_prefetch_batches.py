@@ -0,0 +1,43 @@
+import threading
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.data_providers.case.livequery import prefetch_batches
+
+
+class PrefetchBatchesTest(SimpleTestCase):
+
+    def test_batches_in_order(self):
+        batches = iter([[1, 2], [3], [4, 5]])
+        self.assertEqual(list(prefetch_batches(batches)), [[1, 2], [3], [4, 5]])
+
+    def test_fetch_on_background_thread(self):
+        def batches():
+            yield threading.current_thread()
+
+        thread, = prefetch_batches(batches())
+        self.assertIsNot(thread, threading.current_thread())
+
+    def test_error_is_raised_in_consumer(self):
+        def batches():
+            yield [1]
+            raise ValueError("fail")
+
+        prefetched = prefetch_batches(batches())
+        self.assertEqual(next(prefetched), [1])
+        with self.assertRaises(ValueError):
+            next(prefetched)
+
+    def test_stop_fetching_when_consumer_stops(self):
+        fetched = []
+
+        def batches():
+            for i in range(100):
+                fetched.append(i)
+                yield [i]
+
+        prefetched = prefetch_batches(batches(), timeout=0.01)
+        self.assertEqual(next(prefetched), [0])
+        prefetched.close()
+        self.assertLess(len(fetched), 5)
+        self.assertFalse([t for t in threading.enumerate() if t.name == "livequery-prefetch"])
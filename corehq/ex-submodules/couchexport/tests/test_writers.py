@@ -12,6 +12,7 @@ from couchexport.models import Format
 from couchexport.writers import (
     MAX_XLS_COLUMNS,
     CsvFileWriter,
+    HtmlExportWriter,
     PythonDictWriter,
     XlsLengthException,
     ZippedExportWriter,
@@ -83,6 +84,17 @@ class CsvFileWriterTests(SimpleTestCase):
         file_start = writer.get_file().read(6)
         self.assertEqual(file_start, BOM_UTF8 + b'100')
 
+    def test_csv_file_writer_write_rows(self):
+        writer = CsvFileWriter()
+        writer.open('Spam')
+        writer.write_row(['ham', 'spam'])
+        writer.write_rows([[b'h\xc3\xa1m', 1], ['eggs, bacon', None]])
+        writer.finish()
+        self.assertEqual(
+            writer.get_file().read(),
+            BOM_UTF8 + 'ham,spam\r\nhám,1\r\n"eggs, bacon",\r\n'.encode('utf-8'),
+        )
+
 
 class HtmlExportWriterTests(SimpleTestCase):
 
@@ -106,6 +118,21 @@ class HtmlExportWriterTests(SimpleTestCase):
                           ['<td>spam</td>', '<td>spam</td>', '<td/>', '<td>spam</td>'],
                           ['<td>spam</td>', '<td>spam</td>', '<td/>', '<td>spam</td>']])
 
+    def test_write_rows(self):
+        writer = HtmlExportWriter()
+        with closing(io.BytesIO()) as file_:
+            writer.open([('Spam', [('Breakfast', 'Lunch')])], file_)
+            writer.write_rows('Spam', [('spam', 'eggs'), ('ham', None)])
+            writer.write_rows('Spam', [('bacon', 'spam')])
+            writer.close()
+            root = html.fromstring(file_.getvalue())
+
+        self.assertEqual([th.text for th in root.xpath('./body/table/thead/tr/th')], ['Breakfast', 'Lunch'])
+        self.assertEqual(
+            [[td.text for td in tr.xpath('./td')] for tr in root.xpath('./body/table/tbody/tr')],
+            [['spam', 'eggs'], ['ham', None], ['bacon', 'spam']],
+        )
+
 
 class Excel2007ExportWriterTests(SimpleTestCase):
 
@@ -96,6 +96,10 @@ class ExportFileWriter(object):
     def write_row(self, row):
         raise NotImplementedError
 
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
     def _end_file(self):
         pass
 
@@ -117,11 +121,14 @@ class CsvFileWriter(ExportFileWriter):
         self._file.write(BOM_UTF8)
 
     def write_row(self, row):
+        self.write_rows([row])
+
+    def write_rows(self, rows):
         buffer = io.StringIO()
         csvwriter = csv.writer(buffer, csv.excel)
-        csvwriter.writerow([
-            col.decode('utf-8') if isinstance(col, bytes) else col
-            for col in row
+        csvwriter.writerows([
+            [col.decode('utf-8') if isinstance(col, bytes) else col for col in row]
+            for row in rows
         ])
         self._file.write(buffer.getvalue().encode('utf-8'))
 
@@ -140,6 +147,14 @@ class PartialHtmlFileWriter(ExportFileWriter):
         self._on_first_row = False
         self._write_from_template({"row": row, "section": section})
 
+    def write_rows(self, rows):
+        rows = list(rows)
+        if rows and self._on_first_row:
+            self.write_row(rows.pop(0))
+        if rows:
+            # render many rows at once rather than the template per row
+            self._write_from_template({"rows": rows, "section": "rows"})
+
     def _end_file(self):
         if self._on_first_row:
             # There were no rows
@@ -242,6 +257,14 @@ class ExportWriter(object):
         """
         return self._write_row(table_index, row)
 
+    def write_rows(self, table_index, rows):
+        """
+        Write a list of rows to the given table. Unlike `write` this
+        does not touch row ids.
+        """
+        assert self._isopen
+        return self._write_rows(table_index, rows)
+
     def close(self):
         """
         Close any open file references, do any cleanup.
@@ -259,6 +282,10 @@ class ExportWriter(object):
     def _write_row(self, sheet_index, row):
         raise NotImplementedError
 
+    def _write_rows(self, sheet_index, rows):
+        for row in rows:
+            self._write_row(sheet_index, row)
+
     def _close(self):
         raise NotImplementedError
 
@@ -287,6 +314,9 @@ class OnDiskExportWriter(ExportWriter):
         self.table_names[table_index] = table_title
 
     def _write_row(self, sheet_index, row):
+        self._write_rows(sheet_index, [row])
+
+    def _write_rows(self, sheet_index, rows):
 
         def _transform(val):
             if val is None:
@@ -295,8 +325,7 @@ class OnDiskExportWriter(ExportWriter):
                 val = val.encode("utf8")
             return val
 
-        row = list(map(_transform, row))
-        self.tables[sheet_index].write_row(row)
+        self.tables[sheet_index].write_rows([list(map(_transform, row)) for row in rows])
 
     def _close(self):
         """
@@ -34,5 +34,10 @@ MULTIPART_EMPTY_PAYLOAD_ERROR = BadRequest((
     'must not have an empty payload\n'
 ) % MAGIC_PROPERTY)
 EMPTY_PAYLOAD_ERROR = BadRequest('Post may not have an empty body\n')
+BATCH_FORMAT_ERROR = BadRequest((
+    'Submission batches must be multipart/form-data with each form named '
+    '<n>/%s and its attachments named <n>/<attachment name>, '
+    'where <n> is the position of the form in the batch starting from 0.\n'
+) % MAGIC_PROPERTY)
 
 DEVICE_LOG_XMLNS = 'http://code.javarosa.org/devicereport'
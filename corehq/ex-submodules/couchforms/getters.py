@@ -1,6 +1,7 @@
 from django.utils.datastructures import MultiValueDictKeyError
 from corehq.util.global_request import get_request_domain
 from couchforms.const import (
+    BATCH_FORMAT_ERROR,
     EMPTY_PAYLOAD_ERROR,
     MAGIC_PROPERTY,
     MULTIPART_EMPTY_PAYLOAD_ERROR,
@@ -14,7 +15,7 @@ from dimagi.utils.parsing import string_to_utc_datetime
 from dimagi.utils.web import get_ip, get_site_domain
 
 
-__all__ = ['get_path', 'get_instance_and_attachment',
+__all__ = ['get_path', 'get_instance_and_attachment', 'get_instances_and_attachments',
            'get_location', 'get_received_on', 'get_date_header',
            'get_submit_ip', 'get_last_sync_token', 'get_openrosa_headers']
 
@@ -59,6 +60,38 @@ def get_instance_and_attachment(request):
     return instance, attachments
 
 
+def get_instances_and_attachments(request):
+    """Get the forms in a submission batch
+
+    Each form is a multipart file named ``<n>/xml_submission_file`` and
+    its attachments are named ``<n>/<attachment name>``, where ``<n>`` is
+    the position of the form in the batch starting from 0.
+
+    :returns: List of ``(instance, attachments)`` in batch order or a
+    ``BadRequest``.
+    """
+    if not request.META['CONTENT_TYPE'].startswith('multipart/form-data') or list(request.POST):
+        return BATCH_FORMAT_ERROR
+
+    forms = {}
+    for key, item in request.FILES.items():
+        position, _, name = key.partition('/')
+        if not position.isdigit() or not name:
+            return BATCH_FORMAT_ERROR
+        forms.setdefault(int(position), {})[name] = item
+
+    if sorted(forms) != list(range(len(forms))):
+        return BATCH_FORMAT_ERROR
+    instances = []
+    for position in range(len(forms)):
+        attachments = forms[position]
+        if MAGIC_PROPERTY not in attachments:
+            return BATCH_FORMAT_ERROR
+        instance = attachments.pop(MAGIC_PROPERTY).read()
+        instances.append((instance or MULTIPART_EMPTY_PAYLOAD_ERROR, attachments))
+    return instances
+
+
 def get_location(request=None):
     # this is necessary, because www.commcarehq.org always uses https,
     # but is behind a proxy that won't necessarily look like https
@@ -2,3 +2,10 @@
 CHECKPOINT_FREQUENCY = 100
 CHECKPOINT_MIN_WAIT = 300
 DEFAULT_PROCESSOR_CHUNK_SIZE = 10
+CHUNK_MIN_WAIT = 30
+
+# bounds and targets for AdaptiveChunkSize
+ADAPTIVE_CHUNK_MIN_WAIT = 1
+ADAPTIVE_CHUNK_TARGET_SECONDS = 10
+ADAPTIVE_CHUNK_MAX_ERROR_RATE = 0.1
+ADAPTIVE_CHUNK_LAG_INTERVAL = 10
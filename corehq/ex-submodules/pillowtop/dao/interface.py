@@ -17,3 +17,17 @@ class DocumentStore(metaclass=ABCMeta):
     @abstractmethod
     def iter_documents(self, ids):
         raise NotImplementedError('this function not yet implemented')
+
+    def get_ids_by_database(self, ids):
+        """
+        Group ``ids`` by the database to read them from, for stores that
+        read their sharded databases directly. Each group can be fetched with
+        ``iter_documents_from_database``.
+
+        :returns: dict of ``database -> ids`` or None if the store is not read by database
+        """
+        return None
+
+    def iter_documents_from_database(self, database, ids):
+        """Fetch documents from a single database. All ``ids`` must be stored in ``database``."""
+        raise NotImplementedError('this function not yet implemented')
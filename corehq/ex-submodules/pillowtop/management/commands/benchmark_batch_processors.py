@@ -0,0 +1,101 @@
+import time
+import uuid
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from pillowtop.feed.interface import Change, ChangeMeta
+from pillowtop.pillow.interface import ConstructedPillow
+from pillowtop.processors.interface import BulkPillowProcessor
+
+
+class Command(BaseCommand):
+    """Compare chunk processing time with batch processors run one after
+    another and run concurrently.
+
+    The processors don't do any work, they sleep for ``--latency`` seconds
+    per chunk to simulate waiting on ES, SQL or Kafka. ``--dependent``
+    processors don't support concurrent processing and always run on the
+    pillow's thread.
+
+    Usage: ./manage.py benchmark_batch_processors --processors 3 --latency 0.05
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processors', type=int, default=3)
+        parser.add_argument('--dependent', type=int, default=1)
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Seconds each processor waits per chunk')
+        parser.add_argument('--changes', type=int, default=1000)
+        parser.add_argument('--chunk-size', type=int, default=100, dest='chunk_size')
+
+    def handle(self, processors, dependent, latency, changes, chunk_size, **options):
+        self.stdout.write("{} changes in chunks of {}, {} concurrent and {} dependent processors, "
+                          "{}s latency".format(changes, chunk_size, processors, dependent, latency))
+        chunks = [
+            [make_change(seq) for seq in range(start, min(start + chunk_size, changes))]
+            for start in range(0, changes, chunk_size)
+        ]
+        results = {}
+        for concurrent in [False, True]:
+            pillow = BenchmarkPillow(processors, dependent, latency, chunk_size, concurrent)
+            start = time.perf_counter()
+            for chunk in chunks:
+                pillow._batch_process_with_error_handling(chunk)
+            seconds = time.perf_counter() - start
+            results[concurrent] = seconds
+            counts = {processor.count for processor in pillow.processors}
+            self.stdout.write("{:>10}: {:.2f}s ({:.0f} changes/sec, processed {})".format(
+                'concurrent' if concurrent else 'serial', seconds, changes / seconds, counts))
+        self.stdout.write("speedup: {:.1f}x".format(results[False] / results[True]))
+
+
+class LatencyProcessor(BulkPillowProcessor):
+
+    def __init__(self, latency, concurrent):
+        self.latency = latency
+        self.supports_concurrent_processing = concurrent
+        self.count = 0
+
+    def process_change(self, change):
+        time.sleep(self.latency)
+        self.count += 1
+
+    def process_changes_chunk(self, changes_chunk):
+        time.sleep(self.latency)
+        self.count += len(changes_chunk)
+        return [], []
+
+
+class BenchmarkPillow(ConstructedPillow):
+
+    def __init__(self, processors, dependent, latency, chunk_size, concurrent):
+        super().__init__(
+            'benchmark-batch-processors',
+            checkpoint=None,
+            change_feed=None,
+            processor=(
+                [LatencyProcessor(latency, True) for i in range(processors)]
+                + [LatencyProcessor(latency, False) for i in range(dependent)]
+            ),
+            processor_chunk_size=chunk_size,
+            concurrent_batch_processors=concurrent,
+        )
+
+    def _record_datadog_metrics(self, changes_chunk, processing_time):
+        # don't send metrics for benchmark changes
+        pass
+
+
+def make_change(sequence_id):
+    doc_id = uuid.uuid4().hex
+    return Change(
+        id=doc_id,
+        sequence_id=sequence_id,
+        metadata=ChangeMeta(
+            document_id=doc_id,
+            data_source_type='benchmark',
+            data_source_name='benchmark',
+            publish_timestamp=datetime.utcnow(),
+        ),
+    )
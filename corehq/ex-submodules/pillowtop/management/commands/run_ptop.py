@@ -4,6 +4,7 @@ from django.conf import settings
 from django.core.management.base import BaseCommand
 
 from pillowtop.const import DEFAULT_PROCESSOR_CHUNK_SIZE
+from pillowtop.pillow.chunking import AdaptiveChunkSize
 from pillowtop.run_pillowtop import start_pillows, start_pillow
 from pillowtop.utils import (
     get_all_pillow_instances,
@@ -78,6 +79,39 @@ class Command(BaseCommand):
             help="The process number of this pillow process. Should be between 0 and num-processes. "
                  "It's expected that there will only be one process for each number running at once",
         )
+        parser.add_argument(
+            '--max-processor-chunk-size',
+            action='store',
+            dest='max_processor_chunk_size',
+            default=0,
+            type=int,
+            help="Adapt the chunk size to the processing time, error rate and lag of the pillow, "
+                 "starting from --processor-chunk-size and up to this size.",
+        )
+        parser.add_argument(
+            '--min-processor-chunk-size',
+            action='store',
+            dest='min_processor_chunk_size',
+            default=1,
+            type=int,
+            help="The smallest chunk size to adapt to. Only used with --max-processor-chunk-size.",
+        )
+        parser.add_argument(
+            '--prefetch-chunks',
+            action='store_true',
+            dest='prefetch_chunks',
+            default=False,
+            help="Read the next chunk of changes and fetch its documents while the current chunk "
+                 "is processed. Only applies to pillows with batch processors.",
+        )
+        parser.add_argument(
+            '--concurrent-processors',
+            action='store_true',
+            dest='concurrent_batch_processors',
+            default=False,
+            help="Run batch processors that support concurrent processing on a thread pool "
+                 "instead of one after another.",
+        )
 
     def handle(self, **options):
         run_all = options['run_all']
@@ -88,6 +122,10 @@ class Command(BaseCommand):
         num_processes = options['num_processes']
         process_number = options['process_number']
         processor_chunk_size = options['processor_chunk_size']
+        max_processor_chunk_size = options['max_processor_chunk_size']
+        min_processor_chunk_size = options['min_processor_chunk_size']
+        prefetch_chunks = options['prefetch_chunks']
+        concurrent_batch_processors = options['concurrent_batch_processors']
         assert 0 <= process_number < num_processes
         assert processor_chunk_size
         if list_all:
@@ -113,6 +151,11 @@ class Command(BaseCommand):
 
         elif not run_all and not pillow_key and pillow_name:
             pillow = get_pillow_by_name(pillow_name, num_processes=num_processes, process_num=process_number, processor_chunk_size=processor_chunk_size)
+            if max_processor_chunk_size:
+                pillow.adaptive_chunk_size = AdaptiveChunkSize(
+                    processor_chunk_size, min_processor_chunk_size, max_processor_chunk_size)
+            pillow.prefetch_chunks = prefetch_chunks
+            pillow.concurrent_batch_processors = concurrent_batch_processors
             start_pillow(pillow)
             sys.exit()
         elif list_checkpoints:
@@ -0,0 +1,104 @@
+import time
+
+from pillowtop.const import (
+    ADAPTIVE_CHUNK_LAG_INTERVAL,
+    ADAPTIVE_CHUNK_MAX_ERROR_RATE,
+    ADAPTIVE_CHUNK_MIN_WAIT,
+    ADAPTIVE_CHUNK_TARGET_SECONDS,
+    CHUNK_MIN_WAIT,
+)
+
+GROW = 'grow'
+SHRINK_ERRORS = 'shrink_errors'
+SHRINK_SLOW = 'shrink_slow'
+SHRINK_QUIET = 'shrink_quiet'
+HOLD = 'hold'
+
+
+class AdaptiveChunkSize(object):
+    """
+    Tunes a pillow's chunk size and flush interval from how chunks are processed.
+
+        After each chunk the size is:
+          - halved if the batch processors failed on too many of its changes
+            (errors are reprocessed serially so big chunks make them expensive)
+          - scaled down if a chunk took longer than `target_seconds`
+          - doubled if the change feed has more changes waiting than fit in a
+            chunk, and the flush interval raised so that chunks fill up
+          - halved, but not below the lag, if the feed is keeping up, and the
+            flush interval lowered so that changes are not held back waiting
+            for a full chunk
+
+        Lag is the number of changes in the feed that have not been read. It
+        is only known once `update_lag` has been called and the size is held
+        until then. Between updates it is estimated by subtracting the
+        changes processed since.
+    """
+
+    def __init__(self, chunk_size, min_chunk_size, max_chunk_size,
+                 min_flush_seconds=ADAPTIVE_CHUNK_MIN_WAIT, max_flush_seconds=CHUNK_MIN_WAIT,
+                 target_seconds=ADAPTIVE_CHUNK_TARGET_SECONDS, max_error_rate=ADAPTIVE_CHUNK_MAX_ERROR_RATE,
+                 lag_interval=ADAPTIVE_CHUNK_LAG_INTERVAL):
+        assert 0 < min_chunk_size <= max_chunk_size, (min_chunk_size, max_chunk_size)
+        assert 0 <= min_flush_seconds <= max_flush_seconds, (min_flush_seconds, max_flush_seconds)
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.min_flush_seconds = min_flush_seconds
+        self.max_flush_seconds = max_flush_seconds
+        self.target_seconds = target_seconds
+        self.max_error_rate = max_error_rate
+        self.lag_interval = lag_interval
+        self.chunk_size = self._bound(chunk_size)
+        self.flush_seconds = max_flush_seconds
+        self.lag = None
+        self._last_lag_time = None
+
+    def _bound(self, chunk_size):
+        return max(self.min_chunk_size, min(self.max_chunk_size, chunk_size))
+
+    def lag_due(self):
+        return self._last_lag_time is None or time.monotonic() - self._last_lag_time >= self.lag_interval
+
+    def update_lag(self, lag):
+        self.lag = lag
+        self._last_lag_time = time.monotonic()
+
+    def record_chunk(self, change_count, processing_time, error_count):
+        """Update chunk size and flush interval after processing a chunk
+
+        :returns: the decision made, one of GROW, SHRINK_ERRORS,
+        SHRINK_SLOW, SHRINK_QUIET or HOLD.
+        """
+        if not change_count:
+            return HOLD
+        if self.lag is not None:
+            self.lag = max(0, self.lag - change_count)
+        if error_count / change_count > self.max_error_rate:
+            decision = SHRINK_ERRORS
+            chunk_size = self.chunk_size // 2
+        elif processing_time > self.target_seconds:
+            decision = SHRINK_SLOW
+            chunk_size = int(change_count * self.target_seconds / processing_time)
+        elif self.lag is None:
+            decision = HOLD
+            chunk_size = self.chunk_size
+        elif self.lag > self.chunk_size:
+            decision = GROW
+            chunk_size = self.chunk_size * 2
+            self.flush_seconds = self.max_flush_seconds
+        else:
+            decision = SHRINK_QUIET
+            chunk_size = max(self.lag, self.chunk_size // 2)
+            self.flush_seconds = self.min_flush_seconds
+        self.chunk_size = self._bound(chunk_size)
+        return decision
+
+
+def get_change_feed_lag(change_feed):
+    """Number of changes in the feed after the last change read"""
+    latest = change_feed.get_latest_offsets()
+    return sum(
+        max(0, latest[key] - offset - 1)
+        for key, offset in change_feed.get_processed_offsets().items()
+        if offset is not None and key in latest
+    )
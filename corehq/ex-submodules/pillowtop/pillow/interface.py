@@ -1,11 +1,15 @@
 from abc import ABCMeta, abstractproperty, abstractmethod
-from collections import Counter
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from queue import Queue
 
 from django.conf import settings
+from django.db import connections
 from memoized import memoized
 
 import sys
+import threading
 
 from sentry_sdk import configure_scope
 
@@ -13,9 +17,10 @@ from corehq.util.datadog.gauges import datadog_counter, datadog_gauge, datadog_h
 from corehq.util.timer import TimingContext
 from dimagi.utils.logging import notify_exception
 from kafka.common import TopicPartition
-from pillowtop.const import CHECKPOINT_MIN_WAIT
+from pillowtop.const import CHECKPOINT_MIN_WAIT, CHUNK_MIN_WAIT
 from pillowtop.dao.exceptions import DocumentMissingError
-from pillowtop.utils import force_seq_int
+from pillowtop.pillow.chunking import get_change_feed_lag
+from pillowtop.utils import bulk_fetch_changes_docs, force_seq_int
 from pillowtop.exceptions import PillowtopCheckpointReset
 from pillowtop.logger import pillow_logging
 
@@ -38,6 +43,10 @@ class PillowRuntimeContext(object):
 
     def __init__(self, changes_seen=0):
         self.changes_seen = changes_seen
+        # change feed offsets after the change being checkpointed. Only set
+        # when changes are read ahead of processing, in which case the feed's
+        # own offsets are past the changes that have been processed.
+        self.processed_offsets = None
 
     def reset(self):
         self.changes_seen = 0
@@ -53,6 +62,15 @@ class PillowBase(metaclass=ABCMeta):
     retry_errors = True
     # this will be the batch size for processors that support batch processing
     processor_chunk_size = 0
+    # set to true to read the next chunk of changes and fetch its documents
+    # while the current chunk is processed (only applies to batch processing)
+    prefetch_chunks = False
+    # set to true to run batch processors that support concurrent processing
+    # on a thread pool instead of one after another
+    concurrent_batch_processors = False
+    # set to an AdaptiveChunkSize to tune the chunk size and flush interval
+    # while running instead of using processor_chunk_size and CHUNK_MIN_WAIT
+    adaptive_chunk_size = None
 
     @abstractproperty
     def pillow_id(self):
@@ -115,6 +133,32 @@ class PillowBase(metaclass=ABCMeta):
         if updated:
             self._record_checkpoint_in_datadog()
 
+    @property
+    def current_chunk_size(self):
+        if self.adaptive_chunk_size is not None:
+            return self.adaptive_chunk_size.chunk_size
+        return self.processor_chunk_size
+
+    @property
+    def current_flush_seconds(self):
+        if self.adaptive_chunk_size is not None:
+            return self.adaptive_chunk_size.flush_seconds
+        return CHUNK_MIN_WAIT
+
+    def _update_change_feed_lag(self):
+        # must be called from the thread reading the change feed
+        if self.adaptive_chunk_size is None or not self.adaptive_chunk_size.lag_due():
+            return
+        try:
+            lag = get_change_feed_lag(self.get_change_feed())
+        except Exception:
+            pillow_logging.exception("[%s] Error getting change feed lag", self.get_name())
+            return
+        self.adaptive_chunk_size.update_lag(lag)
+        datadog_gauge('commcare.change_feed.adaptive.lag', lag, tags=[
+            'pillow_name:{}'.format(self.get_name()),
+        ])
+
     @property
     @memoized
     def batch_processors(self):
@@ -139,8 +183,10 @@ class PillowBase(metaclass=ABCMeta):
             batch processors. If there are batch processors, checkpoint is updated
             at the end of the batch, otherwise is updated for every change.
         """
+        if self.prefetch_chunks and self.batch_processors:
+            return self._process_changes_pipelined(since, forever)
+
         context = PillowRuntimeContext(changes_seen=0)
-        min_wait_seconds = 30
 
         def process_offset_chunk(chunk, context):
             if not chunk:
@@ -160,8 +206,10 @@ class PillowBase(metaclass=ABCMeta):
                         # Queue and process in chunks for both batch
                         #   and serial processors
                         changes_chunk.append(change)
-                        chunk_full = len(changes_chunk) == self.processor_chunk_size
-                        time_elapsed = (datetime.utcnow() - last_process_time).seconds > min_wait_seconds
+                        chunk_full = len(changes_chunk) >= self.current_chunk_size
+                        time_elapsed = (
+                            (datetime.utcnow() - last_process_time).total_seconds() > self.current_flush_seconds
+                        )
                         if chunk_full or time_elapsed:
                             last_process_time = datetime.utcnow()
                             self._batch_process_with_error_handling(changes_chunk)
@@ -169,6 +217,7 @@ class PillowBase(metaclass=ABCMeta):
                             self._update_checkpoint(changes_chunk[-1], context)
                             # reset for next chunk
                             changes_chunk = []
+                            self._update_change_feed_lag()
                     else:
                         # process all changes one by one
                         processing_time = self.process_with_error_handling(change)
@@ -181,6 +230,55 @@ class PillowBase(metaclass=ABCMeta):
             process_offset_chunk(changes_chunk, context)
             self.process_changes(since=self.get_last_checkpoint_sequence(), forever=forever)
 
+    def _process_changes_pipelined(self, since, forever):
+        """
+        Process changes in chunks while the next chunk is read from the
+        change feed, deduplicated and has its documents fetched on a
+        background thread.
+
+            Chunks are processed and checkpointed in the order they are read.
+            A chunk's checkpoint is updated after the next chunk has been read
+            so that the change feed is never used by both threads at once, and
+            is updated to the feed offsets recorded at the end of that chunk.
+        """
+        context = PillowRuntimeContext(changes_seen=0)
+        tags = ["pillow_name:{}".format(self.get_name())]
+        changes = self.get_change_feed().iter_changes(since=since or None, forever=forever)
+        prefetcher = ChunkPrefetcher(self, changes)
+        try:
+            prefetcher.read_next()
+            chunk = prefetcher.get_chunk()
+            while chunk is not None:
+                context.changes_seen += chunk.changes_seen
+                if chunk.touch:
+                    self._update_checkpoint(None, None)
+                    prefetcher.read_next()
+                    chunk = prefetcher.get_chunk()
+                    continue
+
+                next_chunk = None
+                if not chunk.exhausted:
+                    prefetcher.read_next()
+                if chunk.changes:
+                    self._batch_process_with_error_handling(chunk.changes)
+                if not chunk.exhausted:
+                    datadog_gauge('commcare.change_feed.pipeline.queue_depth', prefetcher.ready_count, tags=tags)
+                    timer = TimingContext()
+                    with timer:
+                        next_chunk = prefetcher.get_chunk()
+                    datadog_histogram('commcare.change_feed.pipeline.stall_time', timer.duration, tags=tags)
+                if chunk.changes:
+                    # update checkpoint for just the latest change
+                    context.processed_offsets = chunk.offsets
+                    self._update_checkpoint(chunk.changes[-1], context)
+                chunk = next_chunk
+        except PillowtopCheckpointReset:
+            # discard changes read ahead and start again from the checkpoint
+            prefetcher.stop()
+            self.process_changes(since=self.get_last_checkpoint_sequence(), forever=forever)
+        finally:
+            prefetcher.stop()
+
     def _batch_process_with_error_handling(self, changes_chunk):
         """
         Process given chunk in batch mode first on batch-processors
@@ -192,45 +290,116 @@ class PillowBase(metaclass=ABCMeta):
 
             If there is an exception in chunked processing, falls back
             to serial processing.
-        """
-        processing_time = 0
-
-        def reprocess_serially(chunk, processor):
-            for change in chunk:
-                self.process_with_error_handling(change, processor)
 
-        for processor in self.batch_processors:
-            if not changes_chunk:
-                return set(), 0
+            If `concurrent_batch_processors` is set, batch processors that
+            support concurrent processing run on a thread pool while the
+            others run on this thread. The chunk is only done once all of
+            them have finished.
+        """
+        if not changes_chunk:
+            return set(), 0
 
-            changes_chunk = self._deduplicate_changes(changes_chunk)
+        changes_chunk = self._deduplicate_changes(changes_chunk)
+        if self.concurrent_batch_processors and len(self.batch_processors) > 1:
             timer = TimingContext()
             with timer:
-                try:
-                    retry_changes, change_exceptions = processor.process_changes_chunk(changes_chunk)
-                except Exception as ex:
-                    notify_exception(
-                        None,
-                        "{pillow_name} Error in processing changes chunk: {ex}".format(
-                            pillow_name=self.get_name(),
-                            ex=ex
-                        ),
-                        details={
-                            'change_ids': [c.id for c in changes_chunk]
-                        })
-                    self._record_batch_exception_in_datadog(processor)
-                    # fall back to processing one by one
-                    reprocess_serially(changes_chunk, processor)
-                else:
-                    # fall back to processing one by one for failed changes
-                    for change, exception in change_exceptions:
-                        handle_pillow_error(self, change, exception)
-                    reprocess_serially(retry_changes, processor)
-                processing_time += timer.duration
+                failed = self._batch_process_concurrently(changes_chunk)
+            processing_time = timer.duration
+        else:
+            processing_time = failed = 0
+            for processor in self.batch_processors:
+                duration, processor_failed = self._process_chunk_with_error_handling(changes_chunk, processor)
+                processing_time += duration
+                failed = max(failed, processor_failed)
         # process on serial_processors
         for change in changes_chunk:
             processing_time += self.process_with_error_handling(change)
         self._record_datadog_metrics(changes_chunk, processing_time)
+        if self.adaptive_chunk_size is not None:
+            decision = self.adaptive_chunk_size.record_chunk(len(changes_chunk), processing_time, failed)
+            self._record_adaptive_chunk_size_in_datadog(decision)
+
+    def _batch_process_concurrently(self, changes_chunk):
+        # fetch documents once for all processors rather than once per thread
+        self._prefetch_documents(changes_chunk)
+        futures = [
+            self._processor_executor.submit(self._process_chunk_with_error_handling, changes_chunk, processor)
+            for processor in self.batch_processors
+            if processor.supports_concurrent_processing
+        ]
+        failed = 0
+        try:
+            for processor in self.batch_processors:
+                if not processor.supports_concurrent_processing:
+                    _, processor_failed = self._process_chunk_with_error_handling(changes_chunk, processor)
+                    failed = max(failed, processor_failed)
+        finally:
+            wait(futures)
+        for future in futures:
+            _, processor_failed = future.result()
+            failed = max(failed, processor_failed)
+        return failed
+
+    @property
+    @memoized
+    def _processor_executor(self):
+        return ThreadPoolExecutor(
+            max_workers=len(self.batch_processors),
+            thread_name_prefix="{}-processor".format(self.get_name()),
+        )
+
+    def _process_chunk_with_error_handling(self, changes_chunk, processor):
+        """
+        Process given chunk on a batch processor, falling back to serial
+            processing for changes that failed.
+
+        :returns: tuple(<processing time in seconds>, <number of changes that failed in batch>)
+        """
+        def reprocess_serially(chunk, processor):
+            for change in chunk:
+                self.process_with_error_handling(change, processor)
+
+        timer = TimingContext()
+        with timer:
+            try:
+                retry_changes, change_exceptions = processor.process_changes_chunk(changes_chunk)
+            except Exception as ex:
+                notify_exception(
+                    None,
+                    "{pillow_name} Error in processing changes chunk: {ex}".format(
+                        pillow_name=self.get_name(),
+                        ex=ex
+                    ),
+                    details={
+                        'change_ids': [c.id for c in changes_chunk]
+                    })
+                self._record_batch_exception_in_datadog(processor)
+                # fall back to processing one by one
+                reprocess_serially(changes_chunk, processor)
+                failed = len(changes_chunk)
+            else:
+                # fall back to processing one by one for failed changes
+                for change, exception in change_exceptions:
+                    handle_pillow_error(self, change, exception)
+                reprocess_serially(retry_changes, processor)
+                failed = len(retry_changes) + len(change_exceptions)
+        return timer.duration, failed
+
+    def _prefetch_documents(self, changes):
+        """
+        Fetch documents for changes in bulk ahead of processing. Errors are
+            logged and leave the documents to be fetched by the processors.
+        """
+        changes = [
+            change for change in changes
+            if change.metadata is not None and not change.deleted and change.should_fetch_document()
+        ]
+        if not changes:
+            return
+        try:
+            bulk_fetch_changes_docs(changes)
+        except Exception:
+            pillow_logging.exception("[%s] Error prefetching documents", self.get_name())
 
     def process_with_error_handling(self, change, processor=None):
         # process given change on all serial processors or given processor.
@@ -316,11 +485,20 @@ class PillowBase(metaclass=ABCMeta):
         # processing_time per change
         datadog_histogram('commcare.change_feed.processing_time', processing_time / change_count, tags=tags)
 
-        if change_count == self.processor_chunk_size:
+        if change_count == self.current_chunk_size:
             # don't report offset chunks to ease up datadog calculations
             datadog_histogram('commcare.change_feed.chunked.processing_time_total', processing_time,
                               tags=tags + ["chunk_size:{}".format(str(change_count))])
 
+    def _record_adaptive_chunk_size_in_datadog(self, decision):
+        tags = ['pillow_name:{}'.format(self.get_name())]
+        datadog_counter('commcare.change_feed.adaptive.decision', tags=tags + [
+            'decision:{}'.format(decision),
+        ])
+        datadog_gauge('commcare.change_feed.adaptive.chunk_size', self.adaptive_chunk_size.chunk_size, tags=tags)
+        datadog_gauge('commcare.change_feed.adaptive.flush_seconds', self.adaptive_chunk_size.flush_seconds,
+                      tags=tags)
+
     def _record_checkpoint_in_datadog(self):
         datadog_counter('commcare.change_feed.change_feed.checkpoint', tags=[
             'pillow_name:{}'.format(self.get_name()),
@@ -392,6 +570,88 @@ class PillowBase(metaclass=ABCMeta):
         return unique
 
 
+PrefetchedChunk = namedtuple('PrefetchedChunk', 'changes offsets changes_seen touch exhausted')
+
+
+class ChunkPrefetcher(object):
+    """
+    Reads chunks of changes for a pillow on a background thread.
+
+        Each chunk is deduplicated and the documents of its changes are
+        fetched in bulk so that batch processors don't need to fetch them.
+        Only one chunk is read at a time, when requested with `read_next`.
+        Errors reading changes are raised by `get_chunk`. Errors fetching
+        documents are logged and the documents left for the processors.
+    """
+
+    def __init__(self, pillow, changes):
+        self.pillow = pillow
+        self.changes = changes
+        self._chunk = []
+        self._last_chunk_time = datetime.utcnow()
+        self._requests = Queue()
+        self._results = Queue()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="{}-prefetch".format(pillow.get_name()),
+            daemon=True,
+        )
+        self._thread.start()
+
+    @property
+    def ready_count(self):
+        return self._results.qsize()
+
+    def read_next(self):
+        self._requests.put(True)
+
+    def get_chunk(self):
+        chunk, error = self._results.get()
+        if error is not None:
+            raise error
+        return chunk
+
+    def stop(self):
+        # the thread may be blocked waiting for changes, so don't wait for it
+        self._requests.put(False)
+
+    def _run(self):
+        try:
+            while self._requests.get():
+                try:
+                    chunk = self._read_chunk()
+                except Exception as err:
+                    self._results.put((None, err))
+                    break
+                self._results.put((chunk, None))
+        finally:
+            connections.close_all()
+
+    def _read_chunk(self):
+        changes_seen = 0
+        for change in self.changes:
+            changes_seen += 1
+            if not change:
+                return PrefetchedChunk([], None, changes_seen, touch=True, exhausted=False)
+            self._chunk.append(change)
+            chunk_full = len(self._chunk) >= self.pillow.current_chunk_size
+            time_elapsed = (
+                (datetime.utcnow() - self._last_chunk_time).total_seconds() > self.pillow.current_flush_seconds
+            )
+            if chunk_full or time_elapsed:
+                return self._take_chunk(changes_seen, exhausted=False)
+        return self._take_chunk(changes_seen, exhausted=True)
+
+    def _take_chunk(self, changes_seen, exhausted):
+        chunk = self.pillow._deduplicate_changes(self._chunk)
+        self._chunk = []
+        self._last_chunk_time = datetime.utcnow()
+        offsets = self.pillow.get_change_feed().get_processed_offsets()
+        self.pillow._update_change_feed_lag()
+        self.pillow._prefetch_documents(chunk)
+        return PrefetchedChunk(chunk, offsets, changes_seen, touch=False, exhausted=exhausted)
+
+
 class ChangeEventHandler(metaclass=ABCMeta):
     """
     A change-event-handler object used in constructed pillows.
@@ -405,7 +665,7 @@ class ChangeEventHandler(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def get_new_seq(self, change):
+    def get_new_seq(self, change, context=None):
         """
         :return: appropriate sequence value to update the checkpoint to
         """
@@ -419,11 +679,15 @@ class ConstructedPillow(PillowBase):
     """
 
     def __init__(self, name, checkpoint, change_feed, processor,
-                 change_processed_event_handler=None, processor_chunk_size=0):
+                 change_processed_event_handler=None, processor_chunk_size=0, prefetch_chunks=False,
+                 concurrent_batch_processors=False, adaptive_chunk_size=None):
         self._name = name
         self._checkpoint = checkpoint
         self._change_feed = change_feed
         self.processor_chunk_size = processor_chunk_size
+        self.prefetch_chunks = prefetch_chunks
+        self.concurrent_batch_processors = concurrent_batch_processors
+        self.adaptive_chunk_size = adaptive_chunk_size
         if isinstance(processor, list):
             self.processors = processor
         else:
@@ -123,6 +123,8 @@ class BulkElasticProcessor(ElasticProcessor, BulkPillowProcessor):
     Writes to:
       - ES
     """
+    # only writes to its own index, so can run alongside other processors
+    supports_concurrent_processing = True
 
     def process_changes_chunk(self, changes_chunk):
         with self._datadog_timing('bulk_extract'):
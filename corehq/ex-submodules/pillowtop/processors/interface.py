@@ -3,6 +3,9 @@ from abc import ABCMeta, abstractmethod
 
 class PillowProcessor(metaclass=ABCMeta):
     supports_batch_processing = False
+    # set to True if the processor does not depend on the work of other
+    # processors in the pillow and is safe to run on a separate thread
+    supports_concurrent_processing = False
 
     @abstractmethod
     def process_change(self, change):
@@ -0,0 +1,116 @@
+from django.test import SimpleTestCase
+from mock import MagicMock
+
+from pillowtop.pillow.chunking import (
+    GROW,
+    HOLD,
+    SHRINK_ERRORS,
+    SHRINK_QUIET,
+    SHRINK_SLOW,
+    AdaptiveChunkSize,
+    get_change_feed_lag,
+)
+from pillowtop.pillow.interface import ConstructedPillow
+from pillowtop.tests.test_pipelined_processing import (
+    ListChangeFeed,
+    RecordingEventHandler,
+    RecordingProcessor,
+    _change,
+)
+
+
+class AdaptiveChunkSizeTest(SimpleTestCase):
+
+    def get_controller(self, chunk_size=10, lag=None):
+        controller = AdaptiveChunkSize(
+            chunk_size, min_chunk_size=2, max_chunk_size=40,
+            min_flush_seconds=1, max_flush_seconds=30, target_seconds=5, max_error_rate=0.2,
+        )
+        if lag is not None:
+            controller.update_lag(lag)
+        return controller
+
+    def test_hold_until_lag_known(self):
+        controller = self.get_controller()
+        self.assertEqual(controller.record_chunk(10, 1, 0), HOLD)
+        self.assertEqual(controller.chunk_size, 10)
+        self.assertEqual(controller.flush_seconds, 30)
+
+    def test_grow_with_backlog(self):
+        controller = self.get_controller(lag=1000)
+        self.assertEqual(controller.record_chunk(10, 1, 0), GROW)
+        self.assertEqual(controller.chunk_size, 20)
+        self.assertEqual(controller.record_chunk(20, 1, 0), GROW)
+        self.assertEqual(controller.record_chunk(40, 1, 0), GROW)
+        self.assertEqual(controller.chunk_size, 40)
+        self.assertEqual(controller.flush_seconds, 30)
+        # lag is estimated from changes processed since it was measured
+        self.assertEqual(controller.lag, 930)
+
+    def test_shrink_when_quiet(self):
+        controller = self.get_controller(chunk_size=40, lag=12)
+        self.assertEqual(controller.record_chunk(3, 0.1, 0), SHRINK_QUIET)
+        self.assertEqual(controller.chunk_size, 20)
+        self.assertEqual(controller.flush_seconds, 1)
+        # not below the lag
+        controller.update_lag(15)
+        controller.record_chunk(3, 0.1, 0)
+        self.assertEqual(controller.chunk_size, 12)
+        controller.update_lag(0)
+        controller.record_chunk(3, 0.1, 0)
+        controller.record_chunk(3, 0.1, 0)
+        controller.record_chunk(3, 0.1, 0)
+        self.assertEqual(controller.chunk_size, 2)
+
+    def test_shrink_when_slow(self):
+        controller = self.get_controller(chunk_size=40, lag=1000)
+        self.assertEqual(controller.record_chunk(40, 20, 0), SHRINK_SLOW)
+        self.assertEqual(controller.chunk_size, 10)
+
+    def test_shrink_on_errors(self):
+        controller = self.get_controller(chunk_size=40, lag=1000)
+        self.assertEqual(controller.record_chunk(40, 1, 10), SHRINK_ERRORS)
+        self.assertEqual(controller.chunk_size, 20)
+        self.assertEqual(controller.record_chunk(20, 1, 4), GROW)
+
+    def test_lag_due(self):
+        controller = self.get_controller()
+        self.assertTrue(controller.lag_due())
+        controller.update_lag(5)
+        self.assertFalse(controller.lag_due())
+
+    def test_get_change_feed_lag(self):
+        feed = MagicMock()
+        feed.get_latest_offsets.return_value = {('case', 0): 100, ('case', 1): 50, ('case', 2): 10}
+        feed.get_processed_offsets.return_value = {('case', 0): 89, ('case', 1): 49, ('case', 2): None}
+        self.assertEqual(get_change_feed_lag(feed), 10)
+
+
+class AdaptivePillowTest(SimpleTestCase):
+
+    def _process(self, prefetch_chunks):
+        processor = RecordingProcessor()
+        pillow = ConstructedPillow(
+            'test-adaptive-pillow',
+            MagicMock(),
+            ListChangeFeed([_change(str(i), i) for i in range(30)]),
+            processor,
+            change_processed_event_handler=RecordingEventHandler(),
+            processor_chunk_size=2,
+            prefetch_chunks=prefetch_chunks,
+            adaptive_chunk_size=AdaptiveChunkSize(2, min_chunk_size=1, max_chunk_size=8),
+        )
+        pillow._record_datadog_metrics = MagicMock()
+        pillow.process_changes(since=0, forever=False)
+        return [len(chunk) for chunk in processor.chunks]
+
+    def test_chunk_size_follows_lag(self):
+        # lag is unknown until after the first chunk
+        self.assertEqual(self._process(prefetch_chunks=False), [2, 2, 4, 8, 8, 6])
+
+    def test_chunk_size_follows_lag_prefetched(self):
+        # the next chunk is read while the current one is processed so
+        # sizes trail the controller's decisions by up to one chunk
+        sizes = self._process(prefetch_chunks=True)
+        self.assertEqual(sum(sizes), 30)
+        self.assertEqual(max(sizes), 8)
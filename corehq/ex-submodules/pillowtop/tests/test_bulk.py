@@ -1,3 +1,4 @@
+import threading
 import uuid
 
 from django.test import SimpleTestCase, TestCase
@@ -7,6 +8,7 @@ from six.moves import range
 
 from casexml.apps.case.signals import case_post_save
 from corehq.util.es.interface import ElasticsearchInterface
+from pillowtop.dao.mock import MockDocumentStore
 from pillowtop.es_utils import initialize_index_and_mapping
 from pillowtop.feed.interface import Change, ChangeMeta
 from pillowtop.pillow.interface import PillowBase
@@ -52,6 +54,87 @@ class BulkTest(SimpleTestCase):
         self.assertEqual([(1, 'e1'), (2, 'e2')], errors)
 
 
+class ShardedDocumentStore(MockDocumentStore):
+
+    def __init__(self, data, databases):
+        super().__init__(data)
+        self.databases = databases
+        self.queries = []
+
+    def get_ids_by_database(self, ids):
+        ids_by_database = {}
+        for doc_id in ids:
+            ids_by_database.setdefault(self.databases[doc_id], []).append(doc_id)
+        return ids_by_database
+
+    def iter_documents(self, ids):
+        raise AssertionError('documents should be fetched by database')
+
+    def iter_documents_from_database(self, database, ids):
+        self.queries.append((database, ids, threading.current_thread().name))
+        for doc_id in ids:
+            if doc_id in self._data_store:
+                yield self._data_store[doc_id]
+
+
+class BulkFetchShardedTest(SimpleTestCase):
+
+    def _connections(self, atomic=()):
+        return {
+            db_name: Mock(in_atomic_block=db_name in atomic)
+            for db_name in ['p1', 'p2', 'p3']
+        }
+
+    def _changes(self, store, doc_ids):
+        return [
+            Change(doc_id, i, document_store=store, metadata=ChangeMeta(
+                document_id=doc_id, data_source_type='sql', data_source_name='case-sql'
+            ))
+            for i, doc_id in enumerate(doc_ids)
+        ]
+
+    @patch('pillowtop.utils.datadog_histogram')
+    def test_fetch_by_database(self, datadog_histogram):
+        store = ShardedDocumentStore(
+            {doc_id: {'_id': doc_id} for doc_id in 'abcd'},
+            {'a': 'p1', 'b': 'p2', 'c': 'p1', 'd': 'p3', 'missing': 'p3'},
+        )
+        changes = self._changes(store, ['a', 'b', 'c', 'd', 'missing'])
+        with patch('corehq.sql_db.util.connections', self._connections()):
+            bad_changes, docs = bulk_fetch_changes_docs(changes)
+        self.assertEqual([change.id for change in bad_changes], ['missing'])
+        self.assertEqual(sorted(doc['_id'] for doc in docs), ['a', 'b', 'c', 'd'])
+        self.assertEqual(changes[0].get_document(), {'_id': 'a'})
+        self.assertEqual(
+            sorted((database, ids) for database, ids, _ in store.queries),
+            [('p1', ['a', 'c']), ('p2', ['b']), ('p3', ['d', 'missing'])]
+        )
+        self.assertNotIn(threading.current_thread().name, {thread for _, _, thread in store.queries})
+        self.assertEqual(
+            sorted(call[1]['tags'][1] for call in datadog_histogram.call_args_list),
+            ['database:p1', 'database:p2', 'database:p3']
+        )
+
+    @patch('pillowtop.utils.datadog_histogram')
+    def test_single_database_in_thread(self, datadog_histogram):
+        store = ShardedDocumentStore({'a': {'_id': 'a'}}, {'a': 'p1'})
+        with patch('corehq.sql_db.util.connections', self._connections()):
+            bad_changes, docs = bulk_fetch_changes_docs(self._changes(store, ['a']))
+        self.assertEqual(docs, [{'_id': 'a'}])
+        self.assertEqual(store.queries, [('p1', ['a'], threading.current_thread().name)])
+
+    @patch('pillowtop.utils.datadog_histogram')
+    def test_database_in_transaction_read_in_calling_thread(self, datadog_histogram):
+        store = ShardedDocumentStore({'a': {'_id': 'a'}, 'b': {'_id': 'b'}}, {'a': 'p1', 'b': 'p2'})
+        # p2 has a transaction open so it must be read from the calling thread to see its changes
+        with patch('corehq.sql_db.util.connections', self._connections(atomic=['p2'])):
+            bad_changes, docs = bulk_fetch_changes_docs(self._changes(store, ['a', 'b']))
+        self.assertEqual(sorted(doc['_id'] for doc in docs), ['a', 'b'])
+        threads = {database: thread for database, _, thread in store.queries}
+        self.assertNotEqual(threads['p1'], threading.current_thread().name)
+        self.assertEqual(threads['p2'], threading.current_thread().name)
+
+
 @use_sql_backend
 class TestBulkDocOperations(TestCase):
     @classmethod
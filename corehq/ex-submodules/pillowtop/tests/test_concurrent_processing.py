@@ -0,0 +1,94 @@
+import threading
+
+from django.test import SimpleTestCase
+from mock import MagicMock
+
+from pillowtop.dao.mock import MockDocumentStore
+from pillowtop.pillow.interface import ConstructedPillow
+from pillowtop.tests.test_pipelined_processing import (
+    ListChangeFeed,
+    RecordingEventHandler,
+    RecordingProcessor,
+    _change,
+)
+
+
+class ThreadRecordingProcessor(RecordingProcessor):
+    supports_concurrent_processing = True
+
+    def __init__(self, wait_for=None, done=None, **kwargs):
+        super().__init__(**kwargs)
+        self.wait_for = wait_for
+        self.done = done or threading.Event()
+        self.threads = set()
+
+    def process_changes_chunk(self, changes_chunk):
+        self.threads.add(threading.current_thread().name)
+        if self.wait_for is not None:
+            assert self.wait_for.wait(5), 'processors did not run concurrently'
+        result = super().process_changes_chunk(changes_chunk)
+        self.done.set()
+        return result
+
+
+class ConcurrentProcessingTest(SimpleTestCase):
+
+    def _get_pillow(self, processors, changes, handler=None):
+        checkpoint = MagicMock()
+        checkpoint.get_or_create_wrapped.return_value.wrapped_sequence = 0
+        pillow = ConstructedPillow(
+            'test-concurrent-pillow',
+            checkpoint,
+            ListChangeFeed(changes),
+            processors,
+            change_processed_event_handler=handler or RecordingEventHandler(),
+            processor_chunk_size=2,
+            concurrent_batch_processors=True,
+        )
+        pillow._record_datadog_metrics = MagicMock()
+        pillow._record_batch_exception_in_datadog = MagicMock()
+        pillow._record_change_success_in_datadog = MagicMock()
+        return pillow
+
+    def test_processors_run_concurrently(self):
+        first = ThreadRecordingProcessor()
+        # blocks until the first processor has finished
+        second = ThreadRecordingProcessor(wait_for=first.done)
+        dependent = RecordingProcessor()
+        changes = [_change(str(i), i) for i in range(3)]
+        self._get_pillow([second, first, dependent], changes).process_changes(since=0, forever=False)
+        for processor in [first, second, dependent]:
+            self.assertEqual(processor.chunks, [['0', '1'], ['2']])
+        self.assertNotIn(threading.current_thread().name, first.threads | second.threads)
+
+    def test_checkpoint_after_all_processors(self):
+        processors = [ThreadRecordingProcessor(), ThreadRecordingProcessor()]
+
+        class Handler(RecordingEventHandler):
+            def update_checkpoint(self, change, context):
+                for processor in processors:
+                    assert processor.chunks[-1][-1] == change.id
+                return super().update_checkpoint(change, context)
+
+        handler = Handler()
+        changes = [_change(str(i), i) for i in range(4)]
+        self._get_pillow(processors, changes, handler).process_changes(since=0, forever=False)
+        self.assertEqual([change_id for change_id, _ in handler.checkpoints], ['1', '3'])
+
+    def test_serial_fallback_per_processor(self):
+        failing = ThreadRecordingProcessor(fail_chunks=True)
+        working = ThreadRecordingProcessor()
+        changes = [_change(str(i), i) for i in range(2)]
+        self._get_pillow([failing, working], changes).process_changes(since=0, forever=False)
+        self.assertEqual(failing.serial, ['0', '1'])
+        self.assertEqual(working.serial, [])
+        self.assertEqual(working.chunks, [['0', '1']])
+
+    def test_processors_share_documents(self):
+        store = MockDocumentStore({'a': {'_id': 'a'}})
+        store.iter_documents = MagicMock(wraps=store.iter_documents)
+        processors = [ThreadRecordingProcessor(), ThreadRecordingProcessor()]
+        self._get_pillow(processors, [_change('a', 0, store)]).process_changes(since=0, forever=False)
+        store.iter_documents.assert_called_once_with(['a'])
+        for processor in processors:
+            self.assertEqual(processor.documents, {'a': {'_id': 'a'}})
@@ -0,0 +1,164 @@
+from django.test import SimpleTestCase
+from mock import MagicMock
+
+from pillowtop.dao.mock import MockDocumentStore
+from pillowtop.exceptions import PillowtopCheckpointReset
+from pillowtop.feed.interface import Change, ChangeFeed, ChangeMeta
+from pillowtop.pillow.interface import ChangeEventHandler, ConstructedPillow
+from pillowtop.processors.interface import BulkPillowProcessor
+
+
+class ListChangeFeed(ChangeFeed):
+
+    def __init__(self, changes):
+        self.changes = changes
+        self.processed = None
+        self.iterations = []
+
+    def iter_changes(self, since, forever=False):
+        since = since or 0
+        self.iterations.append(since)
+        for index, change in enumerate(self.changes[since:], start=since):
+            self.processed = index
+            yield change
+
+    def get_latest_offsets(self):
+        return {'test': len(self.changes)}
+
+    def get_latest_offsets_as_checkpoint_value(self):
+        return len(self.changes)
+
+    def get_processed_offsets(self):
+        return {'test': self.processed}
+
+
+class RecordingProcessor(BulkPillowProcessor):
+
+    def __init__(self, fail_chunks=False):
+        self.fail_chunks = fail_chunks
+        self.chunks = []
+        self.serial = []
+        self.documents = {}
+
+    def process_change(self, change):
+        self.serial.append(change.id)
+
+    def process_changes_chunk(self, changes_chunk):
+        if self.fail_chunks:
+            raise Exception('chunk failed')
+        self.chunks.append([change.id for change in changes_chunk])
+        self.documents.update((change.id, change.document) for change in changes_chunk)
+        return [], []
+
+
+class RecordingEventHandler(ChangeEventHandler):
+
+    def __init__(self, reset_on=()):
+        self.reset_on = set(reset_on)
+        self.checkpoints = []
+
+    def update_checkpoint(self, change, context):
+        if change.id in self.reset_on:
+            self.reset_on.remove(change.id)
+            raise PillowtopCheckpointReset()
+        self.checkpoints.append((change.id, self.get_new_seq(change, context)))
+        return False
+
+    def get_new_seq(self, change, context=None):
+        return context.processed_offsets
+
+
+def _change(doc_id, seq, document_store=None):
+    return Change(
+        doc_id,
+        seq,
+        document_store=document_store,
+        metadata=ChangeMeta(
+            document_id=doc_id,
+            data_source_type='couch',
+            data_source_name='test_commcarehq',
+        ),
+    )
+
+
+class PipelinedProcessingTest(SimpleTestCase):
+
+    def _get_pillow(self, feed, processor, handler=None):
+        checkpoint = MagicMock()
+        checkpoint.get_or_create_wrapped.return_value.wrapped_sequence = 0
+        pillow = ConstructedPillow(
+            'test-pipelined-pillow',
+            checkpoint,
+            feed,
+            processor,
+            change_processed_event_handler=handler or RecordingEventHandler(),
+            processor_chunk_size=2,
+            prefetch_chunks=True,
+        )
+        pillow._record_datadog_metrics = MagicMock()
+        return pillow
+
+    def test_process_in_order(self):
+        feed = ListChangeFeed([_change(str(i), i) for i in range(5)])
+        processor = RecordingProcessor()
+        handler = RecordingEventHandler()
+        self._get_pillow(feed, processor, handler).process_changes(since=0, forever=False)
+        self.assertEqual(processor.chunks, [['0', '1'], ['2', '3'], ['4']])
+        # checkpoints use the feed offsets at the end of each chunk
+        self.assertEqual(handler.checkpoints, [
+            ('1', {'test': 1}),
+            ('3', {'test': 3}),
+            ('4', {'test': 4}),
+        ])
+
+    def test_deduplicate_chunk(self):
+        feed = ListChangeFeed([_change('a', 0), _change('a', 1), _change('b', 2), _change('c', 3)])
+        processor = RecordingProcessor()
+        self._get_pillow(feed, processor).process_changes(since=0, forever=False)
+        self.assertEqual(processor.chunks, [['a'], ['b', 'c']])
+
+    def test_prefetch_documents(self):
+        store = MockDocumentStore({
+            'a': {'_id': 'a', 'name': 'A'},
+            'b': {'_id': 'b', 'name': 'B'},
+        })
+        feed = ListChangeFeed([_change('a', 0, store), _change('b', 1, store)])
+        processor = RecordingProcessor()
+        self._get_pillow(feed, processor).process_changes(since=0, forever=False)
+        self.assertEqual(processor.documents, {
+            'a': {'_id': 'a', 'name': 'A'},
+            'b': {'_id': 'b', 'name': 'B'},
+        })
+
+    def test_serial_fallback(self):
+        feed = ListChangeFeed([_change(str(i), i) for i in range(3)])
+        processor = RecordingProcessor(fail_chunks=True)
+        pillow = self._get_pillow(feed, processor)
+        pillow._record_batch_exception_in_datadog = MagicMock()
+        pillow._record_change_success_in_datadog = MagicMock()
+        pillow.process_changes(since=0, forever=False)
+        self.assertEqual(processor.serial, ['0', '1', '2'])
+
+    def test_checkpoint_reset(self):
+        feed = ListChangeFeed([_change(str(i), i) for i in range(4)])
+        processor = RecordingProcessor()
+        handler = RecordingEventHandler(reset_on={'1'})
+        pillow = self._get_pillow(feed, processor, handler)
+        pillow.process_changes(since=0, forever=False)
+        # start again from the last checkpoint (0) without processing
+        # the chunk that was read ahead
+        self.assertEqual(feed.iterations, [0, 0])
+        self.assertEqual(processor.chunks, [['0', '1'], ['0', '1'], ['2', '3']])
+        self.assertEqual([change_id for change_id, _ in handler.checkpoints], ['1', '3'])
+
+    def test_feed_error(self):
+        class BrokenFeed(ListChangeFeed):
+            def iter_changes(self, since, forever=False):
+                yield _change('a', 0)
+                yield _change('b', 1)
+                raise ValueError('feed error')
+
+        processor = RecordingProcessor()
+        with self.assertRaises(ValueError):
+            self._get_pillow(BrokenFeed([]), processor).process_changes(since=0, forever=False)
+        self.assertEqual(processor.chunks, [['a', 'b']])
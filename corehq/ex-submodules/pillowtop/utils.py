@@ -1,4 +1,5 @@
 import json
+import time
 from collections import defaultdict, namedtuple
 from copy import deepcopy
 from datetime import datetime
@@ -16,6 +17,8 @@ from pillowtop.exceptions import PillowNotFoundError
 from pillowtop.logger import pillow_logging
 
 from corehq.apps.change_feed.connection import get_kafka_consumer
+from corehq.sql_db.util import query_databases_concurrently
+from corehq.util.datadog.gauges import datadog_histogram
 
 
 def _get_pillow_instance(full_class_str):
@@ -320,10 +323,10 @@ def bulk_fetch_changes_docs(changes, domain=None):
 
     # query
     docs = []
-    for _, _changes in changes_by_doctype.items():
+    for data_source_name, _changes in changes_by_doctype.items():
         doc_store = _changes[0].document_store
         doc_ids_to_query = [change.id for change in _changes if change.should_fetch_document()]
-        new_docs = list(doc_store.iter_documents(doc_ids_to_query))
+        new_docs = _fetch_documents(doc_store, doc_ids_to_query, data_source_name)
         docs_queried_prior = [change.document for change in _changes if change.document]
         docs.extend(new_docs + docs_queried_prior)
 
@@ -346,6 +349,30 @@ def bulk_fetch_changes_docs(changes, domain=None):
     return bad_changes, docs
 
 
+def _fetch_documents(doc_store, doc_ids, data_source_name):
+    """Fetch documents from a document store, querying the databases of
+    sharded stores concurrently.
+    """
+    ids_by_database = doc_store.get_ids_by_database(doc_ids) if doc_ids else None
+    if not ids_by_database:
+        return list(doc_store.iter_documents(doc_ids))
+
+    tags = ['data_source:{}'.format(data_source_name)]
+
+    def fetch_documents(database, ids):
+        start = time.perf_counter()
+        docs = list(doc_store.iter_documents_from_database(database, ids))
+        datadog_histogram(
+            'commcare.change_feed.bulk_fetch.database_time',
+            time.perf_counter() - start,
+            tags=tags + ['database:{}'.format(database)],
+        )
+        return docs
+
+    results = query_databases_concurrently(fetch_documents, ids_by_database)
+    return [doc for docs in results for doc in docs]
+
+
 def get_errors_with_ids(es_action_errors):
     return [
         (item['_id'], item.get('error'))
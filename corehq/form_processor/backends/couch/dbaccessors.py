@@ -203,6 +203,10 @@ class CaseAccessorCouch(AbstractCaseAccessor):
     def get_case_xform_ids(case_id):
         return get_case_xform_ids(case_id)
 
+    @staticmethod
+    def get_case_xform_ids_by_case_id(case_ids):
+        return {case_id: get_case_xform_ids(case_id) for case_id in case_ids}
+
     @staticmethod
     def get_case_ids_in_domain(domain, type=None):
         return get_case_ids_in_domain(domain, type=type)
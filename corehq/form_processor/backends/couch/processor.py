@@ -106,7 +106,7 @@ class FormProcessorCouch(object):
         return (existing_form, new_form)
 
     @classmethod
-    def save_processed_models(cls, processed_forms, cases=None, stock_result=None):
+    def save_processed_models(cls, processed_forms, cases=None, stock_result=None, publish_changes=True):
         docs = list(processed_forms)
         for form in docs:
             if form:
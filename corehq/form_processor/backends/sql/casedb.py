@@ -13,6 +13,9 @@ class CaseDbCacheSQL(AbstractCaseDbCache):
         super(CaseDbCacheSQL, self).__init__(*args, **kw)
         if not self.wrap:
             raise ValueError('CaseDbCacheSQL does not support unwrapped models')
+        # ``server_modified_on`` of cases saved in a transaction that has not
+        # been committed, which ``get_last_modified_dates`` can't see yet
+        self.uncommitted_modified_on = {}
 
     def _validate_case(self, case):
         if self.domain and case.domain != self.domain:
@@ -27,8 +30,12 @@ class CaseDbCacheSQL(AbstractCaseDbCache):
     def get_cases_for_saving(self, now):
         cases = self.get_changed()
 
-        saved_case_ids = [case.case_id for case in cases if case.is_saved()]
-        cases_modified_on = CaseAccessorSQL.get_last_modified_dates(self.domain, saved_case_ids)
+        saved_case_ids = [
+            case.case_id for case in cases
+            if case.is_saved() and case.case_id not in self.uncommitted_modified_on
+        ]
+        cases_modified_on = dict(self.uncommitted_modified_on)
+        cases_modified_on.update(CaseAccessorSQL.get_last_modified_dates(self.domain, saved_case_ids))
         for case in cases:
             if case.is_saved():
                 modified_on = cases_modified_on.get(case.case_id, None)
@@ -4,17 +4,19 @@ import logging
 import operator
 import struct
 from abc import ABCMeta, abstractmethod, abstractproperty
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
 from datetime import datetime
 from io import BytesIO
 from itertools import groupby
 from uuid import UUID
 
 from django.conf import settings
+from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.fields.jsonb import KeyTransform
 from django.db import InternalError, transaction, router, DatabaseError
 from django.db.models import F, Q
 from django.db.models.expressions import Value
-from django.db.models.functions import Concat, Greatest
+from django.db.models.functions import Cast, Concat, Greatest
 
 import csiphash
 from ddtrace import tracer
@@ -58,9 +60,13 @@ from corehq.form_processor.utils.sql import (
     fetchone_as_namedtuple,
 )
 from corehq.sql_db.config import plproxy_config
+from corehq.sql_db.routers import allow_read_from_plproxy_standby
 from corehq.sql_db.util import (
     estimate_row_count,
     get_db_aliases_for_partitioned_query,
+    bulk_update,
+    query_databases_concurrently,
+    select_plproxy_db_for_read,
     split_list_by_db_partition,
 )
 from corehq.util.datadog.utils import form_load_counter
@@ -77,6 +83,73 @@ doc_type_to_state = {
 
 state_to_doc_type = {v: k for k, v in doc_type_to_state.items()}
 
+CASE_ROW_FIELDS = (
+    'case_id', 'domain', 'type', 'name', 'owner_id', 'opened_on', 'opened_by', 'modified_on',
+    'server_modified_on', 'modified_by', 'closed', 'closed_on', 'closed_by', 'deleted',
+    'external_id', 'location_id',
+)
+
+
+class CaseRow(namedtuple('CaseRow', CASE_ROW_FIELDS + ('properties',))):
+    """Case columns and some of its dynamic properties as returned by
+    ``CaseAccessorSQL.get_cases(case_ids, properties=[...])``
+
+    ``properties`` is a dict of the requested properties that the case
+    has. The rest of ``case_json`` is not read from the database.
+    """
+    __slots__ = ()
+
+    def get_case_property(self, property):
+        if property in self.properties:
+            return self.properties[property]
+        if property in CASE_ROW_FIELDS:
+            return getattr(self, property)
+
+    def dynamic_case_properties(self):
+        return OrderedDict(sorted(self.properties.items()))
+
+
+def use_direct_shard_reads():
+    return settings.USE_PARTITIONED_DATABASE and settings.USE_DIRECT_SHARD_READS
+
+
+def _get_docs_from_shards(get_docs, doc_ids):
+    """Bucket ``doc_ids`` by shard and call ``get_docs(db_name, shard_doc_ids)``
+    on each shard concurrently
+
+    :return: list of docs from all shards
+    """
+    results = _query_shards_concurrently(get_docs, ShardAccessor.get_docs_by_database(doc_ids))
+    return list(itertools.chain.from_iterable(results))
+
+
+def get_doc_ids_by_read_database(doc_ids):
+    """Bucket ``doc_ids`` by the database to read them from with
+    ``query_databases_concurrently``
+
+    :return: dict of ``db_name -> doc_ids``
+    """
+    return _get_args_by_read_database(ShardAccessor.get_docs_by_database(doc_ids))
+
+
+def _query_shards_concurrently(query, args_by_db):
+    """``query_databases_concurrently`` for queries that read shards with
+    ``.using(db_name)``
+    """
+    return query_databases_concurrently(query, _get_args_by_read_database(args_by_db))
+
+
+def _get_args_by_read_database(args_by_db):
+    """Queries that read shards with ``.using(db_name)`` bypass the router
+    so each shard is swapped for one of its standbys here when reading from
+    standbys is allowed. The worker threads of ``query_databases_concurrently``
+    don't see the thread local ``read_from_plproxy_standbys`` flag so this
+    must be done in the calling thread.
+    """
+    if allow_read_from_plproxy_standby():
+        return {select_plproxy_db_for_read(db_name): args for db_name, args in args_by_db.items()}
+    return args_by_db
+
 
 def iter_all_rows(reindex_accessor):
     """Returns a generator that will iterate over all rows provided by the
@@ -391,12 +464,20 @@ class FormAccessorSQL(AbstractFormAccessor):
         assert isinstance(form_ids, list)
         if not form_ids:
             return []
-        forms = list(XFormInstanceSQL.objects.plproxy_raw('SELECT * from get_forms_by_id(%s)', [form_ids]))
+        if use_direct_shard_reads():
+            forms = _get_docs_from_shards(FormAccessorSQL.get_forms_from_database, form_ids)
+        else:
+            forms = list(XFormInstanceSQL.objects.plproxy_raw('SELECT * from get_forms_by_id(%s)', [form_ids]))
         if ordered:
             _sort_with_id_list(forms, form_ids, 'form_id')
 
         return forms
 
+    @staticmethod
+    def get_forms_from_database(db_name, form_ids):
+        """Get forms from a single shard. All ``form_ids`` must be stored in ``db_name``"""
+        return list(XFormInstanceSQL.objects.using(db_name).filter(form_id__in=form_ids))
+
     @staticmethod
     def get_attachments(form_id):
         return get_blob_db().metadb.get_for_parent(form_id)
@@ -774,19 +855,31 @@ class CaseAccessorSQL(AbstractCaseAccessor):
             raise CaseNotFound
 
     @staticmethod
-    def get_cases(case_ids, ordered=False, prefetched_indices=None):
+    def get_cases(case_ids, ordered=False, prefetched_indices=None, properties=None):
         """
         :param case_ids: List of case IDs to fetch
         :param ordered: Return cases in the same order as ``case_ids``
         :param prefetched_indices: If not None this must be a dict containing ALL the indices for ALL the
                                     cases being fetched. If the list does not contain indices for a case
                                     then an empty list will be attached to the case preventing further DB lookup.
+        :param properties: If not None only these dynamic case properties are read and ``CaseRow``
+                           objects are returned instead of cases. Use this when only a few properties
+                           are needed to avoid transferring and deserializing the whole of ``case_json``.
         :return: List of cases
         """
         assert isinstance(case_ids, list)
         if not case_ids:
             return []
-        cases = list(CommCareCaseSQL.objects.plproxy_raw('SELECT * from get_cases_by_id(%s)', [case_ids]))
+        if properties is not None:
+            assert prefetched_indices is None, "case rows don't have indices"
+            rows = CaseAccessorSQL._get_case_rows(case_ids, list(properties))
+            if ordered:
+                _sort_with_id_list(rows, case_ids, 'case_id')
+            return rows
+        if use_direct_shard_reads():
+            cases = _get_docs_from_shards(CaseAccessorSQL.get_cases_from_database, case_ids)
+        else:
+            cases = list(CommCareCaseSQL.objects.plproxy_raw('SELECT * from get_cases_by_id(%s)', [case_ids]))
 
         if ordered:
             _sort_with_id_list(cases, case_ids, 'case_id')
@@ -798,6 +891,46 @@ class CaseAccessorSQL(AbstractCaseAccessor):
 
         return cases
 
+    @staticmethod
+    def get_cases_from_database(db_name, case_ids):
+        """Get cases from a single shard. All ``case_ids`` must be stored in ``db_name``"""
+        return list(CommCareCaseSQL.objects.using(db_name).filter(case_id__in=case_ids))
+
+    @staticmethod
+    def _get_case_rows(case_ids, properties):
+        def get_rows(db_name, db_case_ids):
+            return [
+                CaseRow(*values[:len(CASE_ROW_FIELDS)], properties={
+                    prop: value
+                    for prop, value in zip(properties, values[len(CASE_ROW_FIELDS):])
+                    if value is not None
+                })
+                for values in CaseAccessorSQL.get_case_rows_queryset(db_name, db_case_ids, properties)
+            ]
+
+        args_by_db = dict(split_list_by_db_partition(case_ids))
+        return list(itertools.chain.from_iterable(_query_shards_concurrently(get_rows, args_by_db)))
+
+    @staticmethod
+    def get_case_rows_queryset(db_name, case_ids, properties):
+        """Query for ``CASE_ROW_FIELDS`` followed by ``properties`` of the
+        cases, extracted from ``case_json`` by Postgres
+
+        ``case_json`` is stored as text so it is cast to jsonb to use the
+        ``->`` operator. Postgres returns the values as JSON.
+        """
+        aliases = ['_property_{}'.format(i) for i in range(len(properties))]
+        case_json = Cast('case_json', JSONField())
+        return (
+            CommCareCaseSQL.objects.using(db_name)
+            .filter(case_id__in=case_ids)
+            .annotate(**{
+                alias: KeyTransform(prop, case_json)
+                for alias, prop in zip(aliases, properties)
+            })
+            .values_list(*(CASE_ROW_FIELDS + tuple(aliases)))
+        )
+
     @staticmethod
     def case_exists(case_id):
         return CommCareCaseSQL.objects.partitioned_query(case_id).filter(case_id=case_id).exists()
@@ -812,6 +945,29 @@ class CaseAccessorSQL(AbstractCaseAccessor):
             results = fetchall_as_namedtuple(cursor)
             return [result.form_id for result in results]
 
+    @staticmethod
+    def get_case_xform_ids_by_case_id(case_ids):
+        """Like ``get_case_xform_ids`` for many cases with one query per shard
+
+        :return: dict of case id -> list of form ids
+        """
+        def get_form_ids(db_name, db_case_ids):
+            return list(
+                CaseTransaction.objects.using(db_name)
+                .filter(case_id__in=db_case_ids, revoked=False)
+                .annotate(form_type=F('type').bitand(CaseTransaction.TYPE_FORM))
+                .filter(form_type=CaseTransaction.TYPE_FORM)
+                .order_by('server_date')
+                .values_list('case_id', 'form_id')
+            )
+
+        form_ids_by_case_id = {case_id: [] for case_id in case_ids}
+        args_by_db = dict(split_list_by_db_partition(form_ids_by_case_id))
+        results = _query_shards_concurrently(get_form_ids, args_by_db)
+        for case_id, form_id in itertools.chain.from_iterable(results):
+            form_ids_by_case_id[case_id].append(form_id)
+        return form_ids_by_case_id
+
     @staticmethod
     def get_indices(domain, case_id):
         query = CommCareCaseIndexSQL.objects.partitioned_query(case_id)
@@ -1028,6 +1184,81 @@ class CaseAccessorSQL(AbstractCaseAccessor):
         except DatabaseError as e:
             raise CaseSaveError(e)
 
+    @staticmethod
+    def save_cases(cases):
+        """Save cases and their tracked models like ``save_case`` but with a
+        few multi-row statements per database
+
+        Models are grouped by database and table. New rows are inserted
+        with ``bulk_create``, changed rows are updated with one multi-row
+        UPDATE per table and removed rows are deleted with one DELETE per
+        table.
+        """
+        for case in cases:
+            for attachment in case.get_tracked_models_to_create(CaseAttachmentSQL):
+                if attachment.is_saved():
+                    raise CaseSaveError(
+                        """Updating attachments is not supported.
+                        case id={}, attachment id={}""".format(
+                            case.case_id, attachment.attachment_id
+                        )
+                    )
+
+        get_db = operator.attrgetter('db')
+        for db_name, db_cases in groupby(sorted(cases, key=get_db), key=get_db):
+            db_cases = list(db_cases)
+            try:
+                with transaction.atomic(using=db_name, savepoint=False):
+                    CaseAccessorSQL._save_cases_in_database(db_name, db_cases)
+            except DatabaseError as e:
+                raise CaseSaveError(e)
+
+        for case in cases:
+            case.clear_tracked_models()
+
+    @staticmethod
+    def _save_cases_in_database(db_name, cases):
+        def save_models(model_class, models, update_fields):
+            new_models = [model for model in models if not model.is_saved()]
+            if new_models:
+                model_class.objects.using(db_name).bulk_create(new_models)
+            bulk_update([model for model in models if model.is_saved()], update_fields, using=db_name)
+
+        def get_update_fields(model_class):
+            return [
+                field.name for field in model_class._meta.concrete_fields
+                if not field.primary_key
+            ]
+
+        save_models(CommCareCaseSQL, cases, get_update_fields(CommCareCaseSQL))
+        save_models(CaseTransaction, [
+            case_transaction
+            for case in cases
+            for case_transaction in case.get_live_tracked_models(CaseTransaction)
+        ], get_update_fields(CaseTransaction))
+
+        indices = []
+        for case in cases:
+            for index in case.get_live_tracked_models(CommCareCaseIndexSQL):
+                index.domain = case.domain  # ensure domain is set on indices
+                indices.append(index)
+        # prevent changing identifier
+        save_models(CommCareCaseIndexSQL, indices, ['referenced_id', 'referenced_type', 'relationship_id'])
+        CommCareCaseIndexSQL.objects.using(db_name).filter(id__in=[
+            index.id for case in cases for index in case.get_tracked_models_to_delete(CommCareCaseIndexSQL)
+        ]).delete()
+
+        save_models(CaseAttachmentSQL, [
+            attachment
+            for case in cases
+            for attachment in case.get_tracked_models_to_create(CaseAttachmentSQL)
+        ], [])
+        CaseAttachmentSQL.objects.using(db_name).filter(id__in=[
+            attachment.id
+            for case in cases
+            for attachment in case.get_tracked_models_to_delete(CaseAttachmentSQL)
+        ]).delete()
+
     @staticmethod
     def get_open_case_ids_for_owner(domain, owner_id):
         return CaseAccessorSQL._get_case_ids_in_domain(domain, owner_ids=[owner_id], is_closed=False)
@@ -1058,9 +1289,16 @@ class CaseAccessorSQL(AbstractCaseAccessor):
         assert isinstance(case_ids, list), case_ids
         if not case_ids:
             return []
-        return list(CommCareCaseIndexSQL.objects.plproxy_raw(
-            'SELECT * FROM get_related_indices(%s, %s, %s)',
-            [domain, case_ids, list(exclude_indices)]))
+        query = 'SELECT * FROM get_related_indices(%s, %s, %s)'
+        params = [domain, case_ids, list(exclude_indices)]
+        if use_direct_shard_reads():
+            # related cases may be on any shard
+            results = _query_shards_concurrently(
+                lambda db_name, args: list(CommCareCaseIndexSQL.objects.using(db_name).raw(query, args)),
+                {db_name: params for db_name in get_db_aliases_for_partitioned_query()}
+            )
+            return list(itertools.chain.from_iterable(results))
+        return list(CommCareCaseIndexSQL.objects.plproxy_raw(query, params))
 
     @staticmethod
     def get_closed_and_deleted_ids(domain, case_ids):
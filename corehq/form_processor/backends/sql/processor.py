@@ -10,6 +10,7 @@ from lxml import etree
 
 from casexml.apps.case import const
 from casexml.apps.case.xform import get_case_updates
+from corehq.apps.change_feed.producer import producer
 from corehq.form_processor.backends.sql.update_strategy import SqlCaseUpdateStrategy
 from corehq.form_processor.backends.sql.dbaccessors import (
     FormAccessorSQL, CaseAccessorSQL, LedgerAccessorSQL
@@ -91,8 +92,9 @@ class FormProcessorSQL(object):
         existing_form, new_form = apply_deprecation(existing_form, new_form)
         return (existing_form, new_form)
 
-    @classmethod
-    def save_processed_models(cls, processed_forms, cases=None, stock_result=None):
+    @staticmethod
+    def get_db_names(processed_forms, cases=None, stock_result=None):
+        """Names of the databases that ``save_processed_models`` writes to"""
         db_names = {processed_forms.submitted.db}
         if processed_forms.deprecated:
             db_names |= {processed_forms.deprecated.db}
@@ -104,6 +106,11 @@ class FormProcessorSQL(object):
             db_names |= {
                 ledger_value.db for ledger_value in stock_result.models_to_save
             }
+        return db_names
+
+    @classmethod
+    def save_processed_models(cls, processed_forms, cases=None, stock_result=None, publish_changes=True):
+        db_names = cls.get_db_names(processed_forms, cases, stock_result)
 
         all_models = filter(None, chain(
             processed_forms,
@@ -121,8 +128,7 @@ class FormProcessorSQL(object):
 
                 FormAccessorSQL.save_new_form(processed_forms.submitted)
                 if cases:
-                    for case in cases:
-                        CaseAccessorSQL.save_case(case)
+                    CaseAccessorSQL.save_cases(cases)
 
                 if stock_result:
                     ledgers_to_save = stock_result.models_to_save
@@ -142,6 +148,9 @@ class FormProcessorSQL(object):
                     setattr(tracked, tracked._meta.pk.attname, None)
             raise
 
+        if not publish_changes:
+            return
+
         try:
             cls.publish_changes_to_kafka(processed_forms, cases, stock_result)
         except Exception as e:
@@ -149,14 +158,16 @@ class FormProcessorSQL(object):
 
     @staticmethod
     def publish_changes_to_kafka(processed_forms, cases, stock_result):
-        publish_form_saved(processed_forms.submitted)
-        cases = cases or []
-        for case in cases:
-            publish_case_saved(case)
+        # send all the changes before waiting for any of them to be delivered
+        with producer.deferred_flush():
+            publish_form_saved(processed_forms.submitted)
+            cases = cases or []
+            for case in cases:
+                publish_case_saved(case)
 
-        if stock_result:
-            for ledger in stock_result.models_to_save:
-                publish_ledger_v2_saved(ledger)
+            if stock_result:
+                for ledger in stock_result.models_to_save:
+                    publish_ledger_v2_saved(ledger)
 
     @classmethod
     def apply_deprecation(cls, existing_xform, new_xform):
@@ -6,10 +6,14 @@ from pillowtop.dao.interface import DocumentStore
 
 from corehq.blobs import Error as BlobError
 from corehq.form_processor.backends.sql.dbaccessors import (
+    CaseAccessorSQL,
     CaseReindexAccessor,
+    FormAccessorSQL,
     LedgerAccessorSQL,
     LedgerReindexAccessor,
+    get_doc_ids_by_read_database,
     iter_all_ids,
+    use_direct_shard_reads,
 )
 from corehq.form_processor.exceptions import (
     CaseNotFound,
@@ -57,6 +61,16 @@ class FormDocumentStore(DocumentStore):
             except (DocumentNotFoundError, MissingFormXml):
                 pass
 
+    def get_ids_by_database(self, ids):
+        return _get_ids_by_database(self.domain, ids)
+
+    def iter_documents_from_database(self, database, ids):
+        for form in FormAccessorSQL.get_forms_from_database(database, ids):
+            try:
+                yield self._to_json(form)
+            except (DocumentNotFoundError, MissingFormXml):
+                pass
+
 
 class CaseDocumentStore(DocumentStore):
 
@@ -82,6 +96,19 @@ class CaseDocumentStore(DocumentStore):
         for wrapped_case in self.case_accessors.iter_cases(ids):
             yield wrapped_case.to_json()
 
+    def get_ids_by_database(self, ids):
+        return _get_ids_by_database(self.domain, ids)
+
+    def iter_documents_from_database(self, database, ids):
+        for case in CaseAccessorSQL.get_cases_from_database(database, ids):
+            yield case.to_json()
+
+
+def _get_ids_by_database(domain, ids):
+    if use_direct_shard_reads() and should_use_sql_backend(domain):
+        return get_doc_ids_by_read_database(ids)
+    return None
+
 
 class LedgerV2DocumentStore(DocumentStore):
 
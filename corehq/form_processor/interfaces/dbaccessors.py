@@ -279,6 +279,11 @@ class AbstractCaseAccessor(metaclass=ABCMeta):
     def get_case_xform_ids(case_id):
         raise NotImplementedError
 
+    @staticmethod
+    @abstractmethod
+    def get_case_xform_ids_by_case_id(case_ids):
+        raise NotImplementedError
+
     @staticmethod
     @abstractmethod
     def get_case_ids_in_domain(domain, type=None):
@@ -420,6 +425,9 @@ class CaseAccessors(object):
     def get_case_xform_ids(self, case_id):
         return self.db_accessor.get_case_xform_ids(case_id)
 
+    def get_case_xform_ids_by_case_id(self, case_ids):
+        return self.db_accessor.get_case_xform_ids_by_case_id(case_ids)
+
     def get_case_ids_in_domain(self, type=None):
         return self.db_accessor.get_case_ids_in_domain(self.domain, type)
 
@@ -468,8 +476,8 @@ class CaseAccessors(object):
     def get_case_ids_modified_with_owner_since(self, owner_id, reference_date):
         return self.db_accessor.get_case_ids_modified_with_owner_since(self.domain, owner_id, reference_date)
 
-    def get_extension_case_ids(self, case_ids):
-        return self.db_accessor.get_extension_case_ids(self.domain, case_ids)
+    def get_extension_case_ids(self, case_ids, include_closed=True):
+        return self.db_accessor.get_extension_case_ids(self.domain, case_ids, include_closed)
 
     def get_indexed_case_ids(self, case_ids):
         return self.db_accessor.get_indexed_case_ids(self.domain, case_ids)
@@ -179,7 +179,7 @@ class FormProcessorInterface(object):
 
         return errors
 
-    def save_processed_models(self, forms, cases=None, stock_result=None):
+    def save_processed_models(self, forms, cases=None, stock_result=None, publish_changes=True):
         forms = _list_to_processed_forms_tuple(forms)
         if stock_result:
             assert stock_result.populated
@@ -188,6 +188,7 @@ class FormProcessorInterface(object):
                 forms,
                 cases=cases,
                 stock_result=stock_result,
+                publish_changes=publish_changes,
             )
         except BulkSaveError as e:
             logging.exception('BulkSaveError saving forms', extra={'details': {'errors': e.errors}})
@@ -0,0 +1,71 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from corehq.form_processor.backends.sql.dbaccessors import CaseAccessorSQL
+from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
+from corehq.form_processor.models import CommCareCaseSQL
+from corehq.sql_db.util import split_list_by_db_partition
+
+
+class Command(BaseCommand):
+    help = """Compare reading whole cases with reading only some of their
+    properties using ``CaseAccessorSQL.get_cases(case_ids, properties=[...])``.
+
+    Reports the bytes of row data each query returns from the databases
+    and the median time to fetch and deserialize a batch.
+
+    Usage: ./manage.py benchmark_case_projection <domain> --properties age village
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain')
+        parser.add_argument('--properties', nargs='+', required=True)
+        parser.add_argument('--case-type', dest='case_type')
+        parser.add_argument('--batch-size', type=int, default=1000, dest='batch_size')
+        parser.add_argument('--repeat', type=int, default=10, help='Number of times to run each query')
+
+    def handle(self, domain, properties, case_type, batch_size, repeat, **options):
+        case_ids = list(CaseAccessors(domain).get_case_ids_in_domain(case_type))[:batch_size]
+        if not case_ids:
+            self.stderr.write('No cases found')
+            return
+
+        full_bytes = _get_row_bytes(case_ids, lambda db, ids: CommCareCaseSQL.objects.using(db).filter(
+            case_id__in=ids))
+        projected_bytes = _get_row_bytes(case_ids, lambda db, ids: CaseAccessorSQL.get_case_rows_queryset(
+            db, ids, properties))
+        full_seconds = _time_query(lambda: CaseAccessorSQL.get_cases(case_ids), repeat)
+        projected_seconds = _time_query(lambda: CaseAccessorSQL.get_cases(case_ids, properties=properties), repeat)
+
+        self.stdout.write('{} cases, properties: {}'.format(len(case_ids), ', '.join(properties)))
+        self.stdout.write('{:<12}{:>14}{:>12}'.format('read', 'row KB', 'ms'))
+        self.stdout.write('{:<12}{:>14.1f}{:>12.1f}'.format('full', full_bytes / 1024, full_seconds * 1000))
+        self.stdout.write('{:<12}{:>14.1f}{:>12.1f}'.format(
+            'projected', projected_bytes / 1024, projected_seconds * 1000))
+        self.stdout.write('{:.1f}x fewer bytes, {:.1f}x faster'.format(
+            full_bytes / max(projected_bytes, 1), full_seconds / projected_seconds))
+
+
+def _get_row_bytes(case_ids, get_queryset):
+    """Size of the rows returned by the query in their text representation"""
+    total = 0
+    for db_name, db_case_ids in split_list_by_db_partition(case_ids):
+        sql, params = get_queryset(db_name, db_case_ids).query.sql_with_params()
+        with connections[db_name].cursor() as cursor:
+            cursor.execute('SELECT sum(octet_length(t::text)) FROM ({}) t'.format(sql), params)
+            total += cursor.fetchone()[0] or 0
+    return total
+
+
+def _time_query(query, repeat):
+    """:return: median seconds per query"""
+    query()  # warm up connections
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        query()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
@@ -0,0 +1,156 @@
+import hashlib
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import uuid
+
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from django.core.management.base import BaseCommand
+from django.http.multipartparser import MultiPartParser
+
+from couchforms.const import MAGIC_PROPERTY
+
+from corehq.form_processor.utils import (
+    convert_xform_to_json,
+    convert_xform_to_json_streaming,
+)
+
+BOUNDARY = 'BenchmarkFormIngestBoundary'
+ATTACHMENT_SIZE = 2 * 1024 * 1024  # small enough to be kept in memory by default
+CHUNK_SIZE = 64 * 1024
+
+
+class Command(BaseCommand):
+    help = """Compare peak memory of parsing large multipart form submissions
+    with and without streaming ingest.
+
+    A submission of ``--size-mb`` is written to a temporary file: an
+    instance of ``--xml-mb`` with a big repeat group and the rest as 2MB
+    attachments. Each run parses it in a new process the way the receiver
+    does (multipart parsing, converting the instance to json and reading
+    the attachments as they would be written to the blob db) and reports
+    the growth in max RSS.
+
+    No data is saved.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=50, dest='size_mb')
+        parser.add_argument('--xml-mb', type=int, default=10, dest='xml_mb')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, size_mb, xml_mb, repeat, **options):
+        with tempfile.NamedTemporaryFile(suffix='.multipart') as body:
+            _write_submission(body, size_mb * 1024 * 1024, xml_mb * 1024 * 1024)
+            body.flush()
+            content_length = os.path.getsize(body.name)
+            self.stdout.write('submission: {:.1f}MB'.format(content_length / 1024 / 1024))
+            self.stdout.write('{:<12}{:>16}{:>12}'.format('ingest', 'max RSS +MB', 'seconds'))
+            for streaming in [False, True]:
+                results = [_run_in_process(body.name, content_length, streaming) for i in range(repeat)]
+                rss = max(rss for rss, seconds in results)
+                seconds = min(seconds for rss, seconds in results)
+                self.stdout.write('{:<12}{:>16.1f}{:>12.2f}'.format(
+                    'streaming' if streaming else 'default', rss / 1024, seconds))
+
+
+def _run_in_process(path, content_length, streaming):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    process = context.Process(target=_ingest, args=(path, content_length, streaming, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def _ingest(path, content_length, streaming, results):
+    """Parse the submission and put (max RSS growth in KB, seconds) on results"""
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    meta = {
+        'CONTENT_TYPE': 'multipart/form-data; boundary={}'.format(BOUNDARY),
+        'CONTENT_LENGTH': str(content_length),
+    }
+    if streaming:
+        handlers = [TemporaryFileUploadHandler()]
+    else:
+        handlers = [MemoryFileUploadHandler(), TemporaryFileUploadHandler()]
+    with open(path, 'rb') as body:
+        post, files = MultiPartParser(meta, body, handlers).parse()
+    instance = files[MAGIC_PROPERTY].read()
+    if streaming:
+        convert_xform_to_json_streaming(instance)
+    else:
+        convert_xform_to_json(instance)
+    for name, upload in files.items():
+        if name != MAGIC_PROPERTY:
+            _read_like_blob_db(upload)
+    results.put((
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss,
+        time.perf_counter() - start,
+    ))
+
+
+def _read_like_blob_db(fileobj):
+    md5 = hashlib.md5()
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b''):
+        md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _write_submission(body, size, xml_size):
+    """Write a multipart submission without holding it in memory"""
+    def part_header(name, filename, content_type):
+        body.write((
+            '--{}\r\n'
+            'Content-Disposition: form-data; name="{}"; filename="{}"\r\n'
+            'Content-Type: {}\r\n\r\n'
+        ).format(BOUNDARY, name, filename, content_type).encode())
+
+    part_header(MAGIC_PROPERTY, 'form.xml', 'text/xml')
+    _write_instance(body, xml_size)
+    body.write(b'\r\n')
+
+    remaining = size - body.tell()
+    index = 0
+    while remaining > 0:
+        part_header('image{}.jpg'.format(index), 'image{}.jpg'.format(index), 'application/octet-stream')
+        attachment_size = min(ATTACHMENT_SIZE, remaining)
+        for offset in range(0, attachment_size, CHUNK_SIZE):
+            body.write(os.urandom(min(CHUNK_SIZE, attachment_size - offset)))
+        body.write(b'\r\n')
+        remaining -= attachment_size
+        index += 1
+    body.write('--{}--\r\n'.format(BOUNDARY).encode())
+
+
+def _write_instance(body, size):
+    start = body.tell()
+    body.write((
+        "<?xml version='1.0' ?>"
+        '<data xmlns="http://openrosa.org/formdesigner/benchmark" uiVersion="1" version="1">'
+        '<n0:meta xmlns:n0="http://openrosa.org/jr/xforms">'
+        '<n0:deviceID>benchmark</n0:deviceID>'
+        '<n0:timeStart>2020-01-01T00:00:00.000000Z</n0:timeStart>'
+        '<n0:timeEnd>2020-01-01T00:10:00.000000Z</n0:timeEnd>'
+        '<n0:username>benchmark</n0:username>'
+        '<n0:userID>benchmark</n0:userID>'
+        '<n0:instanceID>{}</n0:instanceID>'
+        '</n0:meta>'
+    ).format(uuid.uuid4().hex).encode())
+    index = 0
+    while body.tell() - start < size:
+        body.write((
+            '<household><id>{0}</id><name>household {0}</name>'
+            '<member><name>first</name><age>30</age></member>'
+            '<member><name>second</name><age>3</age></member>'
+            '<photo>image{0}.jpg</photo></household>'
+        ).format(index).encode())
+        index += 1
+    body.write(b'</data>')
@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from corehq.form_processor.backends.sql.dbaccessors import (
+    CaseAccessorSQL,
+    FormAccessorSQL,
+)
+from corehq.form_processor.interfaces.dbaccessors import CaseAccessors, FormAccessors
+
+
+class Command(BaseCommand):
+    help = """Compare reading forms, cases and related indices by ID through
+    PL/Proxy and directly from the shard databases.
+
+    IDs are taken from the domain so it should have at least as many forms
+    and cases as the largest batch size.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain')
+        parser.add_argument('--batch-sizes', nargs='+', type=int, default=[10, 100, 1000], dest='batch_sizes')
+        parser.add_argument('--repeat', type=int, default=10, help='Number of times to run each query')
+
+    def handle(self, domain, batch_sizes, repeat, **options):
+        if not settings.USE_PARTITIONED_DATABASE:
+            raise CommandError('Only applicable if sharding is setup')
+
+        max_size = max(batch_sizes)
+        form_ids = list(FormAccessors(domain=domain).get_all_form_ids_in_domain())[:max_size]
+        case_ids = list(CaseAccessors(domain=domain).get_case_ids_in_domain())[:max_size]
+        queries = [
+            ('get_forms', form_ids, lambda ids: FormAccessorSQL.get_forms(ids, ordered=True)),
+            ('get_cases', case_ids, lambda ids: CaseAccessorSQL.get_cases(ids, ordered=True)),
+            ('get_related_indices', case_ids, lambda ids: CaseAccessorSQL.get_related_indices(domain, ids, set())),
+        ]
+
+        self.stdout.write('{:<20}{:>8}{:>12}{:>12}{:>10}'.format(
+            'query', 'ids', 'proxy ms', 'direct ms', 'speedup'))
+        for name, doc_ids, query in queries:
+            for size in batch_sizes:
+                if size > len(doc_ids):
+                    self.stderr.write('{}: only {} IDs in domain, skipping batch of {}'.format(
+                        name, len(doc_ids), size))
+                    continue
+                batch = doc_ids[:size]
+                proxy = _time_query(query, batch, repeat, direct=False)
+                direct = _time_query(query, batch, repeat, direct=True)
+                self.stdout.write('{:<20}{:>8}{:>12.1f}{:>12.1f}{:>9.1f}x'.format(
+                    name, size, proxy * 1000, direct * 1000, proxy / direct))
+
+
+def _time_query(query, doc_ids, repeat, direct):
+    """:return: median seconds per query"""
+    timings = []
+    with override_settings(USE_DIRECT_SHARD_READS=direct):
+        query(doc_ids)  # warm up connections
+        for i in range(repeat):
+            start = time.perf_counter()
+            query(doc_ids)
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
@@ -12,7 +12,9 @@ from datetime import datetime
 
 import attr
 from io import BytesIO
+from django.contrib.postgres.fields import JSONField as JSONBField
 from django.db import models
+from django.db.models import Transform
 from jsonfield.fields import JSONField
 from jsonobject import JsonObject
 from jsonobject import StringProperty
@@ -67,6 +69,23 @@ class TruncatingCharField(models.CharField):
         return value
 
 
+class AsJSONB(Transform):
+    """
+    Casts a ``jsonfield`` text column to jsonb so that the postgres JSONField
+    lookups and key transforms can be used on it, e.g.
+    ``case_json__jsonb__has_key='dob'`` or ``case_json__jsonb__dob__lt='2020-01-01'``
+    """
+    lookup_name = 'jsonb'
+    template = '(%(expressions)s)::jsonb'
+
+    def __init__(self, expression, **extra):
+        extra['output_field'] = JSONBField()
+        super(AsJSONB, self).__init__(expression, **extra)
+
+
+JSONField.register_lookup(AsJSONB)
+
+
 @attr.s
 class Attachment(IsImageMixin):
     """Unsaved form attachment
@@ -233,6 +252,17 @@ class AttachmentMixin(SaveStateMixin):
         """Return true if this form has unsaved attachments else false"""
         return any(isinstance(a, Attachment) for a in self.attachments_list)
 
+    def write_attachments(self, blob_db):
+        """Write unsaved attachments with the given blob db
+
+        The blobs are not deleted if the form is not saved, so this should
+        be called with a blob db such as ``AtomicBlobs`` that deletes them
+        when the transaction saving the form is rolled back.
+        """
+        unsaved = self.attachments_list
+        assert all(isinstance(a, Attachment) for a in unsaved), unsaved
+        self._attachments_list = [attachment.write(blob_db, self) for attachment in unsaved]
+
     def attachment_writer(self):
         """Context manager for atomically writing attachments
 
@@ -9,7 +9,11 @@ from corehq.form_processor.exceptions import MissingFormXml, NotAllowed
 from corehq.form_processor.interfaces.dbaccessors import FormAccessors
 from corehq.form_processor.interfaces.processor import FormProcessorInterface
 from corehq.form_processor.models import Attachment
-from corehq.form_processor.utils import convert_xform_to_json, adjust_datetimes
+from corehq.form_processor.utils import (
+    adjust_datetimes,
+    convert_xform_to_json,
+    convert_xform_to_json_streaming,
+)
 from corehq.util.soft_assert.api import soft_assert
 from couchforms import XMLSyntaxError
 from couchforms.exceptions import MissingXMLNSError
@@ -97,7 +101,10 @@ def _create_new_xform(domain, instance_xml, attachments=None, auth_context=None)
     interface = FormProcessorInterface(domain)
 
     assert attachments is not None
-    form_data = convert_xform_to_json(instance_xml)
+    if _should_stream(instance_xml):
+        form_data = convert_xform_to_json_streaming(instance_xml)
+    else:
+        form_data = convert_xform_to_json(instance_xml)
     if not form_data.get('@xmlns'):
         raise MissingXMLNSError("Form is missing a required field: XMLNS")
 
@@ -116,6 +123,11 @@ def _create_new_xform(domain, instance_xml, attachments=None, auth_context=None)
     return FormProcessingResult(xform)
 
 
+def _should_stream(instance_xml):
+    threshold = settings.FORM_INGEST_STREAMING_THRESHOLD
+    return threshold is not None and len(instance_xml) >= threshold
+
+
 def _get_submission_error(domain, instance_xml, error, auth_context):
     """
     Handle's a hard failure from posting a form to couch.
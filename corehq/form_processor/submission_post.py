@@ -1,8 +1,10 @@
 import logging
+import time
 from collections import namedtuple
 
+from contextlib2 import ExitStack
 from ddtrace import tracer
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.http import (
     HttpRequest,
     HttpResponse,
@@ -19,6 +21,7 @@ from casexml.apps.phone.restore_caching import AsyncRestoreTaskIdCache, RestoreP
 import couchforms
 from casexml.apps.case.exceptions import PhoneDateValueError, IllegalCaseId, UsesReferrals, InvalidCaseIndex, \
     CaseValueError
+from corehq.apps.change_feed.producer import producer
 from corehq.apps.receiverwrapper.rate_limiter import report_submission_usage
 from corehq.const import OPENROSA_VERSION_3
 from corehq.middleware import OPENROSA_VERSION_HEADER
@@ -28,13 +31,18 @@ from corehq.apps.commtrack.exceptions import MissingProductId
 from corehq.apps.domain_migration_flags.api import any_migrations_in_progress
 from corehq.apps.users.models import CouchUser
 from corehq.apps.users.permissions import has_permission_to_view_report
-from corehq.form_processor.exceptions import CouchSaveAborted, PostSaveError, XFormSaveError
+from corehq.blobs import get_blob_db
+from corehq.blobs.atomic import AtomicBlobs
+from corehq.form_processor.exceptions import CouchSaveAborted, PostSaveError, XFormLockError, XFormSaveError
 from corehq.form_processor.interfaces.dbaccessors import FormAccessors
-from corehq.form_processor.interfaces.processor import FormProcessorInterface
+from corehq.form_processor.interfaces.processor import FormProcessorInterface, ProcessedForms
 from corehq.form_processor.parsers.form import process_xform_xml
 from corehq.form_processor.system_action import SYSTEM_ACTION_XMLNS, handle_system_action
 from corehq.form_processor.utils.metadata import scrub_meta
-from corehq.form_processor.submission_process_tracker import unfinished_submission
+from corehq.form_processor.submission_process_tracker import (
+    get_submission_process_tracker,
+    unfinished_submission,
+)
 from corehq.util.datadog.utils import form_load_counter
 from corehq.util.global_request import get_request
 from couchforms import openrosa_response
@@ -221,12 +229,18 @@ class SubmissionPost(object):
         if failure_response:
             return FormProcessingResult(failure_response, None, [], [], 'known_failures')
 
+        return self._process_parsed_form(self._parse_form())
+
+    def _parse_form(self):
         result = process_xform_xml(self.domain, self.instance, self.attachments, self.auth_context.to_json())
         submitted_form = result.submitted_form
 
         self._post_process_form(submitted_form)
         self._invalidate_caches(submitted_form)
+        return result
 
+    def _process_parsed_form(self, result):
+        submitted_form = result.submitted_form
         if submitted_form.is_submission_error_log:
             self.formdb.save_new_form(submitted_form)
 
@@ -535,6 +549,299 @@ class SubmissionPost(object):
         return FormProcessingResult(response, device_log_form, [], [], 'device-log')
 
 
+# Groups of a submission batch are committed once they reach either limit
+# so that case locks and transactions are not held for too long.
+BATCH_GROUP_MAX_FORMS = 50
+BATCH_GROUP_MAX_SECONDS = 10
+
+
+class SubmissionBatchPost(object):
+    """Process a bundle of forms submitted together by one user or device
+
+    New forms are processed in order against a shared case DB cache and
+    saved in groups. A group's writes are made in one transaction per
+    database which are committed together, after which its changes are
+    published to Kafka in a single flush and the post save actions of
+    each form are run. A group is committed once it has
+    ``BATCH_GROUP_MAX_FORMS`` forms or has been open for
+    ``BATCH_GROUP_MAX_SECONDS``.
+
+    Forms that can't join a group are processed on their own by
+    ``SubmissionPost`` after committing the current group: duplicates,
+    edits, device logs, system actions, submission errors and forms that
+    update a form ID or ledger saved earlier in the group (these are read
+    from the database). If anything goes wrong while processing or
+    committing a group it is rolled back and its forms are processed
+    again one at a time.
+    """
+
+    def __init__(self, instances, domain, **kwargs):
+        """
+        :param instances: List of ``(instance, attachments)`` in the order
+        they were submitted.
+        :param kwargs: Passed to ``SubmissionPost`` for each form.
+        """
+        self.domain = domain
+        self.interface = FormProcessorInterface(domain)
+        self.posts = [
+            SubmissionPost(instance=instance, attachments=attachments, domain=domain, **kwargs)
+            for instance, attachments in instances
+        ]
+        self.results = [None] * len(self.posts)
+        self._group = None
+
+    def run(self):
+        """
+        :returns: List of ``FormProcessingResult``, one for each form. If
+        processing a form fails its result and the results of the forms
+        after it are error responses so that they are submitted again.
+        """
+        try:
+            for index, post in enumerate(self.posts):
+                try:
+                    self._process(index, post)
+                except Exception:
+                    # keep the forms processed before this one
+                    self._commit_group()
+                    raise
+            self._commit_group()
+        except Exception as e:
+            if not isinstance(e, XFormLockError):
+                notify_exception(get_request(), "Error processing submission batch", {'domain': self.domain})
+            self._set_error_results(e)
+        return self.results
+
+    def _process(self, index, post):
+        post.track_load()
+        report_submission_usage(self.domain)
+        failure_response = post._handle_basic_failure_modes()
+        if failure_response:
+            self.results[index] = FormProcessingResult(failure_response, None, [], [], 'known_failures')
+            return
+
+        result = post._parse_form()
+        ledger_references = self._get_ledger_references(result.submitted_form)
+        if ledger_references is None:
+            self._commit_group()
+            self.results[index] = post._process_parsed_form(result)
+            return
+
+        if self._group and self._group.conflicts(result.submitted_form.form_id, ledger_references):
+            self._commit_group()
+
+        with ExitStack() as form_lock:
+            xforms = form_lock.enter_context(result.get_locked_forms())
+            can_group = len(xforms) == 1 and xforms[0].is_normal
+            if can_group:
+                self._get_group().locks.enter_context(form_lock.pop_all())
+        if not can_group:
+            # duplicate or edit
+            self._commit_group()
+            self.results[index] = post._process_parsed_form(result)
+            return
+
+        self._process_in_group(index, post, xforms, ledger_references)
+
+    def _get_ledger_references(self, form):
+        """
+        :returns: References of the ledgers the form updates or None if
+        the form can't be processed in a group.
+        """
+        from corehq.form_processor.parsers.ledgers.form import get_ledger_references_from_stock_transactions
+        if not self.interface.use_sql_domain or form.is_submission_error_log:
+            return None
+        if form.xmlns in (SYSTEM_ACTION_XMLNS, DEVICE_LOG_XMLNS):
+            return None
+        try:
+            return get_ledger_references_from_stock_transactions(form)
+        except Exception:
+            # invalid ledger blocks are reported by SubmissionPost
+            return None
+
+    def _get_group(self):
+        if self._group is None:
+            self._group = _SubmissionGroup(self.interface, self.domain)
+        return self._group
+
+    @tracer.wrap(name='submission.batch.process_in_group')
+    def _process_in_group(self, index, post, xforms, ledger_references):
+        group = self._group
+        group.posts.append((index, post))
+        try:
+            case_stock_result = post.process_xforms_for_cases(xforms, group.case_db)
+            xforms[0].initial_processing_complete = True
+            group.save(index, post, xforms, case_stock_result, ledger_references)
+        except Exception:
+            self._group = None
+            group.rollback(sys.exc_info())
+            self._process_singly(group.posts)
+        else:
+            if group.is_full():
+                self._commit_group()
+
+    @tracer.wrap(name='submission.batch.commit_group')
+    def _commit_group(self):
+        group, self._group = self._group, None
+        if group is None:
+            return
+        try:
+            results = group.commit()
+        except Exception:
+            notify_exception(get_request(), "Error committing submission batch", {'domain': self.domain})
+            self._process_singly(group.posts)
+        else:
+            for index, result in results:
+                self.results[index] = result
+
+    def _process_singly(self, posts):
+        for index, post in posts:
+            # parse again since the forms were changed while processing the group
+            self.results[index] = post._process_parsed_form(post._parse_form())
+
+    def _set_error_results(self, error):
+        status = 423 if isinstance(error, XFormLockError) else 500
+        message = "Error processing form: {}".format(type(error).__name__)
+        for index, result in enumerate(self.results):
+            if result is not None:
+                continue
+            response = OpenRosaResponse(message, ResponseNature.SUBMIT_ERROR, status=status).response()
+            self.results[index] = FormProcessingResult(response, None, [], [], 'error')
+            # forms after the one that failed were not processed
+            status = 503
+            message = "Form not processed"
+
+
+_GroupedForm = namedtuple('_GroupedForm', 'index post xforms case_stock_result tracker')
+
+
+class _SubmissionGroup(object):
+    """Forms processed against a shared case DB cache and saved in one
+    transaction per database
+
+    Form and case locks are held until the transactions are committed or
+    rolled back. Form attachments are deleted from the blob db if the
+    transactions are rolled back.
+    """
+
+    def __init__(self, interface, domain):
+        self.interface = interface
+        self.started = time.monotonic()
+        self.locks = ExitStack()
+        self.transactions = ExitStack()
+        # entered first so that it sees errors raised by the transactions
+        self.blob_db = self.transactions.enter_context(AtomicBlobs(get_blob_db()))
+        self.case_db = self.locks.enter_context(interface.casedb_cache(
+            domain=domain, lock=True, deleted_ok=True, load_src="form_submission_batch",
+        ))
+        self.db_names = set()
+        self.form_ids = set()
+        self.ledger_references = set()
+        # (index, SubmissionPost) of every form processed in the group
+        self.posts = []
+        # forms that have been saved
+        self.forms = []
+
+    def conflicts(self, form_id, ledger_references):
+        return form_id in self.form_ids or not self.ledger_references.isdisjoint(ledger_references)
+
+    def is_full(self):
+        return (
+            len(self.posts) >= BATCH_GROUP_MAX_FORMS
+            or time.monotonic() - self.started >= BATCH_GROUP_MAX_SECONDS
+        )
+
+    def save(self, index, post, xforms, case_stock_result, ledger_references):
+        instance = xforms[0]
+        cases = case_stock_result.case_models
+        stock_result = case_stock_result.stock_result
+        processed_forms = ProcessedForms(instance, None)
+        for db_name in self.interface.processor.get_db_names(processed_forms, cases, stock_result):
+            if db_name not in self.db_names:
+                self.transactions.enter_context(transaction.atomic(db_name))
+                self.db_names.add(db_name)
+
+        instance.write_attachments(self.blob_db)
+        self.case_db.cached_xforms.extend(xforms)
+        tracker = get_submission_process_tracker(instance)
+        self.forms.append(_GroupedForm(index, post, xforms, case_stock_result, tracker))
+        self.interface.save_processed_models(xforms, cases, stock_result, publish_changes=False)
+        self.case_db.clear_changed()
+        self.case_db.uncommitted_modified_on.update(
+            (case.case_id, case.server_modified_on) for case in cases
+        )
+        self.form_ids.add(instance.form_id)
+        self.ledger_references.update(ledger_references)
+
+    def rollback(self, exc_info):
+        try:
+            self.transactions.__exit__(*exc_info)
+            for form in self.forms:
+                form.tracker.submission_rolled_back()
+        finally:
+            self.locks.close()
+
+    def commit(self):
+        """Commit the transactions, publish changes and run post save actions
+
+        :returns: List of ``(index, FormProcessingResult)``
+        """
+        try:
+            self.transactions.close()
+        except Exception:
+            self.rollback((None, None, None))
+            raise
+
+        try:
+            self.case_db.uncommitted_modified_on.clear()
+            for form in self.forms:
+                form.tracker.submission_saved()
+            publish_error = self._publish_changes()
+            return [(form.index, self._post_save(form, publish_error)) for form in self.forms]
+        finally:
+            self.locks.close()
+
+    def _publish_changes(self):
+        published_case_ids = set()
+        try:
+            with producer.deferred_flush():
+                for form in self.forms:
+                    cases = [
+                        case for case in form.case_stock_result.case_models
+                        if case.case_id not in published_case_ids
+                    ]
+                    published_case_ids.update(case.case_id for case in cases)
+                    self.interface.processor.publish_changes_to_kafka(
+                        ProcessedForms(form.xforms[0], None), cases, form.case_stock_result.stock_result
+                    )
+        except Exception:
+            notify_submission_error(self.forms[0].xforms[0], 'Error publishing submission batch to Kafka')
+            return True
+        return False
+
+    def _post_save(self, form, publish_error):
+        instance = form.xforms[0]
+        cases = form.case_stock_result.case_models
+        error_message = None
+        if publish_error:
+            error_message = "Error performing post save operations"
+        else:
+            try:
+                SubmissionPost.do_post_save_actions(self.case_db, form.xforms, form.case_stock_result)
+            except PostSaveError:
+                error_message = "Error performing post save operations"
+            else:
+                form.tracker.submission_fully_processed()
+
+        response = form.post._get_open_rosa_response(
+            instance,
+            success_message=form.post._get_success_message(instance, cases=cases),
+            error_message=error_message,
+            error_nature=ResponseNature.POST_PROCESSING_FAILURE if error_message else None,
+        )
+        ledgers = form.case_stock_result.stock_result.models_to_save
+        return FormProcessingResult(response, instance, cases, ledgers, 'normal')
+
+
 def _transform_instance_to_error(interface, exception, instance):
     error_message = '{}: {}'.format(type(exception).__name__, str(exception))
     return interface.xformerror_from_xform_instance(instance, error_message)
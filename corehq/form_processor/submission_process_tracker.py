@@ -17,6 +17,11 @@ class SubmissionProcessTracker(object):
         if self.stub:
             self.stub.delete()
 
+    def submission_rolled_back(self):
+        # the submission will be processed again with a new stub
+        if self.stub:
+            self.stub.delete()
+
 
 class ArchiveProcessTracker(object):
     def __init__(self, stub=None):
@@ -30,6 +35,12 @@ class ArchiveProcessTracker(object):
 
 @contextlib.contextmanager
 def unfinished_submission(instance):
+    tracker = get_submission_process_tracker(instance)
+    yield tracker
+    tracker.submission_fully_processed()
+
+
+def get_submission_process_tracker(instance):
     from couchforms.models import UnfinishedSubmissionStub
     unfinished_submission_stub = None
     if not getattr(instance, 'deprecated_form_id', None):
@@ -40,9 +51,7 @@ def unfinished_submission(instance):
             saved=False,
             domain=instance.domain,
         )
-    tracker = SubmissionProcessTracker(unfinished_submission_stub)
-    yield tracker
-    tracker.submission_fully_processed()
+    return SubmissionProcessTracker(unfinished_submission_stub)
 
 
 @contextlib.contextmanager
@@ -77,6 +77,25 @@ class CaseAccessorTestsSQL(TestCase):
         self.assertEqual(case1.case_id, cases[0].case_id)
         self.assertEqual(case2.case_id, cases[1].case_id)
 
+    def test_get_cases_with_properties(self):
+        case1 = _create_case(case_type='mother')
+        case1.case_json = {'age': '30', 'village': 'Ghana', 'visits': {'count': 2}, 'children': [1, 2]}
+        CaseAccessorSQL.save_case(case1)
+        case2 = _create_case()
+
+        rows = CaseAccessorSQL.get_cases(
+            [case2.case_id, case1.case_id], ordered=True, properties=['age', 'visits', 'children', 'missing'])
+        self.assertEqual([row.case_id for row in rows], [case2.case_id, case1.case_id])
+        self.assertEqual(rows[0].properties, {})
+        self.assertEqual(rows[1].properties, {'age': '30', 'visits': {'count': 2}, 'children': [1, 2]})
+        self.assertEqual(rows[1].type, 'mother')
+        self.assertEqual(rows[1].domain, DOMAIN)
+        self.assertEqual(rows[1].get_case_property('age'), '30')
+        self.assertEqual(rows[1].get_case_property('owner_id'), 'user1')
+        self.assertIsNone(rows[1].get_case_property('village'))
+
+        self.assertEqual(CaseAccessorSQL.get_cases(['missing_case'], properties=['age']), [])
+
     def test_get_case_xform_ids(self):
         form_id1 = uuid.uuid4().hex
         case = _create_case(form_id=form_id1)
@@ -88,6 +107,18 @@ class CaseAccessorTestsSQL(TestCase):
             set(CaseAccessorSQL.get_case_xform_ids(case.case_id))
         )
 
+    def test_get_case_xform_ids_by_case_id(self):
+        case1 = _create_case()
+        _create_case_transactions(case1)
+        case2 = _create_case()
+
+        form_ids = CaseAccessorSQL.get_case_xform_ids_by_case_id([case1.case_id, case2.case_id, 'missing'])
+        self.assertEqual(form_ids, {
+            case1.case_id: CaseAccessorSQL.get_case_xform_ids(case1.case_id),
+            case2.case_id: CaseAccessorSQL.get_case_xform_ids(case2.case_id),
+            'missing': [],
+        })
+
     def test_get_indices(self):
         case = _create_case()
         index1 = CommCareCaseIndexSQL(
@@ -385,6 +416,55 @@ class CaseAccessorTestsSQL(TestCase):
         with self.assertRaises(CaseSaveError):
             CaseAccessorSQL.save_case(case)
 
+    def test_save_cases(self):
+        existing = _create_case()
+        existing.track_create(CommCareCaseIndexSQL(
+            case=existing,
+            identifier='parent',
+            referenced_type='mother',
+            referenced_id=uuid.uuid4().hex,
+            relationship_id=CommCareCaseIndexSQL.CHILD
+        ))
+        CaseAccessorSQL.save_case(existing)
+
+        utcnow = datetime.utcnow()
+        form = XFormInstanceSQL(form_id=uuid.uuid4().hex, received_on=utcnow, domain=DOMAIN)
+        new_cases = []
+        for i in range(3):
+            case = CommCareCaseSQL(
+                case_id=uuid.uuid4().hex, domain=DOMAIN, type='child', owner_id='user1',
+                opened_on=utcnow, modified_on=utcnow, modified_by='user1', server_modified_on=utcnow,
+                case_json={'age': str(i)},
+            )
+            case.track_create(CaseTransaction.form_transaction(case, form, utcnow))
+            case.track_create(CommCareCaseIndexSQL(
+                case=case, identifier='parent', referenced_type='mother',
+                referenced_id=existing.case_id, relationship_id=CommCareCaseIndexSQL.CHILD,
+            ))
+            new_cases.append(case)
+
+        existing = CaseAccessorSQL.get_case(existing.case_id)
+        existing.name = 'updated'
+        existing.case_json = {'visits': '2'}
+        existing.track_create(CaseTransaction.form_transaction(existing, form, utcnow))
+        [index] = CaseAccessorSQL.get_indices(DOMAIN, existing.case_id)
+        existing.track_delete(index)
+
+        CaseAccessorSQL.save_cases(new_cases + [existing])
+
+        for case in new_cases + [existing]:
+            self.assertTrue(case.is_saved())
+            self.assertFalse(case.has_tracked_models())
+        updated = CaseAccessorSQL.get_case(existing.case_id)
+        self.assertEqual(updated.name, 'updated')
+        self.assertEqual(updated.case_json, {'visits': '2'})
+        self.assertEqual(CaseAccessorSQL.get_indices(DOMAIN, existing.case_id), [])
+        self.assertIn(form.form_id, CaseAccessorSQL.get_case_xform_ids(existing.case_id))
+        for i, case in enumerate(CaseAccessorSQL.get_cases([c.case_id for c in new_cases], ordered=True)):
+            self.assertEqual(case.case_json, {'age': str(i)})
+            self.assertEqual([index.referenced_id for index in case.indices], [existing.case_id])
+            self.assertEqual(len(CaseAccessorSQL.get_transactions(case.case_id)), 1)
+
     def test_get_case_ids_by_owners(self):
         case1 = _create_case(user_id="user1")
         case2 = _create_case(user_id="user1")
@@ -482,7 +482,7 @@ class TestTransactionErrors(TransactionTestCase):
         case_id = uuid.uuid4().hex
 
         with patch(
-            'corehq.form_processor.backends.sql.dbaccessors.CaseAccessorSQL.save_case',
+            'corehq.form_processor.backends.sql.dbaccessors.CaseAccessorSQL.save_cases',
             side_effect=IntegrityError
         ), self.assertRaises(IntegrityError):
             submit_case_blocks(
@@ -505,7 +505,7 @@ class TestTransactionErrors(TransactionTestCase):
         )
 
         with patch(
-            'corehq.form_processor.backends.sql.dbaccessors.CaseAccessorSQL.save_case',
+            'corehq.form_processor.backends.sql.dbaccessors.CaseAccessorSQL.save_cases',
             side_effect=IntegrityError
         ), self.assertRaises(IntegrityError):
             submit_case_blocks(
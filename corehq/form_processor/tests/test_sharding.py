@@ -3,13 +3,20 @@ from unittest import skipUnless, SkipTest
 from uuid import uuid4, UUID
 
 from django.conf import settings
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 from django.test.utils import override_settings
 
-from corehq.form_processor.backends.sql.dbaccessors import ShardAccessor
-from corehq.form_processor.models import XFormInstanceSQL, CommCareCaseSQL
+import mock
+
+from corehq.form_processor.backends.sql.dbaccessors import (
+    CaseAccessorSQL,
+    FormAccessorSQL,
+    ShardAccessor,
+)
+from corehq.form_processor.models import XFormInstanceSQL, CommCareCaseSQL, CommCareCaseIndexSQL
 from corehq.form_processor.tests.utils import create_form_for_test, FormProcessorTestUtils, use_sql_backend
 from corehq.sql_db.config import plproxy_config
+from corehq.sql_db.routers import read_from_plproxy_standbys
 
 DOMAIN = 'sharding-test'
 
@@ -93,6 +100,19 @@ class ShardingTests(TestCase):
             for doc_id in doc_ids:
                 self.assertEqual(db, dbs_for_docs[doc_id])
 
+    def test_direct_shard_reads(self):
+        case_ids = [uuid4().hex for i in range(10)]
+        form_ids = [create_form_for_test(DOMAIN, case_id=case_id).form_id for case_id in case_ids]
+        case_ids.append('missing')
+        form_ids.append('missing')
+        with override_settings(USE_DIRECT_SHARD_READS=True):
+            direct_forms = FormAccessorSQL.get_forms(form_ids, ordered=True)
+            direct_cases = CaseAccessorSQL.get_cases(case_ids, ordered=True)
+            direct_indices = CaseAccessorSQL.get_related_indices(DOMAIN, case_ids, set())
+        self.assertEqual([form.form_id for form in direct_forms], form_ids[:-1])
+        self.assertEqual([case.case_id for case in direct_cases], case_ids[:-1])
+        self.assertEqual(direct_indices, CaseAccessorSQL.get_related_indices(DOMAIN, case_ids, set()))
+
     def test_same_dbalias_util(self):
         from corehq.sql_db.util import get_db_alias_for_partitioned_doc, new_id_in_same_dbalias
         for i in range(10):
@@ -130,6 +150,30 @@ def _mock_databases():
     return databases
 
 
+@override_settings(USE_PARTITIONED_DATABASE=True, USE_DIRECT_SHARD_READS=True)
+class DirectShardStandbyReadTests(SimpleTestCase):
+
+    def test_get_related_indices_from_standbys(self):
+        def using(db_name):
+            return mock.Mock(raw=lambda query, params: [db_name])
+
+        connections = {
+            db_name: mock.Mock(in_atomic_block=False)
+            for db_name in ['p1', 'p2', 'p1_standby', 'p2_standby']
+        }
+        dbaccessors = 'corehq.form_processor.backends.sql.dbaccessors'
+        with mock.patch(dbaccessors + '.get_db_aliases_for_partitioned_query', return_value=['p1', 'p2']), \
+                mock.patch(dbaccessors + '.select_plproxy_db_for_read', lambda db_name: db_name + '_standby'), \
+                mock.patch('corehq.sql_db.util.connections', connections), \
+                mock.patch.object(CommCareCaseIndexSQL.objects, 'using', using):
+            self.assertEqual(CaseAccessorSQL.get_related_indices(DOMAIN, ['a'], set()), ['p1', 'p2'])
+            with read_from_plproxy_standbys():
+                self.assertEqual(
+                    CaseAccessorSQL.get_related_indices(DOMAIN, ['a'], set()),
+                    ['p1_standby', 'p2_standby']
+                )
+
+
 @use_sql_backend
 @override_settings(DATABASES=_mock_databases())
 @skipUnless(settings.USE_PARTITIONED_DATABASE, 'Only applicable if sharding is setup')
@@ -3,7 +3,14 @@ from collections import OrderedDict
 from django.test import SimpleTestCase
 
 from corehq.form_processor.exceptions import XFormQuestionValueNotFound
-from corehq.form_processor.utils.xform import build_form_xml_from_property_dict, get_node
+from corehq.form_processor.utils.xform import (
+    build_form_xml_from_property_dict,
+    convert_xform_to_json,
+    convert_xform_to_json_streaming,
+    get_node,
+    get_simple_form_xml,
+)
+from couchforms import XMLSyntaxError
 from lxml import etree
 
 
@@ -82,3 +89,37 @@ class FormSubmissionBuilderTest(SimpleTestCase):
         self.assertEqual('remus', get_node(root, '/data/twin[2]/name').text)
         with self.assertRaises(XFormQuestionValueNotFound):
             get_node(root, '/data/has_attribute/@dirty')
+
+
+class StreamingConversionTest(SimpleTestCase):
+
+    def assert_same_json(self, xml):
+        if isinstance(xml, str):
+            xml = xml.encode('utf-8')
+        self.assertEqual(convert_xform_to_json_streaming(xml), convert_xform_to_json(xml))
+
+    def test_simple_form(self):
+        self.assert_same_json(get_simple_form_xml('form-id', case_id='case-id'))
+
+    def test_repeats_and_namespaces(self):
+        self.assert_same_json("""<?xml version='1.0' ?>
+<data xmlns="http://example.com/form" uiVersion="1" version="4">
+    <twin><name>romulus</name></twin>
+    <twin><name>remus</name></twin>
+    <single>one</single>
+    <has_attribute attr="dirty">text</has_attribute>
+    <case xmlns="http://commcarehq.org/case/transaction/v2" case_id="abc" date_modified="2020-01-01">
+        <update><age>3</age></update>
+    </case>
+    <case xmlns="http://commcarehq.org/case/transaction/v2" case_id="def" date_modified="2020-01-01">
+        <close/>
+    </case>
+    <n0:balance xmlns:n0="http://commcarehq.org/ledger/v1" entity-id="abc" section-id="stock">
+        <n0:entry id="product" quantity="5"/>
+    </n0:balance>
+    <twin><name>third</name></twin>
+</data>""")
+
+    def test_invalid_xml(self):
+        with self.assertRaises(XMLSyntaxError):
+            convert_xform_to_json_streaming(b'<data xmlns="http://example.com/form"><unclosed></data>')
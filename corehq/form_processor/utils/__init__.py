@@ -7,6 +7,7 @@ from .xform import (
     extract_meta_instance_id,
     extract_meta_user_id,
     convert_xform_to_json,
+    convert_xform_to_json_streaming,
     adjust_datetimes,
     get_simple_form_xml,
     get_simple_wrapped_form,
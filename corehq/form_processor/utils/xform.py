@@ -1,4 +1,6 @@
 from datetime import datetime
+from io import BytesIO
+
 from lxml import etree
 
 import iso8601
@@ -172,6 +174,55 @@ def convert_xform_to_json(xml_string):
     return json_form
 
 
+def convert_xform_to_json_streaming(xml_file):
+    """
+    Same as `convert_xform_to_json` but parses the XML incrementally
+
+    Each child of the root element is converted to json as soon as it
+    has been parsed and then discarded, so only one of them is held as
+    an XML tree at a time. This keeps memory down for large forms,
+    which are mostly made up of big repeat groups.
+
+    :param xml_file: file-like object or bytes
+    """
+    from couchforms import XMLSyntaxError
+    from xml2json.lib import convert_xml_to_json
+
+    if isinstance(xml_file, bytes):
+        xml_file = BytesIO(xml_file)
+
+    root = None
+    children = []
+    depth = 0
+    try:
+        for event, element in etree.iterparse(xml_file, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    root = element
+                continue
+            depth -= 1
+            if depth == 1:
+                children.append(convert_xml_to_json(element, last_xmlns=etree.QName(root).namespace))
+                root.remove(element)
+    except etree.XMLSyntaxError as e:
+        raise XMLSyntaxError('Invalid XML: %s' % e)
+
+    # root has no children left so this only converts its attributes and text
+    name, json_form = convert_xml_to_json(root)
+    if not isinstance(json_form, dict):
+        json_form = {'#text': json_form} if json_form else {}
+    for child_name, value in children:
+        if child_name not in json_form:
+            json_form[child_name] = value
+        elif isinstance(json_form[child_name], list):
+            json_form[child_name].append(value)
+        else:
+            json_form[child_name] = [json_form[child_name], value]
+    json_form['#type'] = name
+    return json_form
+
+
 def adjust_text_to_datetime(text, process_timezones=None):
     matching_datetime = iso8601.parse_date(text)
     if process_timezones or phone_timezones_should_be_processed():
@@ -7,15 +7,20 @@ from corehq.form_processor.utils import should_use_sql_backend
 from corehq.messaging.scheduling.tasks import delete_schedule_instances_for_cases
 from corehq.messaging.scheduling.util import utcnow
 from corehq.messaging.util import MessagingRuleProgressHelper, use_phone_entries
-from corehq.sql_db.util import paginate_query_across_partitioned_databases
+from corehq.sql_db.util import get_db_aliases_for_partitioned_query, paginate_query
 from corehq.util.celery_utils import no_result_task
 from corehq.util.datadog.utils import case_load_counter
+from dimagi.utils.chunked import chunked
 from dimagi.utils.couch import CriticalSection
 from django.conf import settings
 from django.db.models import Q
 from django.db import transaction
 
 
+# number of cases synced by each task when running a messaging rule
+MESSAGING_RULE_CASE_CHUNK_SIZE = 500
+
+
 def get_sync_key(case_id):
     return 'sync-case-for-messaging-%s' % case_id
 
@@ -40,6 +45,16 @@ def sync_case_for_messaging_rule(self, domain, case_id, rule_id):
         self.retry(exc=e)
 
 
+@no_result_task(serializer='pickle', queue=settings.CELERY_REMINDER_CASE_UPDATE_QUEUE, acks_late=True,
+                default_retry_delay=5 * 60, max_retries=12, bind=True)
+def sync_case_chunk_for_messaging_rule(self, domain, case_ids, rule_id):
+    try:
+        with CriticalSection([get_sync_key(case_id) for case_id in sorted(case_ids)], timeout=5 * 60):
+            _sync_case_chunk_for_messaging_rule(domain, case_ids, rule_id)
+    except Exception as e:
+        self.retry(exc=e)
+
+
 def _sync_case_for_messaging(domain, case_id):
     try:
         case = CaseAccessors(domain).get_case(case_id)
@@ -83,6 +98,26 @@ def _sync_case_for_messaging_rule(domain, case_id, rule_id):
         MessagingRuleProgressHelper(rule_id).increment_current_case_count()
 
 
+def _sync_case_chunk_for_messaging_rule(domain, case_ids, rule_id):
+    rule = _get_cached_rule(domain, rule_id)
+    if not rule:
+        return
+    cases = CaseAccessors(domain).get_cases(case_ids)
+    case_load_counter("messaging_rule_sync", domain)(len(cases))
+
+    # cases deleted since the rule run started have nothing left to sync
+    synced_count = len(case_ids) - len(cases)
+    for case in cases:
+        try:
+            rule.run_rule(case, utcnow())
+        except Exception:
+            # retry the case on its own so that the rest of the chunk is not run again
+            sync_case_for_messaging_rule.delay(domain, case.case_id, rule_id)
+        else:
+            synced_count += 1
+    MessagingRuleProgressHelper(rule_id).increase_current_case_count(synced_count)
+
+
 def initiate_messaging_rule_run(rule):
     if not rule.active:
         return
@@ -90,8 +125,9 @@ def initiate_messaging_rule_run(rule):
     transaction.on_commit(lambda: run_messaging_rule.delay(rule.domain, rule.pk))
 
 
-def paginated_case_ids(domain, case_type):
-    row_generator = paginate_query_across_partitioned_databases(
+def paginated_case_ids(domain, case_type, db_name):
+    row_generator = paginate_query(
+        db_name,
         CommCareCaseSQL,
         Q(domain=domain, type=case_type, deleted=False),
         values=['case_id'],
@@ -101,11 +137,17 @@ def paginated_case_ids(domain, case_type):
         yield row[0]
 
 
-def get_case_ids_for_messaging_rule(domain, case_type):
+def get_case_id_chunks_for_messaging_rule(domain, case_type):
+    """Chunks of case IDs of the case type. With the SQL backend the cases
+    in each chunk are on the same shard.
+    """
     if not should_use_sql_backend(domain):
-        return CaseAccessors(domain).get_case_ids_in_domain(case_type)
-    else:
-        return paginated_case_ids(domain, case_type)
+        case_ids = CaseAccessors(domain).get_case_ids_in_domain(case_type)
+        yield from chunked(case_ids, MESSAGING_RULE_CASE_CHUNK_SIZE, list)
+        return
+
+    for db_name in get_db_aliases_for_partitioned_query():
+        yield from chunked(paginated_case_ids(domain, case_type, db_name), MESSAGING_RULE_CASE_CHUNK_SIZE, list)
 
 
 @no_result_task(serializer='pickle', queue=settings.CELERY_REMINDER_CASE_UPDATE_QUEUE)
@@ -120,20 +162,14 @@ def run_messaging_rule(domain, rule_id):
     if not rule:
         return
 
-    incr = 0
     progress_helper = MessagingRuleProgressHelper(rule_id)
     progress_helper.set_initial_progress()
 
-    for case_id in get_case_ids_for_messaging_rule(domain, rule.case_type):
-        sync_case_for_messaging_rule.delay(domain, case_id, rule_id)
-        incr += 1
-        if incr >= 1000:
-            progress_helper.increase_total_case_count(incr)
-            incr = 0
-            if progress_helper.is_canceled():
-                break
-
-    progress_helper.increase_total_case_count(incr)
+    for case_ids in get_case_id_chunks_for_messaging_rule(domain, rule.case_type):
+        sync_case_chunk_for_messaging_rule.delay(domain, case_ids, rule_id)
+        progress_helper.increase_total_case_count(len(case_ids))
+        if progress_helper.is_canceled():
+            break
 
     # By putting this task last in the queue, the rule should be marked
     # complete at about the time that the last tasks are finishing up.
@@ -60,6 +60,10 @@ class MessagingRuleProgressHelper(object):
             if fail_hard:
                 raise
 
+    def increase_current_case_count(self, value):
+        self.client.incr(self.current_key, delta=value)
+        self.client.expire(self.current_key, self.key_expiry)
+
     def increase_total_case_count(self, value):
         self.client.incr(self.total_key, delta=value)
         self.client.expire(self.total_key, self.key_expiry)
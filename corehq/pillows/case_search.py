@@ -13,6 +13,7 @@ from corehq.apps.case_search.const import (
 )
 from corehq.apps.case_search.exceptions import CaseSearchNotEnabledException
 from corehq.apps.case_search.models import case_search_enabled_domains
+from corehq.apps.case_search.utils import bump_case_search_generation
 from corehq.apps.change_feed import topics
 from corehq.apps.change_feed.consumer.feed import (
     KafkaChangeFeed,
@@ -109,6 +110,13 @@ class CaseSearchPillowProcessor(ElasticProcessor):
 
         if domain and domain_needs_search_index(domain):
             super(CaseSearchPillowProcessor, self).process_change(change)
+            bump_case_search_generation(domain, _get_case_type(change))
+
+
+def _get_case_type(change):
+    if change.metadata is not None:
+        return change.metadata.document_subtype
+    return change.get_document().get('type')
 
 
 def get_case_search_processor():
@@ -1,3 +1,4 @@
+import threading
 from collections import Counter
 from unittest import SkipTest
 
@@ -19,6 +20,7 @@ from corehq.sql_db.util import (
     get_databases_for_read_query,
     get_replication_delay_for_shard_standbys,
     get_standbys_with_acceptible_delay,
+    query_databases_concurrently,
 )
 from decorator import contextmanager
 from testil import eq
@@ -203,3 +205,37 @@ class TestReadsFromShardStandbys(SimpleTestCase):
 
             plproxy_standby_config.form_processing_dbs = ['db1_standby', 'db2_standby']
             yield
+
+
+class QueryDatabasesConcurrentlyTest(SimpleTestCase):
+
+    def _connections(self, atomic=()):
+        return {
+            db_name: mock.Mock(in_atomic_block=db_name in atomic)
+            for db_name in ['default', 'p1', 'p2']
+        }
+
+    def test_query_databases(self):
+        threads = {}
+
+        def query(db_name, args):
+            threads[db_name] = threading.current_thread().name
+            return [db_name] + args
+
+        with mock.patch('corehq.sql_db.util.connections', self._connections()):
+            results = query_databases_concurrently(query, {'p1': ['a'], 'p2': ['b', 'c']})
+        self.assertEqual(results, [['p1', 'a'], ['p2', 'b', 'c']])
+        self.assertNotIn(threading.current_thread().name, threads.values())
+        self.assertNotEqual(threads['p1'], threads['p2'])
+
+    def test_query_in_calling_thread(self):
+        def query(db_name, args):
+            return threading.current_thread().name
+
+        current_thread = threading.current_thread().name
+        with mock.patch('corehq.sql_db.util.connections', self._connections(atomic=['p2'])):
+            self.assertEqual(query_databases_concurrently(query, {'p1': None}), [current_thread])
+            # p2 has a transaction open
+            results = query_databases_concurrently(query, {'p1': None, 'p2': None})
+        self.assertNotEqual(results[0], current_thread)
+        self.assertEqual(results[1], current_thread)
@@ -2,6 +2,7 @@ import random
 import re
 import uuid
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from distutils.version import LooseVersion
 from functools import wraps
 
@@ -182,6 +183,86 @@ def get_db_alias_for_partitioned_doc(partition_value):
     return db_name
 
 
+def query_databases_concurrently(query, args_by_db):
+    """Call ``query(db_name, args)`` for each database concurrently
+
+    Each database has a worker thread of its own so that its connection
+    is reused between calls. Databases with a transaction open in the
+    calling thread are queried from the calling thread so that the query
+    sees the transaction's changes.
+
+    :param args_by_db: Dict of ``db_name -> args``
+    :return: list of query results in the order of ``args_by_db``
+    """
+    def in_thread(db_name):
+        return len(args_by_db) > 1 and not connections[db_name].in_atomic_block
+
+    futures = {
+        db_name: _get_query_executor(db_name).submit(_query_database, query, db_name, args)
+        for db_name, args in args_by_db.items()
+        if in_thread(db_name)
+    }
+    return [
+        futures[db_name].result() if db_name in futures else query(db_name, args)
+        for db_name, args in args_by_db.items()
+    ]
+
+
+def _query_database(query, db_name, args):
+    connections[db_name].close_if_unusable_or_obsolete()
+    return query(db_name, args)
+
+
+@memoized
+def _get_query_executor(db_name):
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='query-{}'.format(db_name))
+
+
+def bulk_update(objects, fields, using):
+    """Update ``fields`` of saved model ``objects`` with one multi-row UPDATE
+
+    Django 1.11 does not have ``QuerySet.bulk_update``. This joins the
+    table to a VALUES list of the new field values and does not send
+    model signals.
+
+    :param objects: Saved instances of a single model class
+    :param fields: Names of the fields to update
+    :param using: Database alias
+    """
+    if not objects:
+        return
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    meta = type(objects[0])._meta
+    assert all(type(obj)._meta is meta and obj.pk is not None for obj in objects)
+    pk = meta.pk
+    fields = [meta.get_field(name) for name in fields]
+    assert pk not in fields, 'the primary key cannot be updated'
+    table = quote_name(meta.db_table)
+
+    params = []
+    for obj in objects:
+        params.append(pk.get_db_prep_value(obj.pk, connection))
+        for field in fields:
+            params.append(field.get_db_prep_save(getattr(obj, field.attname), connection))
+    row = '({})'.format(', '.join(['%s'] * (len(fields) + 1)))
+    # VALUES columns have no type so cast them to the type of the column they update
+    sql = 'UPDATE {table} SET {assignments} FROM (VALUES {rows}) AS v(pk, {columns}) ' \
+        'WHERE {table}.{pk} = v.pk::{pk_type}'.format(
+            table=table,
+            assignments=', '.join(
+                '{} = v.c{}::{}'.format(quote_name(field.column), index, field.db_type(connection))
+                for index, field in enumerate(fields)
+            ),
+            rows=', '.join([row] * len(objects)),
+            columns=', '.join('c{}'.format(index) for index in range(len(fields))),
+            pk=quote_name(pk.column),
+            pk_type=pk.rel_db_type(connection),
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
 def get_db_aliases_for_partitioned_query():
     if settings.USE_PARTITIONED_DATABASE:
         db_names = plproxy_config.form_processing_dbs
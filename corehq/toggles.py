@@ -679,6 +679,13 @@ SYNC_SEARCH_CASE_CLAIM = StaticToggle(
     namespaces=[NAMESPACE_DOMAIN]
 )
 
+CASE_SEARCH_RESULT_CACHE = StaticToggle(
+    'case_search_result_cache',
+    'Cache the results of mobile case searches until a case of the searched type is updated',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN]
+)
+
 
 def _enable_search_index(domain, enabled):
     from corehq.apps.case_search.tasks import reindex_case_search_for_domain
@@ -1795,6 +1802,46 @@ LIVEQUERY_READ_FROM_STANDBYS = DynamicallyPredictablyRandomToggle(
 )
 
 
+LIVEQUERY_INCREMENTAL = DynamicallyPredictablyRandomToggle(
+    'livequery_incremental',
+    'Save the livequery case graph on the sync log and only replay modified cases on the next restore',
+    TAG_INTERNAL,
+    [NAMESPACE_USER],
+    description="""
+    To allow a gradual rollout of incremental livequery restores. Restores
+    for users with this enabled save a snapshot of the case graph on the
+    sync log, and the next restore from that sync log replays the cases
+    modified since then instead of traversing the whole graph.
+    """
+)
+
+
+LIVEQUERY_PREFETCH_CASES = DynamicallyPredictablyRandomToggle(
+    'livequery_prefetch_cases',
+    'Fetch the next batch of cases on a background thread during livequery restores',
+    TAG_INTERNAL,
+    [NAMESPACE_USER],
+    description="""
+    To allow a gradual rollout of pipelined restores. The database query
+    for the next batch of cases runs while the XML for the current batch
+    is being generated.
+    """
+)
+
+
+RESTORE_CASE_XML_CACHE = DynamicallyPredictablyRandomToggle(
+    'restore_case_xml_cache',
+    'Cache serialized case XML in memory and reuse it across restores',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN],
+    description="""
+    Cases that are synced to many users, for example through case
+    sharing groups, are serialized once per web worker process until
+    they are modified instead of once per restore.
+    """
+)
+
+
 RUN_CUSTOM_DATA_PULL_REQUESTS = StaticToggle(
     'run_custom_data_pull_requests',
     '[ICDS] Initiate custom data pull requests from UI',
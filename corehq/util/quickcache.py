@@ -1,19 +1,32 @@
+import logging
 import os
+import pickle
+import threading
+import time
 from base64 import b64encode
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
 
 from celery._state import get_current_task
-from quickcache import ForceSkipCache
-from quickcache.django_quickcache import get_django_quickcache
+from quickcache import ForceSkipCache, QuickCacheHelper, get_quickcache
+from quickcache.cache_helpers import CacheWithPresets, TieredCache
+from quickcache.quickcache import ConfigMixin
 
 from corehq.util.global_request import get_request
 from corehq.util.soft_assert import soft_assert
 
+logger = logging.getLogger(__name__)
+
 quickcache_soft_assert = soft_assert(
     notify_admins=True,
     fail_if_debug=False,
     skip_frames=5,
 )
 
+INVALIDATION_CHANNEL = 'quickcache-invalidation'
+
 
 def get_session_key():
     """
@@ -40,8 +53,265 @@ def _quickcache_id(obj):
     return value
 
 
-quickcache = get_django_quickcache(timeout=5 * 60, memoize_timeout=10,
-                                   assert_function=quickcache_soft_assert,
-                                   session_function=get_session_key)
+class LocalLRUCache(object):
+    """
+    Process wide cache holding at most ``max_entries`` values and
+    ``max_bytes`` of pickled values, evicting the least recently used.
+
+    Values are pickled so that callers can't change each other's copies.
+    Implements the parts of the django cache interface used by quickcache.
+    """
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires, pickled value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._entries[key]
+            except KeyError:
+                return default
+            if expires < time.time():
+                self._remove(key)
+                return default
+            self._entries.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if self.max_bytes is not None and len(value) > self.max_bytes:
+            self.delete(key)
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.time() + timeout, value)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalInvalidationChannel(object):
+    """Delivers invalidations to subscribers in this process only
+
+    Used in tests and when redis isn't configured.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def publish(self, key):
+        for callback in self._subscribers:
+            callback(key)
+
+    def ensure_listening(self):
+        pass
+
+
+class RedisInvalidationChannel(LocalInvalidationChannel):
+    """Delivers invalidations to subscribers in every process over redis pub/sub
+
+    Each process listens on a daemon thread, started by ``ensure_listening``
+    once the process has forked. Messages sent while it isn't connected are
+    lost so ``on_disconnect`` is called after a fork and every time it
+    (re)connects, and subscribers should drop everything they hold.
+    """
+
+    def __init__(self, name, on_disconnect, retry_seconds=5):
+        super(RedisInvalidationChannel, self).__init__()
+        self.name = name
+        self.on_disconnect = on_disconnect
+        self.retry_seconds = retry_seconds
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def publish(self, key):
+        # this process's subscribers are called when the message comes back
+        try:
+            self._get_client().publish(self.name, key)
+        except Exception:
+            # other processes keep their copy until it times out
+            logger.exception("quickcache invalidation not published: %s", key)
+
+    def ensure_listening(self):
+        if self._pid == os.getpid():
+            return
+        # first call in this process, the listener thread doesn't survive a fork
+        with self._lock:
+            if self._pid != os.getpid():
+                self.on_disconnect()
+                self._listener = threading.Thread(target=self._listen, name='quickcache-invalidation')
+                self._listener.daemon = True
+                self._listener.start()
+                self._pid = os.getpid()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.name)
+                self.on_disconnect()
+                for message in pubsub.listen():
+                    key = message['data']
+                    if isinstance(key, bytes):
+                        key = key.decode('utf-8')
+                    LocalInvalidationChannel.publish(self, key)
+            except Exception:
+                logger.exception("quickcache invalidation listener disconnected")
+                self.on_disconnect()
+                time.sleep(self.retry_seconds)
+
+    @staticmethod
+    def _get_client():
+        from dimagi.utils.couch.cache.cache_core import get_redis_client
+        return get_redis_client().client.get_client()
+
+
+_local_cache = None
+_invalidation_channel = None
+
+
+def get_local_cache():
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = LocalLRUCache(settings.QUICKCACHE_LOCAL_MAX_ENTRIES, settings.QUICKCACHE_LOCAL_MAX_BYTES)
+        get_invalidation_channel().subscribe(_local_cache.delete)
+    return _local_cache
+
+
+def get_invalidation_channel():
+    global _invalidation_channel
+    if _invalidation_channel is None:
+        if settings.UNIT_TESTING:
+            _invalidation_channel = LocalInvalidationChannel()
+        else:
+            _invalidation_channel = RedisInvalidationChannel(
+                INVALIDATION_CHANNEL, on_disconnect=lambda: get_local_cache().clear())
+    return _invalidation_channel
+
+
+class LocalCacheWithInvalidation(CacheWithPresets):
+    """Cache tier backed by the process's ``LocalLRUCache``
+
+    Deleting a key removes it from the local cache of every process.
+    """
+
+    def get(self, key, default=None):
+        get_invalidation_channel().ensure_listening()
+        return super(LocalCacheWithInvalidation, self).get(key, default)
+
+    def delete(self, key):
+        super(LocalCacheWithInvalidation, self).delete(key)
+        get_invalidation_channel().publish(key)
+
+
+class SharedFirstTieredCache(TieredCache):
+    """Deletes keys from the slowest (shared) tier first
+
+    Otherwise another process could reload its local tier from the shared
+    tier between the invalidation being published and the shared value
+    being deleted, and keep serving the stale value.
+    """
+
+    def delete(self, key):
+        for cache in reversed(self.caches):
+            cache.delete(key)
+
+
+class InvalidatingQuickCacheHelper(QuickCacheHelper):
+    """Clears a cached value everywhere before it is overwritten so
+    other processes don't keep serving their local copy
+    """
+
+    def __call__(self, *args, **kwargs):
+        if self.skip(*args, **kwargs):
+            self.clear(*args, **kwargs)
+        return super(InvalidatingQuickCacheHelper, self).__call__(*args, **kwargs)
+
+    def set_cached_value(self, *args, **kwargs):
+        settable = super(InvalidatingQuickCacheHelper, self).set_cached_value(*args, **kwargs)
+
+        def to(value):
+            self.clear(*args, **kwargs)
+            settable.to(value)
+
+        return namedtuple('Settable', ['to'])(to)
+
+
+class HQQuickCache(namedtuple('HQQuickCache', [
+    'vary_on',
+    'skip_arg',
+    'timeout',
+    'memoize_timeout',
+    'local_timeout',
+    'helper_class',
+    'assert_function',
+    'session_function',
+]), ConfigMixin):
+    """
+    Cache tiers, each used if its timeout is set:
+      - memoize_timeout: in process, for the current request or task (see ``session_function``)
+      - local_timeout: in process, across requests and tasks. Cleared in
+        all processes when the value is cleared or overwritten.
+      - timeout: shared (redis)
+    """
+
+    def call(self):
+        tiers = []
+        if self.memoize_timeout:
+            tiers.append(CacheWithPresets(caches['locmem'], self.memoize_timeout, self.session_function))
+        if self.local_timeout:
+            tiers.append(LocalCacheWithInvalidation(get_local_cache(), self.local_timeout))
+        if self.timeout:
+            tiers.append(CacheWithPresets(caches['default'], self.timeout))
+
+        helper_class = self.helper_class
+        if self.local_timeout and helper_class is QuickCacheHelper:
+            helper_class = InvalidatingQuickCacheHelper
+
+        return get_quickcache(
+            cache=SharedFirstTieredCache(tiers),
+            vary_on=self.vary_on,
+            skip_arg=self.skip_arg,
+            helper_class=helper_class,
+            assert_function=self.assert_function,
+        ).call()
+
+
+quickcache = HQQuickCache(
+    vary_on=Ellipsis,
+    skip_arg=None,
+    timeout=5 * 60,
+    memoize_timeout=10,
+    local_timeout=None,
+    helper_class=QuickCacheHelper,
+    assert_function=quickcache_soft_assert,
+    session_function=get_session_key,
+)
 
 __all__ = ['quickcache']
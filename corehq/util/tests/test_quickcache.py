@@ -1,6 +1,18 @@
+from contextlib import contextmanager
+
+from django.core.cache import caches
+
+from mock import patch
 from testil import eq
 
-from ..quickcache import _quickcache_id
+from ..quickcache import (
+    LocalCacheWithInvalidation,
+    LocalInvalidationChannel,
+    LocalLRUCache,
+    _quickcache_id,
+    get_invalidation_channel,
+    quickcache,
+)
 
 
 def test_quickcache_id():
@@ -15,3 +27,118 @@ def test_quickcache_id():
     eq({len(id) for id in ids}, {7})
     # safe sanity check, 1% is NOT a reasonable collision rate
     assert len(set(ids)) > SAMPLE_SIZE * .99, (len(set(ids)), SAMPLE_SIZE)
+
+
+def test_local_lru_cache_evicts_least_recently_used():
+    cache = LocalLRUCache(max_entries=2)
+    cache.set('a', 1, 60)
+    cache.set('b', 2, 60)
+    eq(cache.get('a'), 1)
+    cache.set('c', 3, 60)
+    eq(cache.get('b'), None)
+    eq(cache.get('a'), 1)
+    eq(cache.get('c'), 3)
+
+
+def test_local_lru_cache_max_bytes():
+    cache = LocalLRUCache(max_entries=10, max_bytes=300)
+    cache.set('a', 'a' * 100, 60)
+    cache.set('b', 'b' * 100, 60)
+    cache.set('c', 'c' * 100, 60)
+    eq(cache.get('a', Ellipsis), Ellipsis)
+    eq(len(cache), 2)
+    # too big to cache at all
+    cache.set('b', 'b' * 400, 60)
+    eq(cache.get('b', Ellipsis), Ellipsis)
+    eq(cache.get('c'), 'c' * 100)
+
+
+def test_local_lru_cache_timeout():
+    cache = LocalLRUCache(max_entries=10)
+    with patch('corehq.util.quickcache.time.time', return_value=1000):
+        cache.set('a', 1, 60)
+    with patch('corehq.util.quickcache.time.time', return_value=1059):
+        eq(cache.get('a'), 1)
+    with patch('corehq.util.quickcache.time.time', return_value=1061):
+        eq(cache.get('a'), None)
+    eq(len(cache), 0)
+
+
+def test_local_lru_cache_returns_copies():
+    cache = LocalLRUCache(max_entries=10)
+    value = {'a': [1]}
+    cache.set('a', value, 60)
+    value['a'].append(2)
+    cache.get('a')['a'].append(3)
+    eq(cache.get('a'), {'a': [1]})
+
+
+@contextmanager
+def _local_tier_processes():
+    """Yields this process's local cache and another process's subscribed
+    to the same invalidation channel
+    """
+    channel = LocalInvalidationChannel()
+    local_cache = LocalLRUCache(max_entries=10)
+    other_process_cache = LocalLRUCache(max_entries=10)
+    channel.subscribe(local_cache.delete)
+    channel.subscribe(other_process_cache.delete)
+    with patch('corehq.util.quickcache._invalidation_channel', channel), \
+            patch('corehq.util.quickcache._local_cache', local_cache):
+        yield local_cache, other_process_cache
+
+
+def test_local_tier_delete_invalidates_other_processes():
+    with _local_tier_processes() as (local_cache, other_process_cache):
+        tier = LocalCacheWithInvalidation(local_cache, 60)
+        tier.set('key', 'value')
+        other_process_cache.set('key', 'value', 60)
+        eq(tier.get('key'), 'value')
+        tier.delete('key')
+        eq(local_cache.get('key'), None)
+        eq(other_process_cache.get('key'), None)
+
+
+def test_quickcache_local_timeout():
+    calls = []
+
+    with _local_tier_processes() as (local_cache, other_process_cache):
+        @quickcache(['name'], skip_arg='strict', timeout=0, memoize_timeout=0, local_timeout=60)
+        def get_thing(name, strict=False):
+            calls.append(name)
+            return {'name': name}
+
+        eq(get_thing('a'), {'name': 'a'})
+        eq(get_thing('a'), {'name': 'a'})
+        eq(calls, ['a'])
+
+        key = get_thing.get_cache_key('a')
+        other_process_cache.set(key, {'name': 'old'}, 60)
+        get_thing.clear('a')
+        eq(other_process_cache.get(key), None)
+        get_thing('a')
+        eq(calls, ['a', 'a'])
+
+        # overwriting the value also invalidates other processes
+        other_process_cache.set(key, {'name': 'old'}, 60)
+        get_thing('a', strict=True)
+        eq(other_process_cache.get(key), None)
+        eq(calls, ['a', 'a', 'a'])
+        get_thing('a')
+        eq(calls, ['a', 'a', 'a'])
+
+
+def test_quickcache_clears_shared_tier_before_invalidating():
+    events = []
+
+    with _local_tier_processes():
+        @quickcache(['name'], timeout=60, memoize_timeout=0, local_timeout=60)
+        def get_thing(name):
+            return {'name': name}
+
+        # other processes must not reload the old value from the shared tier
+        # after they have been told to drop it
+        with patch.object(caches['default'], 'delete', lambda key, **kw: events.append('shared')), \
+                patch.object(get_invalidation_channel(), 'publish', lambda key: events.append('publish')):
+            get_thing.clear('a')
+        eq(events, ['shared', 'publish'])
@@ -812,6 +812,10 @@ PL_PROXY_CLUSTER_NAME = 'commcarehq'
 
 USE_PARTITIONED_DATABASE = False
 
+# Read forms, cases and indices by ID from the shard databases directly
+# instead of going through the PL/Proxy functions
+USE_DIRECT_SHARD_READS = False
+
 # number of days since last access after which a saved export is considered unused
 SAVED_EXPORT_ACCESS_CUTOFF = 35
 
@@ -892,6 +896,12 @@ SENTRY_API_KEY = None
 OBFUSCATE_PASSWORD_FOR_NIC_COMPLIANCE = False
 RESTRICT_USED_PASSWORDS_FOR_NIC_COMPLIANCE = False
 DATA_UPLOAD_MAX_MEMORY_SIZE = None
+
+# Form submissions at least this many bytes are parsed incrementally and have
+# their uploaded files written to temporary files instead of held in memory.
+# Set to None to disable.
+FORM_INGEST_STREAMING_THRESHOLD = 5 * 1024 * 1024
+
 # Exports use a lot of fields to define columns. See: https://dimagi-dev.atlassian.net/browse/HI-365
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 5000
 
@@ -954,6 +964,22 @@ REQUIRE_TWO_FACTOR_FOR_SUPERUSERS = False
 # that adds messages to the partition with the fewest unprocessed messages
 USE_KAFKA_SHORTEST_BACKLOG_PARTITIONER = False
 
+# Limits of the in-process cache used by quickcache functions with a local_timeout
+QUICKCACHE_LOCAL_MAX_ENTRIES = 10000
+QUICKCACHE_LOCAL_MAX_BYTES = 64 * 1024 * 1024
+
+# Queue changes in an in-process buffer that is sent to Kafka in batches by a
+# background thread instead of sending each change from the request thread
+USE_KAFKA_PUBLISH_BUFFER = False
+# Maximum number of changes waiting in the buffer before publishers block
+KAFKA_PUBLISH_BUFFER_SIZE = 10000
+# Maximum number of changes sent in one batch
+KAFKA_PUBLISH_BATCH_SIZE = 500
+# Time the flusher waits for more changes before sending a batch
+KAFKA_PUBLISH_LINGER_SECONDS = 0.005
+# Time publishers wait for space in the buffer or for a change to be delivered
+KAFKA_PUBLISH_TIMEOUT = 30
+
 
 try:
     # try to see if there's an environmental variable set for local_settings